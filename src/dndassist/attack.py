@@ -1,9 +1,11 @@
 """Module to solve an attack"""
 
-from dndassist.autoroll import rolldice
+from typing import Optional, Tuple
+
+from dndassist.autoroll import rolldice, actor_rng
 from dndassist.character import Character
 
-from dndassist.equipment import Armor, Weapon, Shield
+from dndassist.equipment import Weapon
 from dndassist.spellcasting import Spell
 
 from dndassist.storyprint import story_print
@@ -12,6 +14,37 @@ from dndassist.storyprint import story_print
 def print_r(text):
     story_print(text, color="green", justify="right")
 
+def print_l(text):
+    story_print(text, color="grey", justify="left")
+
+def defense_parts(defender: Character) -> Tuple[Optional[str], int, int, Optional[str], int]:
+    """Defense of a character, as armor name, armor score, dex. bonus, shield name, shield score"""
+    return defender.defense_parts()
+
+
+def defense_score(defender: Character) -> int:
+    """Score an attack must reach to hit the defender"""
+    return defender.defense_score()
+
+
+def weapon_modifier(attacker: Character, weapon: Weapon) -> Tuple[Optional[str], int]:
+    """Best attribute of the attacker for this weapon, and its modifier (never negative)"""
+    attr_modifier = 0
+    attr_used = None
+    for _attr in weapon.attributes():
+        _amod = attacker.attr_mod(_attr)
+        if _amod > attr_modifier:
+            attr_modifier = _amod
+            attr_used = _attr
+    return attr_used, attr_modifier
+
+
+def spell_modifier(attacker: Character) -> int:
+    """Chant modifier of a spell caster"""
+    attr_modifier = max(attacker.attr_mod("wisdom"), attacker.attr_mod("intelligence"))
+    return attr_modifier + attacker.proficiency_bonus
+
+
 def attack(
     attacker: Character,
     weapon_name,
@@ -20,50 +53,26 @@ def attack(
 ):
     """an attack with a weapon"""
     print_r(f"Defender {defender.name}, {defender.current_state['current_hp']} HP")
-    dex_bonus = 0
-    armor_name = defender.equipped_armor()
+    armor_name, armor_score, dex_bonus, shield_name, shield_score = defense_parts(defender)
     if armor_name is None:
-        armor_score = 0
         print_r(f".      No Armor")
     else:
-        armor = Armor.from_name(armor_name)
-        armor_score = armor.base
         print_r(f".      Armor  +{armor_score}")
-        if armor.dex_bonus:
-            max_dex = 100
-            if armor.max_bonus is not None:
-                max_dex = armor.max_bonus
-            dex_bonus = min(defender.attr_mod("dexterity"), max_dex)
+        if dex_bonus:
             print_r(f"   Dex. Bonus +{dex_bonus}")
-
-    shield_name = defender.equipped_shield()
     if shield_name is None:
-        shield_score = 0
         print_r(f".      No Shield")
     else:
-        shield = Shield.from_name(shield_name)
-        shield_score = shield.bonus
         print_r(f"      Shield +{shield_score}")
 
-    defense_score = (
-        armor_score
-        + shield_score
-        + dex_bonus
-        + defender.defense_bonus()  # Dons, sorts, etc.
-    )
-    print_r(f"    Total Defense : {defense_score}")
+    defense = defense_score(defender)
+    print_r(f"    Total Defense : {defense}")
 
     print_r(f"{attacker.name} attacks with {weapon_name} HP")
 
     weapon = Weapon.from_name(weapon_name)
 
-    attr_modifier = 0
-    attr_used = None
-    for _attr in weapon.attributes():
-        _amod = attacker.attr_mod(_attr)
-        if _amod > attr_modifier:
-            attr_modifier = _amod
-            attr_used = _attr
+    attr_used, attr_modifier = weapon_modifier(attacker, weapon)
     if attr_used is not None:
         print_r(f"    Using {attr_used} : {attr_modifier}")
 
@@ -77,12 +86,13 @@ def attack(
     autoroll = True
     if "player" in  attacker.faction:
         autoroll=False
-    roll, dice_normed = rolldice("1d20", autoroll=autoroll, advantage=advantage)
+    rng = actor_rng(attacker.name)
+    roll, dice_normed = rolldice("1d20", autoroll=autoroll, advantage=advantage, rng=rng)
 
     attack_score = roll + attr_modifier + attack_bonus + weapon.damage_bonus
 
     damage = 0
-    attack_result = attack_score - defense_score
+    attack_result = attack_score - defense
     if dice_normed == 1.0 and advantage > 0:  # Critique aet pas de desavantage
         print_r(f"Reussite critique !")
         attack_result = 1
@@ -92,7 +102,7 @@ def attack(
     if attack_result >= 0:
         print_r(f"Attack successful")
         roll_dmg, _ = rolldice(
-            weapon.damage_dice, autoroll=autoroll, advantage=advantage
+            weapon.damage_dice, autoroll=autoroll, advantage=advantage, rng=rng
         )
         if dice_normed == 1.0 and advantage > 0:  # Critique et pas de desavantage
             roll_dmg *= 2
@@ -100,7 +110,6 @@ def attack(
         damage = roll_dmg + attr_modifier + weapon.damage_bonus
 
         print_r(f"Damage : {damage} HP")
-        defender.current_state["current_hp"] -= damage
 
     else:
         # Attaque rate
@@ -122,21 +131,22 @@ def offensive_spell(
     spell = Spell.from_name(spell_name)
     print_r(f"Attacker  [{attacker.name}] has casted {spell_name} on [{defender.name}] {defender.current_state['current_hp']} HP")
     
-    attr_modifier = max(attacker.attr_mod("wisdom"),attacker.attr_mod("intelligence"))
-    print_r(f".   Attr. modifier    :{attr_modifier}")
+    chant_modifier = spell_modifier(attacker)
+    print_r(f".   Attr. modifier    :{chant_modifier - attacker.proficiency_bonus}")
     print_r(f".   Proficiency bonus : {attacker.proficiency_bonus}")
-    chant_modifier = attr_modifier + attacker.proficiency_bonus
     
     autoroll = True
     if "player" in  attacker.faction:
         autoroll=False
 
+    rng = actor_rng(attacker.name)
     # if ranged , test attack
+    dice_normed = None # touch spells have no accuracy roll
     if spell.range > 2:
         print_l(f".  {spell_name} is a ranged spell, roll dice for accuracy")
-        roll, dice_normed = rolldice("1d20", autoroll=autoroll, advantage=advantage)
+        roll, dice_normed = rolldice("1d20", autoroll=autoroll, advantage=advantage, rng=rng)
         print_l(f".  roll dice for damage")
-        damage, _ = rolldice(spell.damage_dice, autoroll=autoroll)
+        damage, _ = rolldice(spell.damage_dice, autoroll=autoroll, rng=rng)
         if dice_normed == 0.0:
             print_r(f".  Misfire, [{attacker.name}] missed the attack!")
             damage = damage //2
@@ -152,6 +162,9 @@ def offensive_spell(
         if roll + chant_modifier < 10:
             print_r(f".  Attack missed!")
             return 0
+    else:
+        print_l(f".  roll dice for damage")
+        damage, _ = rolldice(spell.damage_dice, autoroll=autoroll, rng=rng)
 
     # saving throw
     if dice_normed != 1.0 and spell.saving_throw is not None:
@@ -161,7 +174,9 @@ def offensive_spell(
         if "player" in  defender.faction:
             autoroll=False
         print_r(f"  [{defender.name}] make a saving throw on {spell.saving_throw}.")
-        roll, dice_normed = rolldice("1d20", autoroll=autoroll, advantage=advantage)
+        roll, dice_normed = rolldice(
+            "1d20", autoroll=autoroll, advantage=advantage, rng=actor_rng(defender.name)
+        )
 
         if dice_normed == 1.0:  # lucky roll
             print_r(f"Perfect dodge, [{defender.name}] took no damages")
@@ -1,10 +1,12 @@
-import subprocess
 import shutil
-from typing import Tuple,List
+import random
+from abc import ABC, abstractmethod
+from typing import Callable, Optional, Tuple,List,Iterable
 from random import choice
 from dndassist.storyprint import story_print
+from dndassist.llm_service import LLM_MODEL, build_prompt, parse_answer, decision_service
+from dndassist.decision_cache import decision_cache
 
-LLM_MODEL = "llama3:latest"
 # LLM_TEMPERATURE=0.0
 # SYSTEM_PROMPT = "You are a player of a simplified dungeons and dragons game. Given a NPC context, you select the next action of this NPC."
 # from langchain_ollama import OllamaLLM
@@ -103,56 +105,180 @@ def auto_play_random(context:str, possible_actions:List[str])-> Tuple[str,str]:
     comment = "I don't know what I am doing"
     return selected_action, comment
 
+_FALLBACK: Optional[Callable[[str, List[str]], Tuple[str, str]]] = None
+
+
+def set_llm_fallback(fallback: Optional[Callable[[str, List[str]], Tuple[str, str]]]):
+    """Decisions taken when the LLM does not answer, as fallback(title, options),
+    None for random choices"""
+    global _FALLBACK
+    _FALLBACK = fallback
+
+
+def llm_fallback(context: str, title: str, possible_actions: List[str]) -> Tuple[str, str]:
+    """Decision taken when the LLM does not answer"""
+    if _FALLBACK is None:
+        return auto_play_random(context, possible_actions)
+    return _FALLBACK(title, possible_actions)
+
+
 def auto_play_ollama(context:str, title:str, possible_actions:List[str], verbose:bool=True)-> Tuple[str,str]:
-    """Ollama-based action selection"""
+    """Ollama-based action selection, through the LLM decision service
 
-    indexed_actions = []
-    for i, option in enumerate(possible_actions):
-        indexed_actions.append(f" {i+1} - {option}")
-    
-    prompt = "You are controlling a NPC in dungeons and dragons. Here is the context of your turn:\n\n"
-    prompt += context
-    prompt += "\n\nYou must satisfy the objectives of this NPC."
-    prompt += f"\n\nThe current decision to take is {title}"
-    prompt += "\nFor your answer, YOU MUST SELECT ONE OF THE FOLLOWING INDEXED SENTENCES:\n"
-    prompt += "\n".join(indexed_actions)
-    prompt += f"""\n
-    Add a “>” character before the index.
-    Add a “<” character after the index.
-    Add a “|” character after the sentence.
-    Finish your answer by a very short explanation of the decision.
-    Exemple for an attack:
-      > 6 < attack beowulf | fafnir and beowulf belongs to opposed non-neutral factions.'
-    Exemple for moving:
-      > 3 < move North | Fafnir moves north as fast a possible, to satisfy his objective.'
-"""
+    A decision already in the decision cache is not asked again."""
+    cache = decision_cache()
+    if cache is not None:
+        decision = cache.get(context, title, possible_actions)
+        if decision is not None:
+            story_print(f"__{decision[0]} | {decision[1]}__ (cached)", color="blue", justify="left")
+            return decision
+
+    prompt = build_prompt(context, title, possible_actions)
    
-    story_print(".  LLM running...", color="blue", justify="left")
+    story_print(
+        f".  LLM running... prompt {prompt.tokens} tokens, system {prompt.system_tokens} tokens",
+        color="blue",
+        justify="left",
+    )
     if verbose:
-        story_print(prompt, color="blue", justify="left")
+        story_print(prompt.text, color="blue", justify="left")
     
-    cmd = ["ollama", "run", LLM_MODEL]
     try:
-        result = subprocess.run(cmd, input = prompt, capture_output=True, text=True, timeout=30).stdout.strip()
-    except subprocess.TimeoutExpired:
-        print("⚠️ [LLM timeout]\n Switching to random autoplay...")
-        return auto_play_random(context, possible_actions)
+        result = decision_service().answer(prompt)
+    except TimeoutError:
+        print("⚠️ [LLM timeout]\n Switching to fallback autoplay...")
+        return llm_fallback(context, title, possible_actions)
     except Exception as e:
-        print(f"⚠️ [LLM autoplay error: {e}]\n Switching to random autoplay...")
-        return auto_play_random(context, possible_actions)
+        print(f"⚠️ [LLM autoplay error: {e}]\n Switching to fallback autoplay...")
+        return llm_fallback(context, title, possible_actions)
     
     story_print("__"+result+"__", color="blue", justify="left")
     
-    if ">" in result:
-        result = result.split(">")[-1]
-    if "<" in result:
-        index = result.split("<")[0]
-    if "|" in result:
-        comment = result.split("|")[-1]  
-    else:
-        print(f"⚠️ [LLM autoplay error in result: {result}]\n Switching to random autoplay...")
-        return auto_play_random(context, possible_actions)
-    idx= int(index)
-    option = possible_actions[idx-1]
+    decision = parse_answer(result, possible_actions)
+    if decision is None:
+        print(f"⚠️ [LLM autoplay error in result: {result}]\n Switching to fallback autoplay...")
+        return llm_fallback(context, title, possible_actions)
+    if cache is not None:
+        cache.put(context, title, possible_actions, decision)
+    return decision
+
+
+def prefetch_ollama(decisions: List[Tuple[str, str, List[str]]]):
+    """Ask the LLM now for these decisions, as (title, context, options)
+
+    The answers are used by auto_play_ollama on the same decisions.
+    The former prefetches not used yet are dropped, unless asked again,
+    the decisions already in the decision cache are not asked.
+    """
+    cache = decision_cache()
+    prompts = [
+        build_prompt(context, title, options)
+        for title, context, options in decisions
+        if cache is None or not cache.has(context, title, options)
+    ]
+    service = decision_service()
+    service.discard_pending(keep=prompts)
+    for prompt in prompts:
+        service.submit(prompt)
+
+
+# -----------------------------------------------------------
+#  DECISION PROVIDERS, for headless GameEngine runs
+# -----------------------------------------------------------
+class DecisionProvider(ABC):
+    """Source of every decision of a headless game
+
+    Same contract as user_select_option: return the selected option, and an explanation.
+    npc tells if the decision is for a non playable character.
+    Providers with prefetches = True are told the decisions to come, see prefetch.
+    """
+
+    prefetches = False
+
+    @abstractmethod
+    def select_option(self, title: str, context: str, options: List[str], npc: bool = False) -> Tuple[str, str]:
+        """Selected option, and an explanation"""
+
+    def prefetch(self, decisions: List[Tuple[str, str, List[str]]]):
+        """NPC decisions likely to be asked soon, as (title, context, options)"""
+
+
+class RandomDecisions(DecisionProvider):
+    """Uniform choice among the options, reproducible with a seed"""
+
+    def __init__(self, seed: int = None):
+        self.rng = random.Random(seed)
+
+    def select_option(self, title, context, options, npc=False):
+        return self.rng.choice(options), "Random decision"
+
+
+class ScriptedDecisions(DecisionProvider):
+    """Decisions read from a script, then from a fallback provider
+
+    Each line of the script is the beginning of the option to select,
+    e.g. "move to", "attack goblin", "round finished".
+    """
+
+    def __init__(self, script: Iterable[str], fallback: DecisionProvider = None):
+        self.script = list(script)
+        self.fallback = fallback
+        self._next = 0
+
+    def select_option(self, title, context, options, npc=False):
+        if self._next >= len(self.script):
+            if self.fallback is None:
+                raise RuntimeError(f"Script exhausted at decision: {title}")
+            return self.fallback.select_option(title, context, options, npc=npc)
+        line = self.script[self._next]
+        self._next += 1
+        for option in options:
+            if option.startswith(line):
+                return option, "Scripted decision"
+        raise RuntimeError(f"Scripted decision {line} not in options of {title}: {options}")
+
+
+class RecordedDecisions(DecisionProvider):
+    """Wrap a provider and record its decisions, to replay them later"""
+
+    def __init__(self, provider: DecisionProvider):
+        self.provider = provider
+        self.records: List[Tuple[str, str, str]] = []  # title, option, comment
+
+    def select_option(self, title, context, options, npc=False):
+        option, comment = self.provider.select_option(title, context, options, npc=npc)
+        self.records.append((title, option, comment))
+        return option, comment
+
+
+class ReplayDecisions(DecisionProvider):
+    """Replay the records of a RecordedDecisions, checking the game did not diverge"""
+
+    def __init__(self, records: List[Tuple[str, str, str]]):
+        self.records = list(records)
+        self._next = 0
+
+    def select_option(self, title, context, options, npc=False):
+        if self._next >= len(self.records):
+            raise RuntimeError(f"Replay exhausted at decision: {title}")
+        rec_title, option, comment = self.records[self._next]
+        self._next += 1
+        if rec_title != title or option not in options:
+            raise RuntimeError(f"Replay diverged at decision {self._next}: {title} / {option}")
+        return option, comment
+
+
+class LLMDecisions(DecisionProvider):
+    """Decisions taken by the LLM of auto_play_ollama, prefetched"""
+
+    prefetches = True
+
+    def __init__(self, verbose: bool = False):
+        self.verbose = verbose
+
+    def select_option(self, title, context, options, npc=False):
+        return auto_play_ollama(context, title, options, verbose=self.verbose)
+
+    def prefetch(self, decisions):
+        prefetch_ollama(decisions)
 
-    return option.strip(), comment.strip()
@@ -1,24 +1,43 @@
-from typing import Tuple
+from typing import Tuple, List, Dict, Optional
 from random import randint
+from functools import lru_cache
+import zlib
+import numpy as np
 from dndassist.storyprint import story_print
+from dndassist.dice import compile_dice
 
+FORCE_AUTOROLL = False # roll all dice, never ask them, see set_force_autoroll
+DICE_STREAMS = None # per actor random generators, see set_dice_streams
+
+
+def set_force_autoroll(force: bool = True):
+    """Roll every dice automatically, even for manual actors (headless runs)"""
+    global FORCE_AUTOROLL
+    FORCE_AUTOROLL = force
+
+
+def is_force_autoroll() -> bool:
+    return FORCE_AUTOROLL
+
+@lru_cache(maxsize=1024)
 def scan_dice(dice: str) -> Tuple[int, int, int]:
     """return the scan of a dice
 
-    1D20+4 => 1, 20, 4"""
-    dice_ = dice
-    mod = 0
-    if "+" in dice:
-        mod = int(dice.split("+")[-1])
-        dice_ = dice.split("+")[0]
-    nb = int(dice_.split("d")[0])
-    faces = int(dice_.split("d")[1])
-    return nb, faces, mod
+    1D20+4 => 1, 20, 4, for single term dice. See dice.compile_dice for full expressions"""
+    expr = compile_dice(dice)
+    if not expr.is_simple():
+        raise ValueError(f"Dice {dice} is not a simple NdF+M dice")
+    term = expr.terms[0]
+    return term.nb, term.faces, expr.const
 
 
 def max_dice(dice: str) -> int:
-    nb, faces, mod = scan_dice(dice)
-    return nb * faces + mod
+    return compile_dice(dice).max()
+
+
+def mean_dice(dice: str) -> float:
+    """Expected value of a dice expression"""
+    return compile_dice(dice).mean()
 
 
 def _ask_advantage()-> int:
@@ -38,34 +57,116 @@ def _ask_dice(dice:str, min_:int, max_:int, mod:int)-> int:
     return result
 
 
-def rolldice(dice: str, autoroll=False, advantage: int = 0) -> Tuple[int, float]:
-    nb, faces, mod = scan_dice(dice)
-    min_ = nb
-    max_ = nb * faces
+def rolldice(
+    dice: str,
+    autoroll=False,
+    advantage: int = 0,
+    rng: Optional[np.random.Generator] = None,
+    silent: bool = False,
+) -> Tuple[int, float]:
+    """Roll a dice expression, e.g. 1d20, 2d6+1d4-1, 4d6kh3
+
+    Return the result and its position in the range of the expression, from 0.0 to 1.0.
+    rng: draw from this generator (e.g. an actor stream) instead of the random module
+    silent: do not print the result
+    """
+    autoroll = autoroll or FORCE_AUTOROLL
+    expr = compile_dice(dice)
+    mod = expr.const
+    min_ = expr.min() - mod
+    max_ = expr.max() - mod
     # if not autoroll:
     #     advantage = _ask_advantage()
     if autoroll:
-        result = randint(min_, max_)
+        if rng is None:
+            draw = lambda: expr.roll_dice(randint)
+        else:
+            draw = lambda: expr.roll_dice(lambda lo, hi: int(rng.integers(lo, hi + 1)))
+        result = draw()
         if advantage <= -1:
             for i in range(-advantage):
-                result = min(randint(min_, max_), result)
+                result = min(draw(), result)
         if advantage >= 1:
             for i in range(advantage):
-                result = max(randint(min_, max_), result)
+                result = max(draw(), result)
     else:
-        result = _ask_dice(dice, min_, max_, mod)
-        if advantage <= 1:
+        result = _ask_dice(dice, min_, max_, 0)
+        if advantage <= -1:
             for i in range(-advantage):
-                result = min(_ask_dice(dice, min_, max_, mod), result)
+                result = min(_ask_dice(dice, min_, max_, 0), result)
         if advantage >= 1:
             for i in range(advantage):
-                result = max(_ask_dice(dice, min_, max_, mod), result)
+                result = max(_ask_dice(dice, min_, max_, 0), result)
 
-    normed = (result - min_) / (max_ - min_)
+    normed = (result - min_) / (max_ - min_) if max_ > min_ else 1.0
     result += mod
+    if silent:
+        return result, normed
     if autoroll:
         story_print(f".  Result of {dice}: __{result}__", color="green", justify="right")
     else:
         story_print(f".  Result of {dice}: __{result}__", color="grey", justify="left")
     
     return result, normed
+
+
+# -----------------------------------------------------------
+#  BATCHES OF DICE
+# -----------------------------------------------------------
+def roll_batch(
+    dices: List[str],
+    nb_samples: int,
+    advantage: int = 0,
+    rng: Optional[np.random.Generator] = None,
+    normed: bool = False,
+) -> np.ndarray:
+    """Roll nb_samples of each dice at once, silently, as rolldice would
+
+    Return a (len(dices), nb_samples) array of results,
+    or of positions in the range of each dice (0.0 to 1.0) if normed.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    exprs = [compile_dice(dice) for dice in dices]
+    rolls = np.stack([expr.sample(rng, nb_samples, advantage) for expr in exprs]).reshape(len(exprs), nb_samples)
+    if normed:
+        lo = np.array([expr.min() for expr in exprs])[:, None]
+        hi = np.array([expr.max() for expr in exprs])[:, None]
+        return np.where(hi > lo, (rolls - lo) / np.maximum(hi - lo, 1), 1.0)
+    return rolls
+
+
+class DiceStreams:
+    """Independent random generators, one per actor, from a single seed
+
+    The generator of an actor only depends on the seed and on its name,
+    not on the other actors nor on the order of the rolls.
+    """
+
+    def __init__(self, seed: int = None):
+        self.seed_seq = np.random.SeedSequence(seed)
+        self._streams: Dict[str, np.random.Generator] = {}
+
+    def stream(self, name: str) -> np.random.Generator:
+        if name not in self._streams:
+            key = zlib.crc32(name.encode("utf-8"))
+            seq = np.random.SeedSequence(self.seed_seq.entropy, spawn_key=(key,))
+            self._streams[name] = np.random.default_rng(seq)
+        return self._streams[name]
+
+
+def set_dice_streams(streams: Optional[DiceStreams]):
+    """Roll the dice of each actor from its own stream, or from the random module if None"""
+    global DICE_STREAMS
+    DICE_STREAMS = streams
+
+
+def dice_streams() -> Optional[DiceStreams]:
+    return DICE_STREAMS
+
+
+def actor_rng(name: str) -> Optional[np.random.Generator]:
+    """Dice stream of an actor, None if streams are not enabled"""
+    if DICE_STREAMS is None:
+        return None
+    return DICE_STREAMS.stream(name)
@@ -0,0 +1,165 @@
+"""Catalogs of the game data (spells, equipment), indexed once
+
+A Catalog holds the records of a data file by case-folded name:
+lookups are dict hits, whatever the case used in the character sheets,
+and the instances built from the records (Spell, Weapon, ...) are made
+once per name, then shared.
+
+Catalogs are lazy: the data files are read on the first lookup, not at import.
+The parsed data is cached in a pickle of the user cache folder,
+$XDG_CACHE_HOME/dndassist (~/.cache/dndassist by default), one per install,
+dropped as soon as one of its json sources changes. Without a writable
+cache folder, the json files are parsed at each run. Warm the cache with:
+    python -m dndassist.catalog
+"""
+
+import os
+import json
+import pickle
+import hashlib
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "dndassist",
+)
+CACHE_VERSION = 1
+
+
+def _signature(path: str) -> Tuple[str, int, int]:
+    stat = os.stat(path)
+    return (os.path.basename(path), stat.st_mtime_ns, stat.st_size)
+
+
+def load_data(name: str, sources: List[str], build: Callable[..., Any] = None) -> Any:
+    """build(*parsed json sources), through the pickle cache of name
+
+    sources: json files in the package folder
+    build: combine the parsed sources, the first one by default
+    """
+    paths = [os.path.join(DATA_DIR, source) for source in sources]
+    signature = [CACHE_VERSION] + [_signature(path) for path in paths]
+    install = hashlib.sha1(DATA_DIR.encode("utf-8")).hexdigest()[:8]  # installs share the folder
+    cache = os.path.join(CACHE_DIR, f"catalog_{name}_{install}.pkl")
+    try:
+        with open(cache, "rb") as fin:
+            cached_signature, data = pickle.load(fin)
+        if cached_signature == signature:
+            return data
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+
+    parsed = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as fin:
+            parsed.append(json.load(fin))
+    data = parsed[0] if build is None else build(*parsed)
+    try:  # without a writable cache folder, the json is parsed at each run
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{cache}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fout:
+            pickle.dump((signature, data), fout, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache)
+    except OSError:
+        pass
+    return data
+
+
+def fold(name: str) -> str:
+    """Key of a name in a catalog"""
+    return name.strip().casefold()
+
+
+class Catalog:
+    """Records of a data file, by case-folded name
+
+    records: {name: {field: value}}, the name is kept as written in the file
+    defaults: value of the fields missing in some records
+    loader: returns the records, called on the first lookup (instead of records)
+    """
+
+    def __init__(
+        self,
+        records: Dict[str, Dict[str, Any]] = None,
+        defaults: Dict[str, Any] = None,
+        loader: Callable[[], Dict[str, Dict[str, Any]]] = None,
+    ):
+        self._defaults = defaults or {}
+        self._loader = loader
+        self._index: Optional[Dict[str, Tuple[str, Dict[str, Any]]]] = None
+        self._instances: Dict[Tuple[type, str], Any] = {}
+        if records is not None:
+            self.update(records)
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    def _entries(self) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        if self._index is None:
+            self._index = {}
+            if self._loader is not None:
+                self._add(self._loader())
+        return self._index
+
+    def _add(self, records: Dict[str, Dict[str, Any]]):
+        for name, record in records.items():
+            record = {**self._defaults, **record}
+            record.pop("name", None)  # the key of the record is the name
+            self._index[fold(name)] = (name, record)
+
+    def update(self, records: Dict[str, Dict[str, Any]]):
+        """Add or replace records, e.g. custom equipment"""
+        self._entries()
+        self._add(records)
+        self._instances.clear()
+
+    def __contains__(self, name: str) -> bool:
+        return fold(name) in self._entries()
+
+    def __len__(self) -> int:
+        return len(self._entries())
+
+    def __iter__(self) -> Iterator[str]:
+        """Names, as written in the data file"""
+        return (name for name, _ in self._entries().values())
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Record of a name, None if unknown"""
+        entry = self._entries().get(fold(name))
+        return None if entry is None else entry[1]
+
+    def name_of(self, name: str) -> Optional[str]:
+        """Name as written in the data file"""
+        entry = self._entries().get(fold(name))
+        return None if entry is None else entry[0]
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        return iter(self._entries().values())
+
+    def instance(self, cls: Callable[..., Any], name: str, what: str = "Item") -> Any:
+        """cls(name=..., **record), built once per name, ValueError if unknown
+
+        The instances are shared: do not modify them.
+        """
+        key = fold(name)
+        try:
+            return self._instances[(cls, key)]
+        except KeyError:
+            pass
+        if key not in self._entries():
+            raise ValueError(f"{what} '{name}' not found")
+        file_name, record = self._entries()[key]
+        obj = cls(name=file_name, **record)
+        self._instances[(cls, key)] = obj
+        return obj
+
+
+if __name__ == "__main__":
+    from dndassist.spellcasting import SPELLS
+    from dndassist.equipment import CATALOGS, EQUIPMENT
+
+    for catalog in [SPELLS, EQUIPMENT] + list(CATALOGS.values()):
+        len(catalog)  # loads, and caches, the data
+    print(f"Catalog caches written in {CACHE_DIR}")
@@ -7,8 +7,8 @@ from textwrap import indent
 from colorama import Fore, Style, init
 import random
 
-from dndassist.autoroll import rolldice
-from dndassist.equipment import weapon_catg, Weapon, equipment_weight
+from dndassist.autoroll import rolldice, actor_rng
+from dndassist.equipment import weapon_catg, Weapon, Armor, Shield, equipment_weight
 from dndassist.spellcasting import item_is_offensive_spell, Spell
 from dndassist.storyprint import story_print
 
@@ -89,52 +89,89 @@ class Character:
     @classmethod
     def load(cls, wkdir:str, path: str) -> "Character":
         """Load a character from a YAML file."""
+        data = cls.load_data(wkdir, path)
+        data["wkdir"]=wkdir
+        return cls(**data)
+
+    @staticmethod
+    def load_data(wkdir:str, path: str) -> dict:
+        """Read the YAML file of a character, as a dict"""
         full_path = os.path.join(wkdir,"Characters",path)
         if not os.path.exists(full_path):
             raise FileNotFoundError(f"No such character file: {full_path}")
         with open(full_path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f)
-            data["wkdir"]=wkdir
-        return cls(**data)
+            return yaml.safe_load(f)
 
     @classmethod
     def load_from_dict(cls, data:dict) -> "Character":
         """Load a character from a dict description"""
         return cls(**data)
     
+    # ---------- Derived stats ----------
+    # computed once, forgotten when one of these fields is set
+    _DERIVED_FROM = frozenset(
+        ["attributes", "level", "proficiency_bonus", "equipment", "spells", "equipped", "weapon_mastery"]
+    )
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in Character._DERIVED_FROM:
+            object.__setattr__(self, "_derived", None)
+
+    def invalidate(self):
+        """Forget the derived stats, after changing attributes, equipped... in place
+
+        Changes of the equipment and spells lists, in place or not, are noticed anyway.
+        """
+        object.__setattr__(self, "_derived", None)
+
+    def _derived_stats(self) -> dict:
+        """Cache of the derived stats (not a field: stays out of asdict and saves)"""
+        items = (tuple(self.equipment), tuple(self.spells or []))
+        derived = self.__dict__.get("_derived")
+        if derived is None or derived["items"] != items:
+            derived = {"items": items, "attr_mod": {}, "attack_bonus": {}}
+            object.__setattr__(self, "_derived", derived)
+        return derived
+
     def attr_mod(self, attr) -> int:
         """Return attribute modifier"""
-        return floor((self.attributes[attr] - 10) / 2)
+        mods = self._derived_stats()["attr_mod"]
+        if attr not in mods:
+            mods[attr] = floor((self.attributes[attr] - 10) / 2)
+        return mods[attr]
 
     def available_ranges(self) -> List[Tuple[str, int, str]]:
         """return all weapon ranges available, from the longest to the shortest
         as a list of weapon_name, range, and damage_dice"""
-        found_ranges = []
-        for item in self.equipment:
-            if weapon_catg(item) is not None:
-                weapon = Weapon.from_name(item)
-                range_ = weapon.range_normal
-                damage_ = weapon.damage_dice
-                if weapon.range_long is not None:
-                    range_ = weapon.range_long
-                found_ranges.append((item, range_, damage_))
-
-        sorted_ranges = sorted(found_ranges, key=lambda x: x[1], reverse=True)
-        return sorted_ranges
+        derived = self._derived_stats()
+        if "ranges" not in derived:
+            found_ranges = []
+            for item in self.equipment:
+                if weapon_catg(item) is not None:
+                    weapon = Weapon.from_name(item)
+                    range_ = weapon.range_normal
+                    damage_ = weapon.damage_dice
+                    if weapon.range_long is not None:
+                        range_ = weapon.range_long
+                    found_ranges.append((item, range_, damage_))
+            derived["ranges"] = sorted(found_ranges, key=lambda x: x[1], reverse=True)
+        return list(derived["ranges"])
 
     def available_hex_ranges(self) -> List[Tuple[str, int, str]]:
         """return all hexes ranges available, from the longest to the shortest
         as a list of weapon_name, range, and damage_dice"""
-        found_ranges = []
-        for item in self.spells:
-            if item_is_offensive_spell(item) :
-                spell = Spell.from_name(item)
-                range_ = spell.range
-                damage_ = spell.damage_dice
-                found_ranges.append((item, range_, damage_))
-
-        sorted_ranges = sorted(found_ranges, key=lambda x: x[1], reverse=True)
-        return sorted_ranges
+        derived = self._derived_stats()
+        if "hex_ranges" not in derived:
+            found_ranges = []
+            for item in self.spells or []: # "spells: null" in some yaml
+                if item_is_offensive_spell(item) :
+                    spell = Spell.from_name(item)
+                    range_ = spell.range
+                    damage_ = spell.damage_dice
+                    found_ranges.append((item, range_, damage_))
+            derived["hex_ranges"] = sorted(found_ranges, key=lambda x: x[1], reverse=True)
+        return list(derived["hex_ranges"])
     
     def equipped_armor(self) -> str:
         return self.equipped["armor"]
@@ -145,13 +182,50 @@ class Character:
     def defense_bonus(self) -> int:
         return 0
 
+    def defense_parts(self) -> Tuple[Optional[str], int, int, Optional[str], int]:
+        """Defense of the character, as armor name, armor score, dex. bonus, shield name, shield score"""
+        derived = self._derived_stats()
+        if "defense" not in derived:
+            dex_bonus = 0
+            armor_name = self.equipped_armor()
+            if armor_name is None:
+                armor_score = 0
+            else:
+                armor = Armor.from_name(armor_name)
+                armor_score = armor.base
+                if armor.dex_bonus:
+                    max_dex = 100
+                    if armor.max_bonus is not None:
+                        max_dex = armor.max_bonus
+                    dex_bonus = min(self.attr_mod("dexterity"), max_dex)
+
+            shield_name = self.equipped_shield()
+            if shield_name is None:
+                shield_score = 0
+            else:
+                shield_score = Shield.from_name(shield_name).base
+            derived["defense"] = (armor_name, armor_score, dex_bonus, shield_name, shield_score)
+        return derived["defense"]
+
+    def defense_score(self) -> int:
+        """Score an attack must reach to hit the character"""
+        _, armor_score, dex_bonus, _, shield_score = self.defense_parts()
+        return (
+            armor_score
+            + shield_score
+            + dex_bonus
+            + self.defense_bonus()  # Dons, sorts, etc.
+        )
+
     def attack_bonus(self, weapon_name) -> int:
-        cat = weapon_catg(weapon_name)
-        if cat is None:
-            return 0
-        if self.weapon_mastery[cat] == "proficient":
-            return self.proficiency_bonus
-        return 0
+        bonuses = self._derived_stats()["attack_bonus"]
+        if weapon_name not in bonuses:
+            cat = weapon_catg(weapon_name)
+            bonus = 0
+            if cat is not None and self.weapon_mastery[cat] == "proficient":
+                bonus = self.proficiency_bonus
+            bonuses[weapon_name] = bonus
+        return bonuses[weapon_name]
 
     def get_damage(self, damage: int) -> bool:
         """Apply damage to character
@@ -187,7 +261,7 @@ class Character:
             success = 0
             fails = 0
             while 1:
-                fate,_ = rolldice("1d20")
+                fate,_ = rolldice("1d20", rng=actor_rng(self.name))
                 if fate == 20:
                     success = 3
                 elif fate >= 10:
@@ -217,20 +291,49 @@ class Character:
             weight+= equipment_weight(item)
         return weight
 
-    def add_item(self, item:str)->bool:
-        """Add an item in Character inventory, return false if too heavy"""
-        weight = self._count_cargo()+equipment_weight(item)
+    def cargo(self) -> float:
+        """Weight of the equipment, in Kgs
+
+        Kept up to date by add_item and remove_item,
+        recounted only if the equipment list was replaced or changed elsewhere.
+        """
+        cached = getattr(self, "_cargo", None)  # not a field: stays out of asdict and saves
+        if cached is None or cached[1] is not self.equipment or cached[2] != len(self.equipment):
+            cached = (self._count_cargo(), self.equipment, len(self.equipment))
+            self._cargo = cached
+        return cached[0]
+
+    def add_item(self, item:str, check_cargo: bool=True)->bool:
+        """Add an item in Character inventory, return false if too heavy
+
+        check_cargo: if False, accept the item whatever its weight (e.g. a trade)"""
+        item_weight = equipment_weight(item)
+        weight = self.cargo()+item_weight
 
-        if weight > self.max_cargo:
+        if check_cargo and weight > self.max_cargo:
             return False
         
         self.equipment.append(item)
+        self._cargo = (weight, self.equipment, len(self.equipment))
 
         if weight > 0.8*self.max_cargo:
             if "heavy equipement" not in self.current_state["conditions"]:
                 self.current_state["conditions"].append("heavy equipement")
         return True
 
+    def remove_item(self, item:str, nb: int=1)->bool:
+        """Remove nb items from Character inventory, return false (and keep them) if missing"""
+        if self.equipment.count(item) < nb:
+            return False
+        weight = self.cargo()
+        for _ in range(nb):
+            self.equipment.remove(item)
+        weight -= nb*equipment_weight(item)
+        self._cargo = (weight, self.equipment, len(self.equipment))
+        if weight <= 0.8*self.max_cargo and "heavy equipement" in self.current_state["conditions"]:
+            self.current_state["conditions"].remove("heavy equipement")
+        return True
+
     def max_distance(self):
         """return the maximum distance """
         max_dist = self.max_speed
@@ -238,28 +341,35 @@ class Character:
             max_dist = int(max_dist*0.6)
         return max_dist
 
-    def situation(self):
-        """Retur the current situation of the character"""
-        pronoun = "He"
-        possessive = "His"
+    def _pronouns(self) -> Tuple[str, str]:
         if self.gender == "female":
-            pronoun = "She"
-            possessive = "Her"
-        
+            return "She", "Her"
         if self.gender == "unknown":
-            pronoun = "It"
-            possessive = "Its" 
-
-        situation  = f"__{self.name}__ is a {self.gender} {self.race} {self.char_class} character  of level {self.level}"
-        situation  += "\n" +f"{pronoun} belongs to the faction {self.faction}, with the alignment {self.alignment}"
-        situation  += "\n" +self.notes
-        situation += "\nCurrently:"
-        situation  +=f"\n {possessive} hit points :  {self.current_state['current_hp']}/{self.max_hp}"
+            return "It", "Its"
+        return "He", "His"
+
+    def identity(self) -> str:
+        """Who the character is, the same from turn to turn"""
+        pronoun, _ = self._pronouns()
+        identity  = f"__{self.name}__ is a {self.gender} {self.race} {self.char_class} character  of level {self.level}"
+        identity  += "\n" +f"{pronoun} belongs to the faction {self.faction}, with the alignment {self.alignment}"
+        identity  += "\n" +self.notes
+        return identity
+
+    def state_report(self) -> str:
+        """Current hit points, conditions and equipment of the character"""
+        _, possessive = self._pronouns()
+        report = "Currently:"
+        report  +=f"\n {possessive} hit points :  {self.current_state['current_hp']}/{self.max_hp}"
         if self.current_state["conditions"]:
-            situation  +=f"\n {possessive} conditions: {','.join(self.current_state['conditions'])}"
+            report  +=f"\n {possessive} conditions: {','.join(self.current_state['conditions'])}"
         if self.equipment:
-            situation  +=f"\n {possessive} equipment: {','.join(self.equipment)}"
-        return situation
+            report  +=f"\n {possessive} equipment: {','.join(self.equipment)}"
+        return report
+
+    def situation(self):
+        """Retur the current situation of the character"""
+        return self.identity() + "\n" + self.state_report()
     
 
     def status_str(self)-> Tuple[str,str]:
@@ -272,7 +382,7 @@ class Character:
         situation  += "\n" +f"Max speed {self.max_speed} m"
         
         situation  +=f"\n\n hit points  :  {self.current_state['current_hp']}HP/{self.max_hp}HP"
-        situation  +=f"\n\n payload     :  {self._count_cargo()}Kg/{self.max_cargo}Kg"
+        situation  +=f"\n\n payload     :  {self.cargo()}Kg/{self.max_cargo}Kg"
         situation  +=f"\n\n conditions  :  {','.join(self.current_state['conditions'])}"
         situation  +=f"\n\n __Money__ :"
         _list_str =[]
@@ -0,0 +1,157 @@
+"""Compiled rooms, to skip the YAML parsing and grid building on reload
+
+A room is compiled on its first load into Rooms/.compiled/<room>/ :
+- meta.json: format version and the mtime/size of every source file
+  (room yaml, theme yaml, character yamls)
+- sources.pkl: the parsed yaml data (room, theme, characters) and the tile palette
+- *.npy: the grids (tile kinds, elevation, obstacles_elev, opacity),
+  memory-mapped on later loads
+
+A compiled room is dropped as soon as one of its sources changes.
+Paths are relative to the scenario folder, which can then be moved.
+
+A scenario received from someone else may hold a .compiled folder:
+sources.pkl is read with an unpickler limited to the classes of a room
+(SAFE_CLASSES), any other content makes the room compiled again.
+The .compiled folders are local caches, not to be shipped with a scenario.
+"""
+
+import os
+import json
+import pickle
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+
+from dndassist.themes import Theme
+from dndassist.tilegrid import Tile
+
+COMPILED_DIR = ".compiled"
+ARRAYS = ["kind", "elevation", "obstacles_elev", "opacity"]
+SAFE_CLASSES = {  # all sources.pkl may hold, besides plain data
+    ("dndassist.themes", "Theme"),
+    ("dndassist.themes", "TileSpec"),
+    ("dndassist.tilegrid", "Tile"),
+    ("datetime", "date"),  # yaml dates
+    ("datetime", "datetime"),
+}
+
+
+class _SourcesUnpickler(pickle.Unpickler):
+    """Unpickler refusing any class out of SAFE_CLASSES"""
+
+    def find_class(self, module, name):
+        if (module, name) not in SAFE_CLASSES:
+            raise pickle.UnpicklingError(f"{module}.{name} is not allowed in a compiled room")
+        return super().find_class(module, name)
+
+
+def _signature(wkdir: str, path: str) -> List:
+    stat = os.stat(os.path.join(wkdir, path))
+    return [path, stat.st_mtime_ns, stat.st_size]
+
+
+@contextmanager
+def _replacing(path: str):
+    """Binary file written to a temporary name, then moved to path"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as fout:
+            yield fout
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+@dataclass
+class CompiledRoom:
+    """Everything RoomMap.load needs, without parsing
+
+    data: the room yaml
+    theme: the theme of the room
+    characters: the character yamls of the actors, by file name
+    palette: the tile kinds of the map
+    arrays: the (width, height) grids, see ARRAYS
+    sources: the files this room was built from, relative to the scenario folder
+    """
+
+    VERSION = 2  # 2: slotted Tile
+
+    data: dict
+    theme: Theme
+    characters: Dict[str, dict]
+    palette: List[Tile]
+    arrays: Dict[str, np.ndarray]
+    sources: List[str] = field(default_factory=list)
+
+    @staticmethod
+    def directory(wkdir: str, room_name: str) -> str:
+        name = os.path.splitext(room_name)[0]
+        return os.path.join(wkdir, "Rooms", COMPILED_DIR, name)
+
+    def save(self, wkdir: str, room_name: str):
+        """Write the compiled room, meta.json last so that a partial write is never used
+
+        Each file is written aside then moved into place: a room loaded earlier
+        keeps mapping the old file, which is never rewritten.
+        """
+        directory = self.directory(wkdir, room_name)
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name in ARRAYS:
+            with _replacing(os.path.join(directory, name + ".npy")) as fout:
+                np.save(fout, self.arrays[name])
+        with _replacing(os.path.join(directory, "sources.pkl")) as fout:
+            pickle.dump(
+                (self.data, self.theme, self.characters, self.palette),
+                fout,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        meta = {
+            "version": self.VERSION,
+            "sources": [_signature(wkdir, path) for path in self.sources],
+        }
+        with _replacing(meta_path) as fout:
+            fout.write(json.dumps(meta, indent=1).encode("utf-8"))
+
+    @classmethod
+    def load(cls, wkdir: str, room_name: str) -> Optional["CompiledRoom"]:
+        """Load a compiled room, None if missing, from another version, out of date, or unsafe"""
+        directory = cls.directory(wkdir, room_name)
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as fin:
+            meta = json.load(fin)
+        if meta.get("version") != cls.VERSION:
+            return None
+        for path, mtime_ns, size in meta["sources"]:
+            try:
+                if _signature(wkdir, path) != [path, mtime_ns, size]:
+                    return None
+            except FileNotFoundError:
+                return None
+
+        try:
+            with open(os.path.join(directory, "sources.pkl"), "rb") as fin:
+                data, theme, characters, palette = _SourcesUnpickler(fin).load()
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+            return None
+        # copy on write: the room can modify its grids, the files are never changed
+        # (a recompilation replaces them, see save)
+        arrays = {
+            name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="c")
+            for name in ARRAYS
+        }
+        return cls(
+            data=data,
+            theme=theme,
+            characters=characters,
+            palette=palette,
+            arrays=arrays,
+            sources=[path for path, _, _ in meta["sources"]],
+        )
@@ -0,0 +1,183 @@
+"""Exact probability distributions of damage, for weapons and spells
+
+Same rules as attack() and offensive_spell(), without rolling any dice:
+- dice are dice expressions, see dice.compile_dice
+- advantage keeps the best (or worst) of several rolls
+- weapons: fumble on 1, critical hit on 20 with advantage (damage dice doubled)
+- ranged spells: misfire on 1 (half damage to the caster), magic burst on 20
+  (double damage, no saving throw), miss below 10
+- saving throws: no damage on 20, half damage above 8 + chant modifier
+
+Distributions are dice.Pmf objects, arrays of probabilities over consecutive integers.
+Results are memoized on the numbers that matter (modifiers, defense, dice),
+so all the actors sharing a character sheet share the same computation.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+from dndassist.dice import Pmf, compile_dice
+from dndassist.character import Character
+from dndassist.equipment import Weapon
+from dndassist.spellcasting import Spell
+from dndassist.attack import defense_score, weapon_modifier, spell_modifier
+
+
+@lru_cache(maxsize=None)
+def roll_pmf(faces: int, advantage: int = 0) -> Pmf:
+    """Pmf of one die of faces faces, with advantage (best of) or disadvantage (worst of)"""
+    return Pmf.uniform(1, faces).best_of(advantage)
+
+
+def dice_pmf(dice: str, advantage: int = 0) -> Pmf:
+    """Pmf of rolldice(dice, advantage=advantage)"""
+    return compile_dice(dice).pmf(advantage)
+
+
+@dataclass(frozen=True, eq=False)
+class DamageOdds:
+    """Outcome of one attack or offensive spell
+
+    hit: probability to damage the defender (critical hits included)
+    critical: probability of a critical hit, or of a magic burst
+    fumble: probability of a fumble, or of a misfire
+    saved: probability of a saving throw halving or canceling the damage
+    damage: damage to the defender, 0 when missed
+    self_damage: damage to the attacker (spell misfire)
+    """
+
+    hit: float
+    critical: float
+    fumble: float
+    saved: float
+    damage: Pmf
+    self_damage: Pmf
+
+    @property
+    def expected_damage(self) -> float:
+        return self.damage.mean()
+
+
+# -----------------------------------------------------------
+#  WEAPONS
+# -----------------------------------------------------------
+@lru_cache(maxsize=4096)
+def _weapon_odds(damage_dice: str, to_hit: int, damage_mod: int, defense: int, advantage: int) -> DamageOdds:
+    d20 = roll_pmf(20, advantage).p
+    rolls = np.arange(1, 21)
+    critical = float(d20[19]) if advantage > 0 else 0.0
+    normal = (rolls + to_hit - defense >= 0) & (rolls > 1)
+    if advantage > 0:
+        normal[19] = False
+    p_normal = float(d20[normal].sum())
+    p_miss = 1.0 - p_normal - critical
+
+    dmg = dice_pmf(damage_dice, advantage)
+    damage = Pmf.mixture([
+        (p_miss, Pmf.point(0)),
+        (p_normal, dmg + damage_mod),
+        (critical, dmg.times(2) + damage_mod),
+    ])
+    return DamageOdds(
+        hit=p_normal + critical,
+        critical=critical,
+        fumble=float(d20[0]),
+        saved=0.0,
+        damage=damage,
+        self_damage=Pmf.point(0),
+    )
+
+
+def weapon_odds(attacker: Character, weapon_name: str, defender: Character, advantage: int = 0) -> DamageOdds:
+    """Distribution of attack(attacker, weapon_name, defender, advantage)"""
+    weapon = Weapon.from_name(weapon_name)
+    _, attr_modifier = weapon_modifier(attacker, weapon)
+    to_hit = attr_modifier + attacker.attack_bonus(weapon_name) + weapon.damage_bonus
+    return _weapon_odds(
+        weapon.damage_dice,
+        to_hit,
+        attr_modifier + weapon.damage_bonus,
+        defense_score(defender),
+        advantage,
+    )
+
+
+# -----------------------------------------------------------
+#  SPELLS
+# -----------------------------------------------------------
+def _saving_throw(dmg: Pmf, save_mod: Optional[int], chant: int, advantage: int) -> Tuple[Pmf, float]:
+    """Damage after the saving throw of the defender, and the probability of a save"""
+    if save_mod is None:
+        return dmg, 0.0
+    d20 = roll_pmf(20, advantage).p
+    rolls = np.arange(1, 21)
+    dodge = float(d20[19])
+    partial = float(d20[(rolls < 20) & (rolls + save_mod > 8 + chant)].sum())
+    full = 1.0 - dodge - partial
+    damage = Pmf.mixture([(dodge, Pmf.point(0)), (partial, dmg.halved()), (full, dmg)])
+    return damage, dodge + partial
+
+
+@lru_cache(maxsize=4096)
+def _spell_odds(damage_dice: str, ranged: bool, chant: int, save_mod: Optional[int], advantage: int) -> DamageOdds:
+    dmg = dice_pmf(damage_dice)
+    saved_dmg, p_saved = _saving_throw(dmg, save_mod, chant, advantage)
+    if not ranged:
+        return DamageOdds(
+            hit=1.0,  # touch spells always reach, saving throws aside
+            critical=0.0,
+            fumble=0.0,
+            saved=p_saved,
+            damage=saved_dmg,
+            self_damage=Pmf.point(0),
+        )
+
+    d20 = roll_pmf(20, advantage).p
+    rolls = np.arange(1, 21)
+    misfire, burst = float(d20[0]), float(d20[19])
+    accurate = float(d20[(rolls > 1) & (rolls < 20) & (rolls + chant >= 10)].sum())
+    missed = 1.0 - misfire - burst - accurate
+    damage = Pmf.mixture([
+        (misfire + missed, Pmf.point(0)),
+        (burst, dmg.times(2)),
+        (accurate, saved_dmg),
+    ])
+    self_damage = Pmf.mixture([(1.0 - misfire, Pmf.point(0)), (misfire, dmg.halved())])
+    return DamageOdds(
+        hit=burst + accurate,
+        critical=burst,
+        fumble=misfire,
+        saved=accurate * p_saved,
+        damage=damage,
+        self_damage=self_damage,
+    )
+
+
+def spell_odds(attacker: Character, spell_name: str, defender: Character, advantage: int = 0) -> DamageOdds:
+    """Distribution of offensive_spell(attacker, spell_name, defender, advantage)"""
+    spell = Spell.from_name(spell_name)
+    save_mod = None
+    if spell.saving_throw is not None:
+        save_mod = defender.attr_mod(spell.saving_throw)
+    return _spell_odds(spell.damage_dice, spell.range > 2, spell_modifier(attacker), save_mod, advantage)
+
+
+# -----------------------------------------------------------
+#  ALL OPTIONS OF AN ATTACKER
+# -----------------------------------------------------------
+def damage_table(attacker: Character, defender: Character, advantage: int = 0) -> Dict[str, DamageOdds]:
+    """Odds of every weapon and offensive spell of the attacker against the defender"""
+    table = {}
+    for weapon_name, _, _ in attacker.available_ranges():
+        table[weapon_name] = weapon_odds(attacker, weapon_name, defender, advantage)
+    for spell_name, _, _ in attacker.available_hex_ranges():
+        table[spell_name] = spell_odds(attacker, spell_name, defender, advantage)
+    return table
+
+
+def clear_cache():
+    """Forget the memoized distributions, e.g. after editing equipment or spells"""
+    _weapon_odds.cache_clear()
+    _spell_odds.cache_clear()
@@ -0,0 +1,171 @@
+"""Decisions of the LLM already taken, kept on disk
+
+NPCs of a quiet room are asked nearly the same question round after round.
+A decision is stored under a hash of its normalized context, title and options:
+the same question gets the same answer without asking the LLM again.
+
+Decisions expire after ttl seconds, and the least recently used ones
+are dropped beyond max_entries. bypass asks the LLM again for every decision
+(fresh play), the new decisions being still recorded.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+import hashlib
+from typing import List, Optional, Tuple
+
+EVICT_EVERY = 100  # puts between two evictions
+
+
+def _normalized(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class DecisionCache:
+    """LLM decisions by question, in a sqlite file
+
+    path: sqlite file, created with the first decision recorded, ":memory:" for this process only
+    ttl: seconds a decision is kept, None for ever
+    max_entries: the least recently used decisions are dropped beyond
+    bypass: never read the cache, only record
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: Optional[float] = 7 * 24 * 3600,
+        max_entries: int = 10000,
+        bypass: bool = False,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.bypass = bypass
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()  # NPC decisions are prefetched from other threads
+        self._puts = 0
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS decisions ("
+                " key TEXT PRIMARY KEY, option TEXT, comment TEXT, created REAL, used REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS decisions_used ON decisions (used)")
+        return self._db
+
+    def _stored(self) -> bool:
+        """True if decisions may be stored already: reads do not create the file"""
+        return self._db is not None or self.path == ":memory:" or os.path.exists(self.path)
+
+    @staticmethod
+    def key(context: str, title: str, options: List[str]) -> str:
+        """Hash of a question, whitespace and case of the context and title aside"""
+        text = "\x1f".join([_normalized(context), _normalized(title), "\x1e".join(options)])
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, context: str, title: str, options: List[str]) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            if not self._stored():
+                return None
+            key = self.key(context, title, options)
+            now = time.time()
+            row = self.db.execute(
+                "SELECT option, comment, created FROM decisions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[2] > self.ttl:
+                self.db.execute("DELETE FROM decisions WHERE key = ?", (key,))
+                self.db.commit()
+                return None
+            if row is None or row[0] not in (option.strip() for option in options):
+                return None
+            self.db.execute("UPDATE decisions SET used = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            return row[0], row[1]
+
+    def get(self, context: str, title: str, options: List[str]) -> Optional[Tuple[str, str]]:
+        """Decision (option, comment) already taken for this question, None if none"""
+        if self.bypass:
+            self.stats["bypassed"] += 1
+            return None
+        decision = self._lookup(context, title, options)
+        self.stats["hits" if decision is not None else "misses"] += 1
+        return decision
+
+    def has(self, context: str, title: str, options: List[str]) -> bool:
+        """True if get() would answer this question, the stats aside"""
+        return not self.bypass and self._lookup(context, title, options) is not None
+
+    def put(self, context: str, title: str, options: List[str], decision: Tuple[str, str]):
+        """Record the decision taken for this question"""
+        with self._lock:
+            now = time.time()
+            option, comment = decision
+            self.db.execute(
+                "INSERT OR REPLACE INTO decisions VALUES (?, ?, ?, ?, ?)",
+                (self.key(context, title, options), option, comment, now, now),
+            )
+            self.db.commit()
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self.evict()
+
+    def evict(self):
+        """Drop the expired decisions, then the least recently used beyond max_entries"""
+        with self._lock:
+            if self.ttl is not None:
+                self.db.execute("DELETE FROM decisions WHERE created < ?", (time.time() - self.ttl,))
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                self.db.execute(
+                    "DELETE FROM decisions WHERE key IN"
+                    " (SELECT key FROM decisions ORDER BY used LIMIT ?)",
+                    (excess,),
+                )
+            self.db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            if not self._stored():
+                return 0
+            return self.db.execute("SELECT COUNT(*) FROM decisions").fetchone()[0]
+
+    def hit_rate(self) -> float:
+        """Share of the questions answered by the cache"""
+        asked = self.stats["hits"] + self.stats["misses"] + self.stats["bypassed"]
+        return self.stats["hits"] / asked if asked else 0.0
+
+    def clear(self):
+        with self._lock:
+            self.db.execute("DELETE FROM decisions")
+            self.db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_CACHE: Optional[DecisionCache] = None
+
+
+def decision_cache() -> Optional[DecisionCache]:
+    """Cache of the LLM decisions, None if decisions are not cached"""
+    return _CACHE
+
+
+def set_decision_cache(cache: Optional[DecisionCache]):
+    """Cache the LLM decisions in this cache, None to stop caching"""
+    global _CACHE
+    if _CACHE is not None and _CACHE is not cache:
+        _CACHE.close()
+    _CACHE = cache
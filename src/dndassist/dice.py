@@ -0,0 +1,304 @@
+"""Dice expressions, compiled once
+
+Grammar, case insensitive, spaces ignored:
+    expression := term (("+" | "-") term)*
+    term       := [N] "d" F [("kh" | "kl") K]  |  integer
+
+e.g. "1d20", "d8", "1d8-1", "2d6+1d4+2", "4d6kh3" (best 3 of 4d6), "2d20kl1".
+Each die of a term is rolled: 2d6 is the sum of two d6.
+
+compile_dice(text) parses an expression once, and caches it.
+A DiceExpr gives its exact min, max, mean and distribution (Pmf),
+and rolls one value or a whole NumPy batch.
+"""
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+MAX_KEEP_OUTCOMES = 2_000_000  # combinations enumerated for the pmf of a keep term
+
+
+# -----------------------------------------------------------
+#  PROBABILITY MASS FUNCTIONS
+# -----------------------------------------------------------
+class Pmf:
+    """Probability mass function over the integers offset, offset+1, ..."""
+
+    __slots__ = ("offset", "p")
+
+    def __init__(self, offset: int, p: np.ndarray):
+        p = np.asarray(p, dtype=float)
+        nonzero = np.flatnonzero(p)
+        if nonzero.size:  # trim the null tails
+            p = p[nonzero[0]:nonzero[-1] + 1]
+            offset += int(nonzero[0])
+        p.flags.writeable = False  # shared by the memoized results
+        self.offset = int(offset)
+        self.p = p
+
+    @classmethod
+    def point(cls, value: int) -> "Pmf":
+        return cls(value, [1.0])
+
+    @classmethod
+    def uniform(cls, lo: int, hi: int) -> "Pmf":
+        return cls(lo, np.full(hi - lo + 1, 1.0 / (hi - lo + 1)))
+
+    @classmethod
+    def mixture(cls, weighted: List[Tuple[float, "Pmf"]]) -> "Pmf":
+        """Pmf of an outcome drawn from pmf with probability weight"""
+        weighted = [(w, pmf) for w, pmf in weighted if w > 0]
+        lo = min(pmf.offset for _, pmf in weighted)
+        hi = max(pmf.max() for _, pmf in weighted)
+        p = np.zeros(hi - lo + 1)
+        for w, pmf in weighted:
+            p[pmf.offset - lo:pmf.max() - lo + 1] += w * pmf.p
+        return cls(lo, p)
+
+    # -------------------------------------------
+    def values(self) -> np.ndarray:
+        return np.arange(self.offset, self.offset + len(self.p))
+
+    def max(self) -> int:
+        return self.offset + len(self.p) - 1
+
+    def mean(self) -> float:
+        return float(np.dot(self.values(), self.p))
+
+    def var(self) -> float:
+        return float(np.dot((self.values() - self.mean()) ** 2, self.p))
+
+    def prob(self, value: int) -> float:
+        if self.offset <= value <= self.max():
+            return float(self.p[value - self.offset])
+        return 0.0
+
+    def prob_at_least(self, value: int) -> float:
+        return float(self.p[max(0, value - self.offset):].sum())
+
+    def as_dict(self) -> Dict[int, float]:
+        return {int(v): float(p) for v, p in zip(self.values(), self.p) if p > 0}
+
+    # -------------------------------------------
+    def __add__(self, other) -> "Pmf":
+        """Sum of independent outcomes, or shift by a constant"""
+        if isinstance(other, Pmf):
+            return Pmf(self.offset + other.offset, np.convolve(self.p, other.p))
+        return Pmf(self.offset + int(other), self.p)
+
+    __radd__ = __add__
+
+    def map(self, func: Callable[[np.ndarray], np.ndarray]) -> "Pmf":
+        """Pmf of func(outcome), func working on integer arrays"""
+        values = func(self.values())
+        lo = int(values.min())
+        p = np.zeros(int(values.max()) - lo + 1)
+        np.add.at(p, values - lo, self.p)
+        return Pmf(lo, p)
+
+    def times(self, factor: int) -> "Pmf":
+        return self.map(lambda v: v * factor)
+
+    def halved(self) -> "Pmf":
+        return self.map(lambda v: v // 2)
+
+    def repeat(self, nb: int) -> "Pmf":
+        """Sum of nb independent outcomes, e.g. the damage of nb rounds"""
+        total = Pmf.point(0)
+        power = self
+        while nb:
+            if nb & 1:
+                total = total + power
+            power = power + power
+            nb >>= 1
+        return total
+
+    def best_of(self, advantage: int) -> "Pmf":
+        """Pmf of the best of advantage+1 outcomes, or the worst of -advantage+1"""
+        if advantage == 0:
+            return self
+        k = abs(advantage) + 1
+        cdf = np.cumsum(self.p)
+        if advantage > 0:
+            p = np.diff(np.minimum(cdf, 1.0) ** k, prepend=0.0)
+        else:
+            sf = np.maximum(1.0 - np.concatenate([[0.0], cdf[:-1]]), 0.0)  # P(outcome >= value)
+            p = sf ** k - np.append(sf[1:] ** k, 0.0)
+        return Pmf(self.offset, p)
+
+    def __repr__(self):
+        return f"Pmf(mean={self.mean():.3f}, support=[{self.offset}, {self.max()}])"
+
+
+# -----------------------------------------------------------
+#  EXPRESSIONS
+# -----------------------------------------------------------
+@dataclass(frozen=True)
+class DiceTerm:
+    """sign * (nb dice of faces faces, keeping the keep highest or lowest ones)"""
+
+    sign: int
+    nb: int
+    faces: int
+    keep: Optional[int] = None
+    highest: bool = True
+
+    @property
+    def nb_kept(self) -> int:
+        return self.nb if self.keep is None else min(self.keep, self.nb)
+
+    def _bounds(self) -> Tuple[int, int]:
+        lo, hi = self.nb_kept * min(1, self.faces), self.nb_kept * self.faces
+        return (lo, hi) if self.sign > 0 else (-hi, -lo)
+
+    def pmf(self) -> Pmf:
+        if self.faces == 0 or self.nb_kept == 0:
+            return Pmf.point(0)
+        if self.keep is None or self.keep >= self.nb:
+            pmf = Pmf.uniform(1, self.faces).repeat(self.nb)
+        else:
+            if self.faces ** self.nb > MAX_KEEP_OUTCOMES:
+                raise ValueError(f"Too many dice to keep in {self.nb}d{self.faces}")
+            faces = np.arange(1, self.faces + 1)
+            rolls = np.stack(np.meshgrid(*[faces] * self.nb, indexing="ij"), axis=-1)
+            rolls = np.sort(rolls.reshape(-1, self.nb), axis=1)
+            kept = rolls[:, -self.keep:] if self.highest else rolls[:, :self.keep]
+            totals = kept.sum(axis=1)
+            pmf = Pmf(0, np.bincount(totals) / len(totals))
+        return pmf if self.sign > 0 else pmf.map(lambda v: -v)
+
+    def sample(self, rng: np.random.Generator, size) -> np.ndarray:
+        size = tuple(np.atleast_1d(size))
+        if self.faces == 0 or self.nb_kept == 0:
+            return np.zeros(size, dtype=np.int64)
+        rolls = rng.integers(1, self.faces + 1, size=size + (self.nb,))
+        if self.keep is not None and self.keep < self.nb:
+            rolls = np.sort(rolls, axis=-1)
+            rolls = rolls[..., -self.keep:] if self.highest else rolls[..., :self.keep]
+        return self.sign * rolls.sum(axis=-1)
+
+    def roll(self, randint: Callable[[int, int], int]) -> int:
+        if self.faces == 0 or self.nb_kept == 0:
+            return 0
+        rolls = sorted(randint(1, self.faces) for _ in range(self.nb))
+        if self.keep is not None and self.keep < self.nb:
+            rolls = rolls[-self.keep:] if self.highest else rolls[:self.keep]
+        return self.sign * sum(rolls)
+
+
+@dataclass(frozen=True)
+class DiceExpr:
+    """A compiled dice expression: dice terms, plus a constant"""
+
+    text: str
+    terms: Tuple[DiceTerm, ...]
+    const: int = 0
+    # computed once: bounds, and (sign, nb, faces) of the terms if none keeps dice
+    _low: int = field(init=False, repr=False, compare=False)
+    _high: int = field(init=False, repr=False, compare=False)
+    _plain: Optional[Tuple[Tuple[int, int, int], ...]] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "_low", sum(term._bounds()[0] for term in self.terms) + self.const)
+        object.__setattr__(self, "_high", sum(term._bounds()[1] for term in self.terms) + self.const)
+        plain = None
+        if all(term.keep is None and term.faces > 0 for term in self.terms):
+            plain = tuple((term.sign, term.nb, term.faces) for term in self.terms)
+        object.__setattr__(self, "_plain", plain)
+
+    def min(self) -> int:
+        return self._low
+
+    def max(self) -> int:
+        return self._high
+
+    def mean(self) -> float:
+        return _expr_pmf(self, 0).mean()
+
+    def pmf(self, advantage: int = 0) -> Pmf:
+        """Exact distribution, best (or worst) of several rolls with advantage"""
+        return _expr_pmf(self, advantage)
+
+    def is_simple(self) -> bool:
+        """A single NdF term, without keep"""
+        return (
+            len(self.terms) == 1 and self.terms[0].sign > 0 and self.terms[0].keep is None
+        )
+
+    def roll_dice(self, randint: Callable[[int, int], int]) -> int:
+        """One roll of the dice, constant aside, randint(lo, hi) drawing one die"""
+        if self._plain is None:
+            return sum(term.roll(randint) for term in self.terms)
+        total = 0
+        for sign, nb, faces in self._plain:
+            for _ in range(nb):
+                total += sign * randint(1, faces)
+        return total
+
+    def sample(self, rng: np.random.Generator, size, advantage: int = 0) -> np.ndarray:
+        """Rolls of the whole expression, as an array of shape size"""
+        size = tuple(np.atleast_1d(size))
+        draws = np.zeros((abs(advantage) + 1,) + size, dtype=np.int64)
+        for term in self.terms:
+            draws += term.sample(rng, draws.shape)
+        if advantage >= 0:
+            best = draws.max(axis=0)
+        else:
+            best = draws.min(axis=0)
+        return best + self.const
+
+    def __str__(self):
+        return self.text
+
+
+@lru_cache(maxsize=1024)
+def _expr_pmf(expr: DiceExpr, advantage: int) -> Pmf:
+    if advantage:
+        return _expr_pmf(expr, 0).best_of(advantage)
+    pmf = Pmf.point(expr.const)
+    for term in expr.terms:
+        pmf = pmf + term.pmf()
+    return pmf
+
+
+_TERM = re.compile(r"(\d*)d(\d+)(?:k([hl]?)(\d+))?$")
+
+
+@lru_cache(maxsize=1024)
+def compile_dice(text: str) -> DiceExpr:
+    """Parse a dice expression once, see the module grammar
+
+    Raise ValueError on a malformed expression.
+    """
+    source = re.sub(r"\s+", "", str(text)).lower().rstrip(".")
+    if not source:
+        raise ValueError(f"Empty dice expression: {text!r}")
+    tokens = re.split(r"([+-])", source)
+    if tokens[0] == "":  # leading sign
+        tokens = tokens[1:]
+    else:
+        tokens = ["+"] + tokens
+    terms = []
+    const = 0
+    for sign_tok, body in zip(tokens[0::2], tokens[1::2]):
+        sign = 1 if sign_tok == "+" else -1
+        if body.isdigit():
+            const += sign * int(body)
+            continue
+        match = _TERM.match(body)
+        if match is None:
+            raise ValueError(f"Cannot read dice term {body!r} in {text!r}")
+        nb, faces, keep_side, keep = match.groups()
+        terms.append(
+            DiceTerm(
+                sign=sign,
+                nb=int(nb) if nb else 1,
+                faces=int(faces),
+                keep=int(keep) if keep is not None else None,
+                highest=keep_side != "l",
+            )
+        )
+    return DiceExpr(text=str(text), terms=tuple(terms), const=const)
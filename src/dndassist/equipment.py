@@ -8,64 +8,109 @@
 
 from dataclasses import dataclass
 from typing import Optional, Dict, Any, List
-import json
-import os
-from importlib_resources import files
 from dndassist.storyprint import story_print
+from dndassist.catalog import Catalog, load_data
 
 
 EQUIP_CATG = ["Weapon","Shield","Armor","Item"]
 
-with open( files("dndassist").joinpath("equipment.json"), "r", encoding="utf-8") as f:
-    EQUIPMENT_DICT = json.load(f)
-with open( files("dndassist").joinpath("equipment_custom.json"), "r", encoding="utf-8") as f:
-    data_ = json.load(f)
+
+def _merge_custom(equipment: dict, custom: dict) -> dict:
     for catg in EQUIP_CATG:
         try:
-            EQUIPMENT_DICT[catg].update(data_[catg])
+            equipment[catg].update(custom[catg])
         except KeyError:
             pass
+    return equipment
+
+
+def _equipment_dict() -> dict:
+    """equipment.json, updated by equipment_custom.json, read on first use"""
+    global _EQUIPMENT_DICT
+    if _EQUIPMENT_DICT is None:
+        _EQUIPMENT_DICT = load_data(
+            "equipment", ["equipment.json", "equipment_custom.json"], _merge_custom
+        )
+    return _EQUIPMENT_DICT
+
+
+_EQUIPMENT_DICT = None
 
-WEAPONS = EQUIPMENT_DICT["Weapon"]
-SHIELDS = EQUIPMENT_DICT["Shield"]
-ARMORS = EQUIPMENT_DICT["Armor"]
-ITEMS = EQUIPMENT_DICT["Item"]
+# case-insensitive indexes of each category, loaded on the first lookup
+CATALOGS = {
+    catg: Catalog(loader=lambda catg=catg: _equipment_dict()[catg]) for catg in EQUIP_CATG
+}
+
+COIN_VALUES = {"cp": 1, "sp": 10, "gp": 100, "pp": 1000}  # in copper pieces
+
+
+def cost_in_cp(cost: Optional[str]) -> int:
+    """Copper pieces of a cost such as "10 gp", 0 if none"""
+    if not cost:
+        return 0
+    amount, coin = cost.split()
+    return int(float(amount) * COIN_VALUES[coin.lower()])
+
+
+def _flat_equipment() -> Dict[str, Dict[str, Any]]:
+    """All the categories in one index: category, weight and cost of each piece of equipment
+
+    A name present in several categories keeps the first one, in EQUIP_CATG order.
+    """
+    flat = {}
+    seen = set()
+    for catg in EQUIP_CATG:
+        for name, record in _equipment_dict()[catg].items():
+            if name.casefold() in seen:
+                continue
+            seen.add(name.casefold())
+            flat[name] = {
+                "category": catg,
+                "weight": record.get("weight") or 0,
+                "cost_cp": cost_in_cp(record.get("cost")),
+            }
+    return flat
+
+
+# every piece of equipment, whatever its category, loaded on the first lookup
+EQUIPMENT = Catalog(loader=_flat_equipment)
+
+_LAZY_DICTS = {"WEAPONS": "Weapon", "SHIELDS": "Shield", "ARMORS": "Armor", "ITEMS": "Item"}
+
+
+def __getattr__(name):
+    """EQUIPMENT_DICT, WEAPONS, ... are loaded on first access"""
+    if name == "EQUIPMENT_DICT":
+        return _equipment_dict()
+    if name in _LAZY_DICTS:
+        return _equipment_dict()[_LAZY_DICTS[name]]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def _print_r(text):
     story_print(text, color="green", justify="right")
 
 def equipment_weight(equip_name):
-    equip_name = equip_name.lower()
-    
-    qoi = None
-    for cat in EQUIP_CATG:
-        if equip_name in EQUIPMENT_DICT[cat]:
-            qoi = EQUIPMENT_DICT[cat][equip_name]["weight"]
-            break
-    if qoi is None:
+    """Weight of a piece of equipment, in Kgs, 0 if unknown"""
+    record = EQUIPMENT.get(equip_name)
+    if record is None:
         _print_r(f"{equip_name} not present in equipment ddb.")
-        qoi = 0
-    return qoi
+        return 0
+    return record["weight"]
 
 def equipment_cost(equip_name):
-    equip_name = equip_name.lower()
-    
-    qoi = None
-    for cat in EQUIP_CATG:
-        if equip_name in EQUIPMENT_DICT[cat]:
-            qoi = EQUIPMENT_DICT[cat][equip_name]["weight"]
-            break
-    if qoi is None:
+    """Cost of a piece of equipment, in copper pieces, 0 if unknown"""
+    record = EQUIPMENT.get(equip_name)
+    if record is None:
         _print_r(f"{equip_name} not present in equipment ddb.")
-        qoi = 0
-    return qoi
+        return 0
+    return record["cost_cp"]
 
-def weapon_catg(weapon_name):   
-    weapon_name = weapon_name.lower()
-    if  weapon_name not in WEAPONS:
+def weapon_catg(weapon_name):
+    record = CATALOGS["Weapon"].get(weapon_name)
+    if record is None:
         return None
-    return WEAPONS[weapon_name]["weapon_category"]
+    return record["weapon_category"]
     
 
 @dataclass
@@ -86,11 +131,8 @@ class Weapon:
 
     @classmethod
     def from_name(cls, name: str) -> "Weapon":
-        """Create a Weapon instance by name (case-insensitive lookup)."""
-        name = name.lower()
-        if name not in WEAPONS:
-            raise ValueError(f"Weapon '{name}' not found ")
-        return cls(name, **WEAPONS[name])
+        """Weapon of this name (case-insensitive lookup), shared: do not modify"""
+        return CATALOGS["Weapon"].instance(cls, name, "Weapon")
     
     def attributes(self) -> List[str]:
         """Return which ability (e.g. Strength, Dexterity) is used to attack with this weapon."""
@@ -121,11 +163,8 @@ class Armor:
 
     @classmethod
     def from_name(cls, name: str) -> "Armor":
-        """Create a Armor instance by name (case-insensitive lookup)."""
-        name = name.lower()
-        if name not in ARMORS:
-            raise ValueError(f"Armor '{name}' not found ")
-        return cls(name, **ARMORS[name])
+        """Armor of this name (case-insensitive lookup), shared: do not modify"""
+        return CATALOGS["Armor"].instance(cls, name, "Armor")
 @dataclass
 class Shield:
     name: str
@@ -136,11 +175,8 @@ class Shield:
 
     @classmethod
     def from_name(cls, name: str) -> "Shield":
-        """Create a Shield instance by name (case-insensitive lookup)."""
-        name = name.lower()
-        if name not in SHIELDS:
-            raise ValueError(f"Shield '{name}' not found ")
-        return cls(name, **SHIELDS[name])
+        """Shield of this name (case-insensitive lookup), shared: do not modify"""
+        return CATALOGS["Shield"].instance(cls, name, "Shield")
 
 @dataclass
 class Item:
@@ -150,8 +186,5 @@ class Item:
     """Used for Items or other stuff for the moment, """
     @classmethod
     def from_name(cls, name: str) -> "Item":
-        name = name.lower()
-        """Create a Item instance by name (case-sensitive lookup)."""
-        if name not in ITEMS:
-            raise ValueError(f"Item '{name}' not found ")
-        return cls(name, **ITEMS[name])
\ No newline at end of file
+        """Item of this name (case-insensitive lookup), shared: do not modify"""
+        return CATALOGS["Item"].instance(cls, name, "Item")
\ No newline at end of file
@@ -3,26 +3,41 @@ import yaml
 from typing import List, Dict, Optional, Tuple
 import random
 import time
+import threading
 from dndassist.gates import Gates
 from dndassist.room import RoomMap, Actor, Loot
-from dndassist.autoroll import rolldice, max_dice
+from dndassist.autoroll import (
+    rolldice,
+    max_dice,
+    mean_dice,
+    actor_rng,
+    set_force_autoroll,
+    is_force_autoroll,
+    set_dice_streams,
+    dice_streams,
+    DiceStreams,
+)
 from dndassist.attack import attack, offensive_spell
 from dndassist.storyprint import (
     story_title,
     story_print,
     print_color,
-    print_3cols
+    print_3cols,
+    set_quiet,
+    is_quiet,
 )
 from dndassist.level_up import check_new_level
+from dndassist.decision_cache import DecisionCache, decision_cache, set_decision_cache
+from dndassist.llm_service import join_context
 from dndassist.autoplay import (
-    user_select_option,user_ask_coordinates
-)
-from dndassist.isometric_renderer import (
-    IsometricRenderer
+    user_select_option,user_ask_coordinates, DecisionProvider, RandomDecisions, prefetch_ollama,
+    set_llm_fallback,
 )
+from dndassist.utility_policy import utility_select_option
 from datetime import datetime, timedelta
 
 LOGFILE = "./adventure_log.txt"
+ACTION_TITLE = "What action will you do?"
 
 banner = """
                             ==(W{==========-      /===-                        
@@ -62,21 +77,228 @@ By Antoine Dauptain, dedicated to Noé, Gaspard, Hugo.
 
 
 class GameEngine:
-    def __init__(self, wkdir: str, reload_from_save:int=None):
+    def __init__(
+        self,
+        wkdir: str,
+        reload_from_save:int=None,
+        headless:bool=False,
+        decision_provider:DecisionProvider=None,
+        autostart:bool=True,
+        seed:int=None,
+        llm_cache:bool=True,
+        fresh_play:bool=False,
+    ):
+        """Game of a scenario folder
+
+        headless: no terminal output, no pauses, no input, for simulations.
+            All dice are rolled automatically, decisions come from decision_provider
+            (random by default), the log and save files are not written,
+            and the game master dialog is skipped between rounds.
+            The output and dice switches are set while the engine is open,
+            and restored by close(), e.g. at the end of a with block.
+        decision_provider: takes all the decisions instead of the terminal dialogs,
+            but the ones of the actors in "utility" state, played by the utility policy
+        autostart: run the main loop at once, then close the engine,
+            else call run_one_round yourself
+        seed: reproducible game, each actor rolling dice from its own seeded stream
+        llm_cache: keep the LLM decisions in Saves/llm_decisions.sqlite, written on the first one,
+            the same question being answered again from the cache (not in headless games)
+        fresh_play: ask the LLM again for every decision, the cache still recording them
+        """
+        self.headless = headless
+        self._switches = (is_quiet(), is_force_autoroll(), dice_streams(), decision_cache())
+        if seed is not None:
+            random.seed(seed)
+            set_dice_streams(DiceStreams(seed))
+        if headless:
+            set_quiet(True)
+            set_force_autoroll(True)
+            if decision_provider is None:
+                decision_provider = RandomDecisions(seed)
+        self.decision_provider = decision_provider
+        if llm_cache and not headless:
+            set_decision_cache(
+                DecisionCache(os.path.join(wkdir, "Saves", "llm_decisions.sqlite"), bypass=fresh_play)
+            )
+        else:
+            set_decision_cache(None)
         print_color(banner, color="yellow")
-        time.sleep(0.1)
+        self._pause()
         self.wkdir=wkdir
         self.adventure_log = []
         self.adventure_log.append(banner)
         self.gates: Gates = Gates()
         self.players_sorted_list: List[str] = None
         self.room: RoomMap = None
+        self._speculation: Dict[str, tuple] = {}  # by NPC name: world state, context, options
+        self._speculation_thread: threading.Thread = None
+        self.speculation_stats = {"used": 0, "discarded": 0}
         if reload_from_save is None:
             self.round_counter: int = 0
             self.startup()
         else:
             self.load_game(reload_from_save)
-        self.main_loop()
+        if autostart:
+            self.main_loop()
+            self.close()
+
+    def close(self):
+        """Restore the output, dice and LLM cache switches set by the engine"""
+        if self._switches is None:
+            return
+        self.join_speculation()
+        quiet, force_autoroll, streams, cache = self._switches
+        set_quiet(quiet)
+        set_force_autoroll(force_autoroll)
+        set_dice_streams(streams)
+        set_decision_cache(cache)
+        self._switches = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _pause(self):
+        """Short pause to let players read, none in headless mode"""
+        if not self.headless:
+            time.sleep(0.1)
+
+    def select_option(
+        self, title: str, context:str , options: List[str], npc:bool=False, actor:Actor=None
+    ) ->Tuple[str, str]:
+        """Dialog to select an option, with the decision provider if any
+
+        actor: who decides. Actors in the "utility" state are played by the utility policy,
+            which also decides for the auto actors when the LLM does not answer.
+        """
+        if actor is not None and actor.state == "utility":
+            return utility_select_option(self.room, actor, title, options)
+        if actor is not None and npc:
+            set_llm_fallback(lambda title_, options_: utility_select_option(self.room, actor, title_, options_))
+        try:
+            if self.decision_provider is not None:
+                return self.decision_provider.select_option(title, context, options, npc=npc)
+            return user_select_option(title, context, options, npc=npc)
+        finally:
+            set_llm_fallback(None)
+
+    def actor_context(self, actor: Actor) -> str:
+        """Context of the decisions of an actor: who it is,
+        then by decreasing importance its objectives, what is in view, its state"""
+        return join_context(
+            actor.character.identity(),
+            [
+                actor.situation(),  # objectives and last action
+                self.room.look_around_report(actor.name),  # what is in view, the targets of the options
+                actor.character.state_report(),  # what is not in the room
+            ],
+        )
+
+    def _npc_prefetch(self):
+        """Function prefetching NPC decisions, None if the decisions are not prefetched"""
+        if self.decision_provider is None:
+            return prefetch_ollama
+        if self.decision_provider.prefetches:
+            return self.decision_provider.prefetch
+        return None
+
+    def prefetch_npc_decisions(self, initiative_order: List[Actor]):
+        """Ask the LLM, all at once, the first action of each auto NPC of the round
+
+        The answer of an NPC is used if its context and options did not change before its turn.
+        """
+        npcs = [
+            actor for actor in initiative_order
+            if actor.state == "auto" and "dead" not in actor.character.current_state["conditions"]
+        ]
+        prefetch = self._npc_prefetch()
+        if not npcs or prefetch is None:
+            return
+        prefetch([
+            (
+                ACTION_TITLE,
+                self.actor_context(actor),
+                self.build_all_actions_available_to_actor(actor, actor.character.max_distance()),
+            )
+            for actor in npcs
+        ])
+
+    def world_state(self) -> tuple:
+        """What the context and options of the actors depend on: for each actor
+        its position, HP, conditions, equipment, spells, faction, objectives
+        and aggro; the positions of the loots"""
+        return (
+            tuple(
+                (
+                    actor.name,
+                    tuple(actor.pos),
+                    actor.climbed,
+                    actor.character.current_state["current_hp"],
+                    tuple(actor.character.current_state["conditions"]),
+                    tuple(actor.character.equipment),
+                    tuple(actor.character.spells or ()),
+                    actor.character.faction,
+                    tuple(actor.objectives),
+                    actor.aggro,
+                )
+                for actor in self.room.actors.values()
+            ),
+            tuple((loot.name, tuple(loot.pos)) for loot in self.room.loots.values()),
+        )
+
+    def speculate_npc_decisions(self, npcs: List[Actor]):
+        """While a player decides, prepare in background the first decision of the next NPCs
+
+        Their perception and options are computed for the current world,
+        and their LLM requests sent. The speculation of an NPC is used at its turn
+        only if the world state (see world_state) and its own last action and outcome
+        did not change.
+        Call join_speculation before changing the world.
+        """
+        self.join_speculation()
+        prefetch = self._npc_prefetch()
+        if not npcs or prefetch is None:
+            return
+        state = self.world_state()
+
+        def _speculate():
+            try:
+                speculation = {
+                    actor.name: (
+                        (state, actor.last_action, actor.last_outcome),
+                        self.actor_context(actor),
+                        self.build_all_actions_available_to_actor(actor, actor.character.max_distance()),
+                    )
+                    for actor in npcs
+                }
+                self._speculation = speculation
+                prefetch([(ACTION_TITLE, context, options) for _, context, options in speculation.values()])
+            except Exception:  # a failed speculation is only a missed shortcut
+                self._speculation = {}
+
+        self._speculation_thread = threading.Thread(target=_speculate, name="npc-speculation", daemon=True)
+        self._speculation_thread.start()
+
+    def join_speculation(self):
+        """Wait for the speculation running, if any"""
+        if self._speculation_thread is not None:
+            self._speculation_thread.join()
+            self._speculation_thread = None
+
+    def speculated_decision(self, actor: Actor) -> Optional[Tuple[str, List[str]]]:
+        """Context and options speculated for the first decision of an NPC,
+        None if none, or if the world changed since"""
+        speculation = self._speculation.pop(actor.name, None)
+        if speculation is None:
+            return None
+        state, context, options = speculation
+        if state != (self.world_state(), actor.last_action, actor.last_outcome):
+            self.speculation_stats["discarded"] += 1
+            return None
+        self.speculation_stats["used"] += 1
+        return context, options
 
     def startup(self):
         # load gates
@@ -194,11 +416,13 @@ class GameEngine:
             active_actors.append(actor)
         # 2️⃣ Compute initiative for all active actors
         initiative_order = self.compute_initiative(active_actors)
+        self._speculation = {}
+        self.prefetch_npc_decisions(initiative_order)
         
 
         # 3️⃣ Execute each actor's turn in initiative order
-        for actor in initiative_order:
-            time.sleep(0.1)
+        for turn, actor in enumerate(initiative_order):
+            self._pause()
             # skip is actor is dead or unconcious
             skip = False
             for skip_state in ["dead"]:
@@ -214,25 +438,34 @@ class GameEngine:
             self.adventure_log.append("\n\n" + f"--- __{actor.name}__'s turn {actor.pos}---")
             remaining_moves = actor.character.max_distance()
             remaining_actions = 100
+            first_decision = True
             while remaining_moves >= self.room.unit_m and remaining_actions > 0:
-                time.sleep(0.1)
+                self._pause()
                 story_print(f"""
     --- __{actor.name}__'s turn ---
     pos: {actor.pos}, view height: {actor.height+actor.climbed} m
     Remaining moves: __{remaining_moves}__m
 """, color="grey",justify="left")
-                actions_avail = self.build_all_actions_available_to_actor(actor)
                 npc_bool = actor.state == "auto"
-                action, comment = user_select_option(
-                    "What action will you do?",
-                    actor.character.situation()
-                    + "\n"  # what is not in the room
-                    + self.room.look_around_report(actor.name)
-                    + "\n"
-                    + actor.situation(),  # what is in view
+                speculated = None
+                if npc_bool and first_decision:
+                    speculated = self.speculated_decision(actor)
+                first_decision = False
+                if speculated is None:
+                    context = self.actor_context(actor)
+                    actions_avail = self.build_all_actions_available_to_actor(actor, remaining_moves)
+                else:
+                    context, actions_avail = speculated
+                if actor.state == "manual":  # the NPCs playing next get ready while the player decides
+                    self.speculate_npc_decisions(next_npcs(initiative_order, turn))
+                action, comment = self.select_option(
+                    ACTION_TITLE,
+                    context,
                     actions_avail,
                     npc=npc_bool,
+                    actor=actor,
                 )
+                self.join_speculation()
                 actor.last_action = action
                 story_print("__" + action + "__", color="grey")
                 story_print(comment, color="grey")
@@ -245,7 +478,8 @@ class GameEngine:
                     remaining_moves = 0
                     remaining_actions = 0
                 elif action.startswith("show view"):
-                    self.room.ask_tactical_view(actor_name=actor.name)
+                    if not self.headless:
+                        self.room.ask_tactical_view(actor_name=actor.name)
                 elif action.startswith("show status"):
                     str1 , str2, str3 = actor.status_str()
                     print_3cols(str1 , str2, str3 )
@@ -293,7 +527,7 @@ class GameEngine:
                     remaining_actions -= 100
                     actor_name = action.split()[2]
                     npc_actor = self.room.actors[actor_name]
-                    name, cost_str, reward_str, xp = npc_actor.talk_to()
+                    name, cost_str, reward_str, xp = npc_actor.talk_to(self.select_option)
                     if cost_str is None:
                         outcome = f"[{npc_actor.name}] {name})"
                     else:
@@ -322,16 +556,18 @@ class GameEngine:
                 actor.last_outcome = outcome
                 self.adventure_log.append(outcome + "\n")
                 story_print("__" + outcome + "__", color="grey")
-                with open(LOGFILE, "w") as fout:
-                    fout.write("\n".join(self.adventure_log))
+                if not self.headless:
+                    with open(LOGFILE, "w") as fout:
+                        fout.write("\n".join(self.adventure_log))
 
         story_print(f"\n=== ROUND __{self.round_counter}__ END ===")
 
 
-        self.save_game()
-
-
-        continue_game = self.end_of_round_dialog()
+        if self.headless:
+            continue_game = True
+        else:
+            self.save_game()
+            continue_game = self.end_of_round_dialog()
        
         if continue_game is False:
             story_print("Thank you for playing dnd assist...", color="green")
@@ -380,7 +616,7 @@ class GameEngine:
             elif success == 0.0: #failed climb
                 story_print(f"Climb failed!", color="green", justify="right")
                 roll, _ , _ = actor.rolldice("1d4")
-                actor.character.current_state.current_hp -= roll
+                actor.character.current_state["current_hp"] -= roll
                 return int(climb_gap*3)
             else:
                 if roll + dex_mod >= difficulty:
@@ -414,8 +650,8 @@ class GameEngine:
                 return int(climb_gap)
             elif success == 0.0: #failed climb
                 story_print(f"Climb down CRITICAL FAIL!", color="green", justify="right")
-                roll, _ = actor.rolldice("1d4")
-                actor.character.current_state.current_hp -= roll
+                roll, _, _ = actor.rolldice("1d4")
+                actor.character.current_state["current_hp"] -= roll
                 actor.climbed = dest_tile.climb_height
                 actor.pos = dest_pos
                 return int(climb_gap*3)
@@ -438,14 +674,16 @@ class GameEngine:
         self.room.xp_accumulated = 0
         for actor in self.gates.travelers_actors():
             story_print(f"__[{actor.name}]__ has gained __{xp_share}__ XP points!" )
+            past_xp = actor.character.xp
             actor.character.xp += xp_share
             
             # Levelling up...
             lvl, prof, hp_increase, abilities_increase = check_new_level(
+                past_xp, 
                 actor.character.xp, 
-                actor.character.xp+xp_share, 
-                actor.character.hit_dices_max[0], 
-                actor.character.attr_mod("constitution"))
+                actor.character.hit_dices[0], 
+                actor.character.attr_mod("constitution"),
+                select_option=self.select_option)
             if lvl > actor.character.level:
                 story_print(f"__[{actor.name}]__ level up ! {actor.character.level}->{lvl}" )
                 actor.character.level = lvl
@@ -457,7 +695,8 @@ class GameEngine:
                 actor.character.max_hp += hp_increase
             for ability in abilities_increase:
                 story_print(f"__[{actor.name}]__ ability {ability} increased ! +1" )
-                actor.character.attributes[ability]+=1            
+                actor.character.attributes[ability]+=1
+            actor.character.invalidate()
 
             
 
@@ -478,7 +717,7 @@ class GameEngine:
         continue_game = None
         gamemaster_dialog_running = True
         while gamemaster_dialog_running:
-            option,_ = user_select_option(
+            option,_ = self.select_option(
             "Turn has ended, what do you want to do?",
             "Main dialog for the game master",
             end_of_turn_options)
@@ -504,7 +743,7 @@ class GameEngine:
                     else:
                         targets_options.append(f"{actor_name} : npc")
 
-                target,_ = user_select_option(
+                target,_ = self.select_option(
                     "What actors must change status?",
                     "no context provided",
                     targets_options)
@@ -517,10 +756,10 @@ class GameEngine:
                     target_list = self.room.npc_ordered_list
                 else:
                     target_list = [target]
-                new_state,_ = user_select_option(
+                new_state,_ = self.select_option(
                     "What is the new status? ",
                     "no context provided",
-                    ["idle", "manual", "auto"])
+                    ["idle", "manual", "auto", "utility"])
                 for actor_name in target_list:
                     self.room.actors[actor_name].state = new_state
                     story_print(f"[{actor_name}] state is now __{new_state}__", color="green", justify="right")
@@ -534,7 +773,7 @@ class GameEngine:
                     else:
                         targets_options.append(f"{actor_name} : npc")
 
-                target,_ = user_select_option(
+                target,_ = self.select_option(
                     "What actors must change coordinates?",
                     "no context provided",
                     targets_options)
@@ -560,7 +799,7 @@ class GameEngine:
 
             elif option == "Send player(s) to gate" :
                 gate_list = [f"{gate.name}: {gate.description}" for gate in self.room.gates.values()]
-                target,_ = user_select_option(
+                target,_ = self.select_option(
                     "What gate?",
                     "no context provided",
                     gate_list)
@@ -582,7 +821,7 @@ class GameEngine:
                         else:
 
                             remain_hit_dices = ["no recovery"] + [v for i,v in enumerate(hit_dices) if hit_mask[i]] 
-                            hit_dice, _ = user_select_option(
+                            hit_dice, _ = self.select_option(
                                 f"What hit dice [{actor_name}] will use? ",
                                 f"[{actor_name}] is having a short rest",
                                 remain_hit_dices
@@ -619,10 +858,14 @@ class GameEngine:
         return continue_game
     
     # Function
-    def build_all_actions_available_to_actor(self, actor:Actor)-> List[str]:
-        """ Create a list of possible actions for an Actor"""
+    def build_all_actions_available_to_actor(self, actor:Actor, remaining_moves:float=None)-> List[str]:
+        """ Create a list of possible actions for an Actor
+
+        Moves are only proposed if the actor can get closer within remaining_moves
+        (by default its max distance)."""
 
         actions_avail = ["round finished"]
+        reach = self.room.reachability(actor.name, remaining_moves)
         
         climb_up_dir, climb_up_pos, climb_down_dir , climb_down_pos= self.room.tiles_to_climb(actor.pos)
         if climb_up_dir:
@@ -633,7 +876,7 @@ class GameEngine:
             for dir,pos in zip(climb_down_dir,climb_down_pos):
                 actions_avail.append(f"climbDown {dir} {pos} : ground")
         
-        if actor.climbed == 0:
+        if actor.climbed == 0 and reach.nb_reachable() > 1:
             actions_avail.append( "move in direction")
 
         (
@@ -651,21 +894,21 @@ class GameEngine:
                 pass
             else:
                 if dist > proximity_dist:
-                    if actor.climbed == 0:
+                    if actor.climbed == 0 and reach.can_approach(self.room.actors[other].pos):
                         actions_avail.append(f"move to {other} at {dist}m ")
                 else:
                     actions_avail.append(f"talk to {other}")
 
         for other, dist in all_visible_loots:
             if dist > proximity_dist:
-                if actor.climbed == 0: 
+                if actor.climbed == 0 and reach.can_approach(self.room.loots[other].pos):
                     actions_avail.append(f"move to {other} at {dist}m ")
             else:
                 actions_avail.append(f"pick up {other}")
 
         for other, dist in all_visible_gates:
             if dist > proximity_dist:
-                if actor.climbed == 0: 
+                if actor.climbed == 0 and reach.can_approach(self.room.gates[other].pos):
                     actions_avail.append(f"move to {other} at {dist}m ")
             else:
                 actions_avail.append(f"quit map {other}")
@@ -728,8 +971,8 @@ class GameEngine:
     # make function
     def action_move_to_target(self, actor:Actor, remaining_moves:float, action:str)->Tuple[str,int]:
         """Action handler for Actor moving to a target (Actor, Loot or Gate)"""
-        tgt = action.split(" ")[2]
-        print(f"Trying to go to {tgt}")
+        tgt = action[len("move to "):].rsplit(" at ", 1)[0].strip() # loot names can have spaces
+        story_print(f"Trying to go to {tgt}", color="green", justify="right")
         used_dist = self.room.move_actor_to_target(actor.name, tgt, remaining_moves)
         outcome = f"\n{actor.name} moved toward {tgt} over {used_dist}m"
         return outcome, used_dist
@@ -738,16 +981,20 @@ class GameEngine:
     def action_move_to_direction(self, actor:Actor, remaining_moves:float)->Tuple[str,int]:
         
 
-        npc_bool = actor.state == "auto"
+        npc_bool = actor.state in ["auto", "utility"]
+        context = join_context(
+            actor.character.identity(),
+            [
+                f"{actor.name} decided to move...",
+                actor.situation(),
+                actor.character.state_report(),
+                self.room.actor_situation(actor.name),
+            ],
+        )
         
-        dir, _ = user_select_option(
+        dir, _ = self.select_option(
             "In what direction ar you moving?",
-            actor.character.situation()
-            + "\n"
-            + self.room.actor_situation(actor.name)
-            + "\n"
-            + actor.situation()
-            + f"{actor.name} decided to move...",
+            context,
             [
                 "to the South of the map",
                 "to the SouthWest of the map",
@@ -760,18 +1007,14 @@ class GameEngine:
                 "to the Center of the map",
             ],
             npc=npc_bool,
+            actor=actor,
         )
         if npc_bool:  # non playable characters do not wonder about distance
             select_dist = "As far as possible"
         else:
-            select_dist, _ = user_select_option(
+            select_dist, _ = self.select_option(
                 f"How far are you moving to the {dir}?",
-                actor.character.situation()
-                + "\n"
-                + self.room.actor_situation(actor.name)
-                + "\n"
-                + actor.situation()
-                + f"{actor.name} decided to move...",
+                context,
                 [
                     "As far as possible",
                     "Half of my range",
@@ -779,6 +1022,7 @@ class GameEngine:
                     "Smallest movement possible",
                 ],
                 npc=npc_bool,
+                actor=actor,
             )
 
         if select_dist == "As far as possible":
@@ -833,7 +1077,7 @@ class GameEngine:
         initiatives = []
         for a in active_actors:
             story_print(f"Initiative roll for [{a.name}]",color="green", justify="right")
-            d20, _ = rolldice("1d20", autoroll=True)
+            d20, _ = rolldice("1d20", autoroll=True, rng=actor_rng(a.name))
             init_value = a.character.attr_mod("dexterity") + d20
             initiatives.append((init_value, random.random(), a))
         # print(f"{a.name} initiative: {init_value}")
@@ -847,6 +1091,19 @@ class GameEngine:
         return ordered
 
 #move to actor
+def next_npcs(initiative_order: List[Actor], turn: int) -> List[Actor]:
+    """Auto NPCs playing after the turn, up to the next player"""
+    npcs = []
+    for actor in initiative_order[turn + 1:]:
+        if actor.state == "utility":  # no LLM, decides at once
+            continue
+        if actor.state != "auto":
+            break
+        if "dead" not in actor.character.current_state["conditions"]:
+            npcs.append(actor)
+    return npcs
+
+
 def list_of_foes(actor: Actor, other_actors_: List[Actor]) -> List[Actor]:
     """return the foes of this actor"""
     out = []
@@ -857,24 +1114,26 @@ def list_of_foes(actor: Actor, other_actors_: List[Actor]) -> List[Actor]:
 
 # move to actor
 def actor_attack_solutions(actor: Actor, dist: int) -> Tuple[str, str]:
-    """return strongest available weapon  in range"""
+    """return strongest available weapon  in range (best expected damage), and its max damage"""
+    best_dmg = 0
     max_dmg = 0
     weap = None
     for weapon, range, damage_dice in actor.character.available_ranges():
         if range >= dist:
-            if max_dice(damage_dice) > max_dmg:
-                weap, max_dmg = weapon, max_dice(damage_dice)
+            if mean_dice(damage_dice) > best_dmg:
+                weap, best_dmg, max_dmg = weapon, mean_dice(damage_dice), max_dice(damage_dice)
 
     return weap, max_dmg
 
 # move to actor
 def actor_hex_solutions(actor: Actor, dist: int) -> Tuple[str, str]:
-    """return strongest available hex  in range"""
+    """return strongest available hex  in range (best expected damage), and its max damage"""
+    best_dmg = 0
     max_dmg = 0
     hex = None
     for spell, range, damage_dice in actor.character.available_hex_ranges():
         if range >= dist:
-            if max_dice(damage_dice) > max_dmg:
-                hex, max_dmg = spell, max_dice(damage_dice)
+            if mean_dice(damage_dice) > best_dmg:
+                hex, best_dmg, max_dmg = spell, mean_dice(damage_dice), max_dice(damage_dice)
 
     return hex, max_dmg
\ No newline at end of file
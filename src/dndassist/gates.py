@@ -5,6 +5,7 @@ import os
 from datetime import datetime
 
 from dndassist.room import Actor
+from dndassist.storyprint import story_print
 
 class Gates:
     """Handle all the gates available"""
@@ -137,7 +138,7 @@ class Gate:
             travelers_out.append(actor)
             travelers_names.append(actor.name)
         msg = "At "+ str(out_time)+", " +", ".join(travelers_names) + " arrived in "+destination_room
-        print(msg)
+        story_print(msg)
         self.travelers = []
         return travelers_out, destination_room, out_time
 
@@ -38,7 +38,10 @@ class Interaction:
     def smalltalk(self):
         return random.choice(self.smalltalk_list)
 
-    def try_talking(self)-> Tuple[str, str, str, int]:
+    def try_talking(self, select_option=user_select_option)-> Tuple[str, str, str, int]:
+        """Let the player choose a path of the interaction
+
+        select_option: the dialog function, user_select_option by default"""
         if self.paths is None:
             return self.smalltalk(), None, None, 0
         
@@ -46,14 +49,14 @@ class Interaction:
         for path in self.paths:
             if path['cost'] is not None:
                 list_options.append(f"{path['name']}, cost {path['cost']}")
-        option,_ = user_select_option(
+        option,_ = select_option(
             self.smalltalk(),
             context="",
             options=list_options
         )
 
         if option == "forget it":
-            return None,None,None
+            return None,None,None,0
         idx = list_options.index(option) - 1
         return self.paths[idx]["name"], self.paths[idx]["cost"], self.paths[idx]["reward"], self.paths[idx]["xp"]
     
@@ -5,21 +5,22 @@ from dndassist.autoplay import user_select_option
 from dndassist.autoroll import max_dice, rolldice
 
 
-def check_new_level(past_xp:int, new_xp:int, hit_dice:str, const_mod:int)-> Tuple[int,int,int,List[str]]:
+def check_new_level(past_xp:int, new_xp:int, hit_dice:str, const_mod:int, select_option=user_select_option)-> Tuple[int,int,int,List[str]]:
     """find the bonuses to apply for a new level, by comparing past and new XP
 
+    select_option: the dialog function, user_select_option by default
+
     Return:
         - the curent level and proficiency
         - if level up the increase in Hit Points and ability increase 
     """
     past_lvl,_ = get_lvl_proficiency(past_xp)
     new_lvl, new_proficiency = get_lvl_proficiency(new_xp)
-    print("??",past_lvl,new_lvl)
     if past_lvl == new_lvl:
         return new_lvl, new_proficiency, 0, []
     
     avg = max_dice(hit_dice)+1
-    opt, _ = user_select_option(
+    opt, _ = select_option(
         f"Use average hit dice ({avg})? or roll {hit_dice}?",
         f"",
         ["roll dice", "use average"]
@@ -31,7 +32,7 @@ def check_new_level(past_xp:int, new_xp:int, hit_dice:str, const_mod:int)-> Tupl
         hp_up = max(1, roll+const_mod)
     
     # ASI phase
-    ability_upgrades = ability_score_increase(new_lvl)
+    ability_upgrades = ability_score_increase(new_lvl, select_option=select_option)
     if "constitution" in ability_upgrades:
         hp_up += new_lvl
     return new_lvl, new_proficiency, hp_up, ability_upgrades
@@ -79,19 +80,19 @@ def get_lvl_proficiency(xp:int)-> Tuple[int, int]:
         return 19, 6
     return 20, 6
 
-def ability_score_increase(lvl:int) -> List[str]:
+def ability_score_increase(lvl:int, select_option=user_select_option) -> List[str]:
     """Ask what abilities to increase if level is an ASI"""
     if lvl not in [4,8,12,16,20]:
         return []
     
     abilities = ["strength","dexterity","constitution","intelligence","wisdom","charisma"]
     
-    ab1, _ = user_select_option(
+    ab1, _ = select_option(
         "What ability you want to increase first?",
         f"This is you ability increase for level {lvl}",
         abilities
     )
-    ab2, _ = user_select_option(
+    ab2, _ = select_option(
         "What ability you want to increase last?",
         f"This is you ability increase for level {lvl}",
         abilities
@@ -0,0 +1,359 @@
+"""Asynchronous LLM decisions, for the NPCs played by the LLM ("auto" state)
+
+Prompts go to a local Ollama server through its HTTP API (/api/generate),
+over persistent (keep-alive) connections, instead of one `ollama run`
+process per decision.
+
+A DecisionService runs the requests on a pool of threads, each with its own
+kept-alive connection (the HTTP calls block, the threads wait on the network):
+- submit(prompt) sends a request at once, and returns a future
+- answer(prompt) waits for the answer, reusing a request already submitted
+  with the same prompt, e.g. prefetched at the start of the round
+- at most max_concurrency requests run at the same time, the others are queued
+
+The game engine prefetches, at the start of a round, the first decision
+of every auto NPC, in initiative order. If nothing in view of an NPC changed
+before its turn, its prompt is the same and the answer is already there:
+a round of eight NPCs costs about one model latency instead of eight.
+The server must answer in parallel for that (OLLAMA_NUM_PARALLEL > 1).
+
+Prompts are compact: the instructions and the static description of the NPC
+are a system prefix, the same from turn to turn. The generate API is stateless,
+so the prefix is sent with every request: it is the server, with its prompt cache,
+that evaluates it once. The turn itself holds in a token budget (PROMPT_BUDGET),
+the least important sections of the context being cut first.
+The service reports the size of each prompt sent, and whether its prefix
+was sent before (prompt_sizes).
+"""
+
+import json
+import queue
+from collections import deque
+from dataclasses import dataclass
+import threading
+import http.client
+import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LLM_MODEL = "llama3:latest"
+OLLAMA_URL = "http://localhost:11434"
+
+
+# -----------------------------------------------------------
+#  PROMPTS
+# -----------------------------------------------------------
+CHARS_PER_TOKEN = 4  # rough estimate, for english text and llama-like tokenizers
+PROMPT_BUDGET = 300  # default tokens of the turn prompt, the system prefix aside
+SECTIONS = "\n\n"
+STATIC_END = "\n\n---\n\n"
+
+SYSTEM_PROMPT = """You are controlling a NPC in dungeons and dragons.
+You must satisfy the objectives of this NPC.
+For your answer, YOU MUST SELECT ONE OF THE INDEXED SENTENCES of the decision.
+    Add a “>” character before the index.
+    Add a “<” character after the index.
+    Add a “|” character after the sentence.
+    Finish your answer by a very short explanation of the decision.
+    Exemple for an attack:
+      > 6 < attack beowulf | fafnir and beowulf belongs to opposed non-neutral factions.'
+    Exemple for moving:
+      > 3 < move North | Fafnir moves north as fast a possible, to satisfy his objective.'
+"""
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """Prompt of a decision
+
+    system: instructions and static description of the NPC, the same turn after turn
+        (sent each time, an identical prefix the server may keep evaluated in its cache)
+    text: the turn, within the token budget
+    """
+
+    system: str
+    text: str
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+    @property
+    def system_tokens(self) -> int:
+        return estimate_tokens(self.system)
+
+    def __str__(self):
+        return self.system + "\n" + self.text
+
+
+_BUDGET = PROMPT_BUDGET
+
+
+def set_prompt_budget(tokens: Optional[int]):
+    """Tokens of the turn prompts, None for the default PROMPT_BUDGET"""
+    global _BUDGET
+    _BUDGET = PROMPT_BUDGET if tokens is None else tokens
+
+
+def prompt_budget() -> int:
+    return _BUDGET
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough number of tokens of a text"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def join_context(static: str, sections: List[str]) -> str:
+    """Context of a decision: the static description of who decides,
+    then the sections, by decreasing importance"""
+    dynamic = SECTIONS.join(section for section in sections if section)
+    if not static:
+        return dynamic
+    return static + STATIC_END + dynamic
+
+
+def split_context(context: str) -> Tuple[str, List[str]]:
+    """Static description and sections of a context made by join_context"""
+    static, sep, dynamic = context.partition(STATIC_END)
+    if not sep:
+        static, dynamic = "", context
+    return static, [section for section in dynamic.split(SECTIONS) if section.strip()]
+
+
+def fit_section(section: str, budget: int) -> str:
+    """First lines of a section within budget tokens, with the count of the lines left out"""
+    lines = section.split("\n")
+    if estimate_tokens(section) <= budget:
+        return section
+    budget -= estimate_tokens(f"\n(... {len(lines)} more)")
+    kept = []
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if cost > budget:
+            if not kept and budget > 2:  # a long first line, e.g. a large inventory
+                kept.append(line[: (budget - 1) * CHARS_PER_TOKEN] + "...")
+            break
+        kept.append(line)
+        budget -= cost
+    if not kept:
+        return ""
+    if len(kept) < len(lines):
+        kept.append(f"(... {len(lines) - len(kept)} more)")
+    return "\n".join(kept)
+
+
+def build_prompt(context: str, title: str, options: List[str], budget: int = None) -> Prompt:
+    """Prompt of one decision: the context, the decision, the indexed options
+
+    The static description of the context goes to the system prefix.
+    The sections of the context are kept by order of importance while the turn
+    fits in budget tokens (by default prompt_budget()), the last one kept
+    being truncated line by line. The decision and its options are always kept.
+    """
+    if budget is None:
+        budget = _BUDGET
+    static, sections = split_context(context)
+    system = SYSTEM_PROMPT
+    if static:
+        system += "\nThe NPC you control:\n" + static
+
+    indexed_actions = []
+    for i, option in enumerate(options):
+        indexed_actions.append(f" {i+1} - {option}")
+    head = "Here is the context of your turn:\n\n"
+    tail = f"\n\nThe current decision to take is {title}\n" + "\n".join(indexed_actions)
+
+    left = budget - estimate_tokens(head + tail)
+    kept = []
+    for section in sections:
+        fitted = fit_section(section, left - 1)
+        if not fitted:
+            break
+        kept.append(fitted)
+        left -= estimate_tokens(fitted) + 1
+    return Prompt(system, head + SECTIONS.join(kept) + tail)
+
+
+def parse_answer(answer: str, options: List[str]) -> Optional[Tuple[str, str]]:
+    """Option and explanation of an answer such as "> 6 < attack beowulf | because...",
+    None if the answer cannot be read"""
+    if ">" in answer:
+        answer = answer.split(">")[-1]
+    if "<" not in answer or "|" not in answer:
+        return None
+    index = answer.split("<")[0]
+    comment = answer.split("|")[-1]
+    try:
+        idx = int(index)
+    except ValueError:
+        return None
+    if not 1 <= idx <= len(options):
+        return None
+    return options[idx - 1].strip(), comment.strip()
+
+
+# -----------------------------------------------------------
+#  MODEL CONNECTION
+# -----------------------------------------------------------
+class OllamaClient:
+    """Blocking client of an Ollama server, over one kept-alive HTTP connection"""
+
+    def __init__(self, url: str = OLLAMA_URL, model: str = LLM_MODEL, timeout: float = 30.0):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.model = model
+        self.timeout = timeout
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def generate(self, prompt: Prompt) -> str:
+        """Answer of the model to a prompt (a Prompt, or a plain text)"""
+        request = {"model": self.model, "prompt": str(prompt), "stream": False}
+        if isinstance(prompt, Prompt):
+            request.update(system=prompt.system, prompt=prompt.text)
+        body = json.dumps(request)
+        headers = {"Content-Type": "application/json"}
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self._conn.request("POST", "/api/generate", body, headers)
+                response = self._conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, ConnectionError):
+                self.close()
+                if attempt:  # the server may close an idle connection: retry once
+                    raise
+                continue
+            except Exception:
+                self.close()
+                raise
+            if response.status != 200:
+                raise RuntimeError(f"LLM server error {response.status}: {data[:200]!r}")
+            return json.loads(data)["response"].strip()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# -----------------------------------------------------------
+#  DECISION SERVICE
+# -----------------------------------------------------------
+class DecisionService:
+    """Concurrent answers of the model, the sync API usable from the game loop
+
+    client_factory: makes a client (with a generate(prompt) method), one per concurrent request
+    max_concurrency: number of requests running at the same time
+    timeout: seconds to wait for an answer
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], OllamaClient] = OllamaClient,
+        max_concurrency: int = 4,
+        timeout: float = 30.0,
+    ):
+        self.client_factory = client_factory
+        self.timeout = timeout
+        self._idle_clients: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix="llm-request")
+        self._lock = threading.Lock()
+        self._pending: Dict[Prompt, Future] = {}  # submitted, not used yet, by prompt
+        self._systems = set()  # system prefixes already sent
+        self.stats = {
+            "requests": 0, "reused": 0, "timeouts": 0, "errors": 0, "tokens": 0, "system_tokens": 0,
+        }
+        self.prompt_sizes = deque(maxlen=1000)  # of the last requests: tokens, system tokens, system repeated
+
+    def _generate(self, prompt: Prompt) -> str:
+        try:
+            client = self._idle_clients.get_nowait()
+        except queue.Empty:
+            client = self.client_factory()
+        try:
+            return client.generate(prompt)
+        finally:
+            self._idle_clients.put(client)
+
+    def submit(self, prompt: Prompt) -> Future:
+        """Send a request, unless the same prompt is already pending"""
+        with self._lock:
+            future = self._pending.get(prompt)
+            if future is None:
+                future = self._executor.submit(self._generate, prompt)
+                self._pending[prompt] = future
+                self._count(prompt)
+            return future
+
+    def _count(self, prompt: Prompt):
+        """Size of a new request, as sent: the turn and the system prefix,
+        with whether the same prefix was sent before"""
+        if not isinstance(prompt, Prompt):
+            prompt = Prompt("", prompt)
+        repeated = prompt.system in self._systems
+        self._systems.add(prompt.system)
+        self.stats["requests"] += 1
+        self.stats["tokens"] += prompt.tokens
+        self.stats["system_tokens"] += prompt.system_tokens
+        self.prompt_sizes.append((prompt.tokens, prompt.system_tokens, repeated))
+
+    def answer(self, prompt: Prompt) -> str:
+        """Answer of the model, from a pending request if any
+
+        Raise TimeoutError after timeout seconds, or the error of the request.
+        """
+        with self._lock:
+            if prompt in self._pending:
+                self.stats["reused"] += 1
+        future = self.submit(prompt)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:  # an answer is used once
+                if self._pending.get(prompt) is future:
+                    del self._pending[prompt]
+
+    def discard_pending(self, keep: Iterable[Prompt] = ()):
+        """Forget the requests not used, e.g. prefetched for a world that changed,
+        except the ones of the prompts to keep"""
+        keep = set(keep)
+        with self._lock:
+            for prompt in [prompt for prompt in self._pending if prompt not in keep]:
+                self._pending.pop(prompt).cancel()
+
+    def close(self):
+        """Stop the service, the requests not started are cancelled"""
+        self.discard_pending()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        while not self._idle_clients.empty():
+            client = self._idle_clients.get_nowait()
+            if hasattr(client, "close"):
+                client.close()
+
+
+_SERVICE: Optional[DecisionService] = None
+
+
+def decision_service() -> DecisionService:
+    """Service of the LLM decisions, made on first use"""
+    global _SERVICE
+    if _SERVICE is None:
+        _SERVICE = DecisionService()
+    return _SERVICE
+
+
+def set_decision_service(service: Optional[DecisionService]):
+    """Use this service for the LLM decisions (None: a default one, made on next use)"""
+    global _SERVICE
+    if _SERVICE is not None and _SERVICE is not service:
+        _SERVICE.close()
+    _SERVICE = service
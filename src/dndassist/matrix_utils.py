@@ -54,6 +54,73 @@ def char_to_elev(ch: str) -> float | None:
 
 def build_elevation_map(h:int, w:int, ctrl_pts: List[Tuple[Tuple[int,int], int]], smoothing_passes: int = 1, dh=0.5) -> np.ndarray:
     """
+    Convert ASCII elevation map into numeric elevation grid.
+    - Each control tile ('0'-'9','a'-'f') sets an elevation level.
+    - Empty tiles inherit the elevation of the nearest control tile.
+    - Optional smoothing to soften slopes (control tiles remain fixed).
+
+    Same result as build_elevation_map_loop, one BFS layer / smoothing pass at a time.
+    """
+    if not(ctrl_pts):
+       return   np.zeros((w, h))
+    elevation = np.full((w, h), np.nan)
+    fixed_mask = np.zeros((w, h), dtype=bool)
+
+    # Step 1: Decode control tiles
+    xs, ys = np.array([pos for pos, _ in ctrl_pts]).T
+    elevation[xs, ys] = [val for _, val in ctrl_pts]
+    fixed_mask[xs, ys] = True
+
+    # Step 2: Fill free tiles via BFS (nearest control)
+    # A tile is claimed by the first tile of the previous layer, in queue order,
+    # then direction order: the key rank*8+direction gives the claimer and the
+    # queue order of the new layer.
+    directions = [(-1,0), (1,0), (0,-1), (0,1), (-1,-1),(1,-1),(-1,1),(1,1)]
+    ly, lx = np.nonzero(fixed_mask.T)  # queue order: y then x
+    while lx.size:
+        tx = np.concatenate([lx + dx for dx, _ in directions])
+        ty = np.concatenate([ly + dy for _, dy in directions])
+        key = np.concatenate([np.arange(lx.size) * 8 + d for d in range(8)])
+        valid = (tx >= 0) & (tx < w) & (ty >= 0) & (ty < h)
+        tx, ty, key = tx[valid], ty[valid], key[valid]
+        free = np.isnan(elevation[tx, ty])
+        tx, ty, key = tx[free], ty[free], key[free]
+        order = np.argsort(key)
+        _, first = np.unique(tx[order] * h + ty[order], return_index=True)
+        claim = order[np.sort(first)]
+        tx, ty, key = tx[claim], ty[claim], key[claim]
+        elevation[tx, ty] = elevation[lx[key // 8], ly[key // 8]]
+        lx, ly = tx, ty
+
+    # Step 3: Optional smoothing
+    # The mean of the loop sums neighbors pairwise when there are 8 of them,
+    # one by one otherwise: both are reproduced to get the same rounding.
+    valid = np.zeros((8, w, h), dtype=bool)
+    for d, (dx, dy) in enumerate(directions):
+        valid[d, max(0, -dx):w - max(0, dx), max(0, -dy):h - max(0, dy)] = True
+    count = valid.sum(axis=0)
+    interior = count == 8
+    movable = ~fixed_mask & (count > 0)
+    for _ in range(smoothing_passes):
+        padded = np.pad(elevation, 1)
+        vals = [
+            np.where(valid[d], padded[1 + dx:1 + dx + w, 1 + dy:1 + dy + h], 0.)
+            for d, (dx, dy) in enumerate(directions)
+        ]
+        total = 0.
+        for val in vals:
+            total = total + val
+        pairwise = ((vals[0] + vals[1]) + (vals[2] + vals[3])) + ((vals[4] + vals[5]) + (vals[6] + vals[7]))
+        total = np.where(interior, pairwise, total)
+        elevation = np.where(movable, total / np.maximum(count, 1), elevation)
+    elevation *= dh
+    return elevation
+
+
+def build_elevation_map_loop(h:int, w:int, ctrl_pts: List[Tuple[Tuple[int,int], int]], smoothing_passes: int = 1, dh=0.5) -> np.ndarray:
+    """
+    Reference implementation of build_elevation_map, tile by tile.
+
     Convert ASCII elevation map into numeric elevation grid.
     - Each control tile ('0'-'9','a'-'f') sets an elevation level.
     - Empty tiles inherit the elevation of the nearest control tile.
@@ -163,11 +230,100 @@ def get_upstream_pos(
 
 
 
+def _crown_geometry(width: int, height: int, pos_0: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorized equivalent of get_crown_pos + get_upstream_pos over a whole grid
+
+    returns:
+    upstream: flat index of the upstream tile of each tile (pos_0 is its own upstream)
+    order: flat indices of the tiles sorted crown by crown
+    bounds: order[bounds[r-1]:bounds[r]] are the tiles of crown r
+    """
+    x0, y0 = pos_0
+    xs, ys = np.indices((width, height))
+    ddx = xs - x0
+    ddy = ys - y0
+    crown = np.maximum(np.abs(ddx), np.abs(ddy))
+    # same rounding as get_upstream_pos : step back if |d|/crown > 0.5
+    du = np.where(2 * ddx > crown, -1, np.where(2 * ddx < -crown, 1, 0))
+    dv = np.where(2 * ddy > crown, -1, np.where(2 * ddy < -crown, 1, 0))
+    upstream = ((xs + du) * height + (ys + dv)).ravel()
+    crown = crown.ravel()
+    order = np.argsort(crown, kind="stable")
+    bounds = np.cumsum(np.bincount(crown))
+    return upstream, order, bounds
+
+
+def _easyview(view_height: float) -> float:
+    """Fog reduction factor when looking from above"""
+    easyview = 1
+    if view_height > 3:
+        easyview = 0.15
+    elif view_height > 4:
+        easyview = 0.07
+    elif view_height > 6:
+        easyview = 0.0
+    return easyview
+
+
 def compute_opacity(fog_map:np.ndarray, pos_0:Tuple[int,int], dx:int=1.5, view_height:float=2)->np.ndarray:
     """Fog map : opacity map in % / m 
         a fog value of 0.5 mean 50% of view los after 1 m" 
 
     return a opacity map , zero at the begenning , then vanishing to 1
+
+    Same result as compute_opacity_loop: the attenuation of every tile
+    is computed at once, then whole crowns are multiplied at a time.
+    """
+    width, height = fog_map.shape
+    upstream, order, bounds = _crown_geometry(width, height, pos_0)
+
+    xs, ys = np.indices((width, height))
+    xs = xs.ravel()
+    ys = ys.ravel()
+    step = np.hypot(
+        (xs - upstream // height) * dx,
+        (ys - upstream % height) * dx,
+    )
+    attenuation = np.maximum(1. - fog_map.ravel()[upstream] * step * _easyview(view_height), 0)
+
+    trsp_map = np.ones_like(fog_map).ravel()
+    # the first crown is always fully transparent
+    for crwn_idx in range(2, len(bounds)):
+        tiles = order[bounds[crwn_idx - 1]:bounds[crwn_idx]]
+        trsp_map[tiles] = trsp_map[upstream[tiles]] * attenuation[tiles]
+    return trsp_map.reshape(width, height)
+
+
+def compute_nap_of_earth(elev_map:np.ndarray, pos_0:Tuple[int,int], h0=1., dx=1.5,)->np.ndarray:
+    """Return the hidden mask (1. hidden, 0. visible) seen from pos_0 at height h0
+
+    Same result as compute_nap_of_earth_loop, but each crown is solved
+    in one array operation: the angles are computed on the whole grid at once,
+    only the running maximum of the blocking angle is propagated crown by crown.
+    """
+    width, height = elev_map.shape
+    upstream, order, bounds = _crown_geometry(width, height, pos_0)
+
+    xs, ys = np.indices((width, height))
+    dist = np.hypot((pos_0[0] - xs) * dx, (pos_0[1] - ys) * dx).ravel()
+    h = (elev_map - elev_map[pos_0]).ravel()
+
+    # on pos_0 itself, this is atan2(-h0, 0), the start angle of eval_noe
+    max_angle = np.arctan2(h - h0, dist)
+    for crwn_idx in range(1, len(bounds)):
+        tiles = order[bounds[crwn_idx - 1]:bounds[crwn_idx]]
+        max_angle[tiles] = np.maximum(max_angle[tiles], max_angle[upstream[tiles]])
+
+    noe = np.tan(max_angle) * dist + h0 - h
+    noe_map = (noe > 0.01).astype(elev_map.dtype).reshape(width, height)
+    noe_map[pos_0] = 0
+    return noe_map
+
+
+def compute_opacity_loop(fog_map:np.ndarray, pos_0:Tuple[int,int], dx:int=1.5, view_height:float=2)->np.ndarray:
+    """Crown-by-crown reference implementation of compute_opacity
+
+    Kept to check the vectorized version, do not use in the game loop.
     """
     width,height=fog_map.shape
     trsp_map=np.ones_like(fog_map)
@@ -198,7 +354,11 @@ def compute_opacity(fog_map:np.ndarray, pos_0:Tuple[int,int], dx:int=1.5, view_h
 
 
 
-def compute_nap_of_earth(elev_map:np.ndarray, pos_0:Tuple[int,int], h0=1., dx=1.5,)->np.ndarray:
+def compute_nap_of_earth_loop(elev_map:np.ndarray, pos_0:Tuple[int,int], h0=1., dx=1.5,)->np.ndarray:
+    """Crown-by-crown reference implementation of compute_nap_of_earth
+
+    Kept to check the vectorized version, do not use in the game loop.
+    """
     width,height=elev_map.shape
     noe_map=np.zeros_like( elev_map)
     max_angle_map=np.zeros_like(elev_map)
@@ -0,0 +1,338 @@
+"""Path finding on the tile grid of a room
+
+The grids are stored flat, with a border of walls around the map:
+a tile (x, y) has the index (x+1)*(height+2) + (y+1), and its 8 neighbors
+are at fixed offsets, without bound checks.
+
+- PathFinder.find_path: A* toward one goal, within a movement limit
+- PathFinder.flood: Dijkstra toward every tile, for a whole turn of an actor
+"""
+
+import math
+import heapq
+from array import array
+from typing import List, Tuple, Optional, Iterable
+import numpy as np
+
+IMPASSABLE = 999  # tiles with a difficulty above are walls
+
+# 8-directional neighbors (dx, dy, cost multiplier)
+DELTAS = [
+    (-1, 0, 1.0),
+    (1, 0, 1.0),
+    (0, -1, 1.0),
+    (0, 1, 1.0),
+    (-1, -1, math.sqrt(2)),
+    (1, -1, math.sqrt(2)),
+    (-1, 1, math.sqrt(2)),
+    (1, 1, math.sqrt(2)),
+]
+
+
+class PathFinder:
+    """A* engine over flat difficulty / elevation grids
+
+    difficulty, elevation: (width, height) arrays, as the tiles of the room
+    unit_m: size of a tile in meters
+    """
+
+    def __init__(self, difficulty: np.ndarray, elevation: np.ndarray, unit_m: float = 1.5):
+        self.width, self.height = difficulty.shape
+        self.unit_m = unit_m
+        self.difficulty = np.asarray(difficulty, dtype=float)
+        self.elevation = np.asarray(elevation, dtype=float)
+
+        self._h_pad = self.height + 2
+        padded_diff = np.pad(self.difficulty, 1, constant_values=IMPASSABLE)
+        padded_elev = np.pad(self.elevation, 1, constant_values=0.0)
+        self._walls = bytearray((padded_diff >= IMPASSABLE).ravel().tobytes())
+        nb_tiles = padded_diff.size
+        self._inf = array("d", [math.inf]) * nb_tiles
+        self._none = array("l", [-1]) * nb_tiles
+
+        # cost of each step, for each direction, precomputed once per map
+        padded_diff = padded_diff.ravel()
+        padded_elev = padded_elev.ravel()
+        inside = np.zeros((self.width + 2, self._h_pad), dtype=bool)
+        inside[1:-1, 1:-1] = True
+        inside = inside.ravel()
+        current = np.arange(nb_tiles)
+        self._steps = []
+        for dx, dy, mult in DELTAS:
+            offset = dx * self._h_pad + dy
+            mult = int(round(mult * unit_m))  # same rounding as RoomMap.unit_to_m
+            nxt = np.clip(current + offset, 0, nb_tiles - 1)
+            slope_difficulty = (padded_elev[nxt] - padded_elev) / mult * 10.
+            cost = np.maximum(0.5, padded_diff[nxt] + slope_difficulty) * mult
+            cost[~inside] = math.inf
+            # python lists: element access is much faster than on numpy arrays
+            self._steps.append((offset, mult, cost.tolist()))
+
+    def index(self, pos: Tuple[int, int]) -> int:
+        return (pos[0] + 1) * self._h_pad + pos[1] + 1
+
+    def pos(self, idx: int) -> Tuple[int, int]:
+        return idx // self._h_pad - 1, idx % self._h_pad - 1
+
+    def blocked_mask(self, occupied_positions: Iterable[Tuple[int, int]]) -> bytearray:
+        """Walls and occupied tiles, as a flat boolean mask"""
+        blocked = bytearray(self._walls)
+        for pos in occupied_positions:
+            if 0 <= pos[0] < self.width and 0 <= pos[1] < self.height:
+                blocked[self.index(pos)] = 1
+        return blocked
+
+    def find_path(
+        self,
+        start: Tuple[int, int],
+        goal: Tuple[int, int],
+        occupied_positions: Iterable[Tuple[int, int]] = (),
+        max_distance_m: Optional[float] = None,
+        closest: Optional[float] = None,
+    ) -> Tuple[List[Tuple[int, int]], float, float]:
+        """
+        A* from start to goal, with a slope penalty and a movement limit.
+
+        If the goal cannot be reached within max_distance_m,
+        the path leads to the reached tile closest to the goal.
+        Returns (path, used distance, distance without terrain penalties) in meters.
+
+        The search is fast (about a millisecond on 200x200) only when bounded by
+        a movement limit. Without max_distance_m, an unreachable goal makes it visit
+        the whole map: about 70 ms on 200x200. The moves of the game are bounded.
+
+        closest: distance in tiles from goal of the closest tiles within reach, if known
+            (see Reachability.closest_tiles). The search stops on the first one met,
+            which is the one it would end on, but the path and distances
+            are the ones found so far, maybe not the shortest.
+        """
+        h_pad = self._h_pad
+        steps = self._steps
+        blocked = self.blocked_mask(occupied_positions)
+        g_score = self._inf[:]
+        g_ref_score = self._inf[:]
+        came_from = self._none[:]
+        hypot = math.hypot
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        max_dist = math.inf if max_distance_m is None else max_distance_m
+        stop_h = -1.0 if closest is None else closest
+
+        gx, gy = goal[0] + 1, goal[1] + 1
+        i_start = self.index(start)
+        i_goal = -1  # a goal out of the map is never reached
+        if 0 <= goal[0] < self.width and 0 <= goal[1] < self.height:
+            i_goal = self.index(goal)
+        g_score[i_start] = 0.0
+        g_ref_score[i_start] = 0.00001
+        came_from[i_start] = i_start
+
+        best_reached = i_start
+        best_h = hypot(start[0] - goal[0], start[1] - goal[1])
+
+        frontier = [(0, i_start)]  # priority queue (f_score, index)
+        if best_h <= stop_h:
+            frontier = []
+        while frontier:
+            _, current = heappop(frontier)
+            g_current = g_score[current]
+            # If max distance exceeded, stop at the farthest reachable tile
+            if g_current > max_dist:
+                continue
+            # If we reached the goal before exceeding distance, stop
+            if current == i_goal:
+                best_reached = i_goal
+                break
+
+            g_ref_current = g_ref_score[current]
+            for offset, mult, cost in steps:
+                nxt = current + offset
+                if blocked[nxt]:  # impassable or occupied by an actor
+                    continue
+                tentative_g = g_current + cost[current]
+                if tentative_g > max_dist:
+                    continue  # skip unreachable within move allowance
+                if tentative_g < g_score[nxt]:
+                    g_score[nxt] = tentative_g
+                    g_ref_score[nxt] = g_ref_current + mult
+                    came_from[nxt] = current
+                    h = hypot(gx - nxt // h_pad, gy - nxt % h_pad)
+                    heappush(frontier, (tentative_g + h, nxt))
+                    if h < best_h:
+                        best_reached, best_h = nxt, h
+                        if h <= stop_h:  # none closer: the end is known
+                            frontier = []
+                            break
+
+        path = []
+        node = best_reached
+        while node != i_start:
+            path.append(self.pos(node))
+            node = came_from[node]
+        path.append(start)
+        path.reverse()
+        return path, g_score[best_reached], g_ref_score[best_reached]
+
+    def flood(
+        self,
+        start: Tuple[int, int],
+        occupied_positions: Iterable[Tuple[int, int]] = (),
+        max_distance_m: Optional[float] = None,
+    ) -> "Reachability":
+        """Dijkstra from start over the whole map, limited to max_distance_m
+
+        Same step costs as find_path, returns every tile reachable
+        with its cost and predecessor.
+        """
+        steps = self._steps
+        blocked = self.blocked_mask(occupied_positions)
+        g_score = self._inf[:]
+        g_ref_score = self._inf[:]
+        came_from = self._none[:]
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        max_dist = math.inf if max_distance_m is None else max_distance_m
+
+        i_start = self.index(start)
+        g_score[i_start] = 0.0
+        g_ref_score[i_start] = 0.00001
+        came_from[i_start] = i_start
+
+        frontier = [(0.0, i_start)]
+        while frontier:
+            g_current, current = heappop(frontier)
+            if g_current > g_score[current]:
+                continue  # already reached by a shorter path
+            g_ref_current = g_ref_score[current]
+            for offset, mult, cost in steps:
+                nxt = current + offset
+                if blocked[nxt]:
+                    continue
+                tentative_g = g_current + cost[current]
+                if tentative_g > max_dist:
+                    continue
+                if tentative_g < g_score[nxt]:
+                    g_score[nxt] = tentative_g
+                    g_ref_score[nxt] = g_ref_current + mult
+                    came_from[nxt] = current
+                    heappush(frontier, (tentative_g, nxt))
+
+        shape = (self.width + 2, self._h_pad)
+        unpad = lambda flat: np.frombuffer(flat, dtype=flat.typecode).reshape(shape)[1:-1, 1:-1]
+        # predecessors as unpadded flat indices x*height+y
+        came_from = unpad(came_from)
+        predecessor = np.where(
+            came_from >= 0,
+            (came_from // self._h_pad - 1) * self.height + came_from % self._h_pad - 1,
+            -1,
+        )
+        return Reachability(
+            start,
+            unpad(g_score).copy(),
+            unpad(g_ref_score).copy(),
+            predecessor,
+            max_distance_m=max_dist,
+        )
+
+
+class Reachability:
+    """Movement flood fill from one tile
+
+    cost: (width, height) cost to reach each tile in meters, inf if unreachable
+    cost_ref: same without terrain penalties
+    predecessor: (width, height) flat index x*height+y of the previous tile, -1 if unreachable
+    max_distance_m: movement limit of the flood
+
+    Costs are shortest distances, so the tiles within a smaller limit
+    are the ones of cost below it: a flood answers any limit up to its own.
+    """
+
+    def __init__(
+        self,
+        start: Tuple[int, int],
+        cost: np.ndarray,
+        cost_ref: np.ndarray,
+        predecessor: np.ndarray,
+        max_distance_m: float = math.inf,
+    ):
+        self.start = tuple(start)
+        self.cost = cost
+        self.cost_ref = cost_ref
+        self.predecessor = predecessor
+        self.max_distance_m = max_distance_m
+        self.width, self.height = cost.shape
+        self._reached = None  # coordinates and costs of reachable tiles, on demand
+        self.tie_breaks = {}  # tile met first by A* among equally close ones, by goal and limit
+
+    @property
+    def nbytes(self) -> int:
+        return self.cost.nbytes + self.cost_ref.nbytes + self.predecessor.nbytes
+
+    def _in_map(self, pos: Tuple[int, int]) -> bool:
+        return 0 <= pos[0] < self.width and 0 <= pos[1] < self.height
+
+    def is_reachable(self, pos: Tuple[int, int]) -> bool:
+        return self._in_map(pos) and bool(np.isfinite(self.cost[pos]))
+
+    def cost_to(self, pos: Tuple[int, int]) -> float:
+        """Cost in meters to reach pos, inf if not reachable"""
+        if not self._in_map(pos):
+            return math.inf
+        return float(self.cost[pos])
+
+    def nb_reachable(self) -> int:
+        """Number of tiles reachable, start included"""
+        return int(np.isfinite(self.cost).sum())
+
+    def path_to(self, pos: Tuple[int, int]) -> List[Tuple[int, int]]:
+        """Path from start to pos, empty if not reachable"""
+        if not self.is_reachable(pos):
+            return []
+        path = [tuple(pos)]
+        while path[-1] != self.start:
+            prev = int(self.predecessor[path[-1]])
+            path.append(divmod(prev, self.height))
+        path.reverse()
+        return path
+
+    def closest_tiles(
+        self, goal: Tuple[int, int], max_distance_m: Optional[float] = None
+    ) -> List[Tuple[int, int]]:
+        """Reachable tiles closest to goal, all at the same distance, the cheapest first"""
+        if self._reached is None:
+            xs, ys = np.nonzero(np.isfinite(self.cost))
+            self._reached = xs, ys, self.cost[xs, ys]
+        xs, ys, cost = self._reached
+        dist = np.hypot(xs - goal[0], ys - goal[1])
+        if max_distance_m is not None:
+            dist[cost > max_distance_m] = math.inf
+        candidates = np.flatnonzero(dist == dist.min())
+        candidates = candidates[np.argsort(cost[candidates], kind="stable")]
+        return [(int(xs[i]), int(ys[i])) for i in candidates]
+
+    def closest_to(self, goal: Tuple[int, int], max_distance_m: Optional[float] = None) -> Tuple[int, int]:
+        """Reachable tile closest to goal (the cheapest one in case of ties)"""
+        return self.closest_tiles(goal, max_distance_m)[0]
+
+    def reaches(self, goal: Tuple[int, int], max_distance_m: Optional[float] = None) -> bool:
+        """True if goal is reachable within max_distance_m (by default the limit of the flood)"""
+        limit = self.max_distance_m if max_distance_m is None else max_distance_m
+        return self.is_reachable(goal) and self.cost_to(goal) <= limit
+
+    def can_approach(self, goal: Tuple[int, int]) -> bool:
+        """True if moving can bring closer to goal"""
+        return self.closest_to(goal) != self.start
+
+    def path_toward(
+        self, goal: Tuple[int, int], max_distance_m: Optional[float] = None
+    ) -> Tuple[List[Tuple[int, int]], float, float]:
+        """Path to goal, or to the reachable tile closest to goal
+
+        max_distance_m: a movement limit below the one of the flood
+        Returns (path, used distance, distance without terrain penalties) in meters.
+        """
+        if self.reaches(goal, max_distance_m):
+            end = tuple(goal)
+        else:
+            end = self.closest_to(goal, max_distance_m)
+        return self.path_to(end), float(self.cost[end]), float(self.cost_ref[end])
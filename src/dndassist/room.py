@@ -1,25 +1,29 @@
 import os
 from dataclasses import dataclass, field, asdict
 from typing import Dict, Tuple, List, Optional
-import textwrap, math, yaml, json
-import heapq
+import textwrap, math, yaml, json, copy
 import math
 import random
 import numpy as np
 from matplotlib.colors import to_rgb
 import textwrap
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 
 from dndassist.themes import Theme
 from dndassist.character import Character
-from dndassist.matrix_utils import get_crown_pos, compute_nap_of_earth, compute_opacity,return_relative_pos, build_elevation_map
+from dndassist.matrix_utils import get_crown_pos, return_relative_pos, build_elevation_map
+from dndassist.viewshed import ViewshedCache, VisibilityIndex, files_hash
+from dndassist.pathfinding import PathFinder, Reachability
+from dndassist.tilegrid import Tile, TileGrid
+from dndassist.compiled_room import CompiledRoom
 from dndassist.dialog import Dialog
 from dndassist.interaction import Interaction
+from dndassist.autoplay import user_select_option
 
-from dndassist.autoroll import rolldice
-from dndassist.storyprint import story_print, print_3cols
+from dndassist.autoroll import rolldice, actor_rng
+from dndassist.storyprint import story_print, print_3cols, is_quiet
 from dndassist.tactical3dmap import plot_terrain_with_obstacles
 from dndassist.tactical3dmap_plotly import render_tactical_map_plotly
 # constants (tweakable)
@@ -31,6 +35,9 @@ FAR_MIN_U = 21  # >20 units = far
 RAY_STEP_DEG = 4  # angular resolution for rays across a sector
 RAY_STEP_UNIT = 0.5  # step length along each ray (in units)
 PLURAL_THRESHOLD = 3  # >3 items -> pluralize (user requested >3 -> plural)
+STANDING_EYE_HEIGHT = 1.7  # default Actor height, used for the visibility index
+REACHABILITY_CACHE_NBYTES = 32 * 2**20  # floods kept by a room, about 800 of 40x40 tiles
+TERRAIN_FIELDS = ("obstacles_elev", "opacity", "unit_m")  # what the viewsheds depend on
 
 
 # facing -> base angle in degrees (0 = north/up, increases clockwise)
@@ -55,33 +62,10 @@ def _angle_to_vector(angle_deg: float):
     return dx, dy
 
 
-# -----------------------------------------------------------
-#  BASIC TILE
-# -----------------------------------------------------------
-@dataclass
-class Tile:
-    symbol: str
-    difficulty: int =  1
-    blocks_view: bool = False # shall be removed
-    opacity: float =  0.01 #  1% of opacity per m
-    obstacle_height: float =  0 # the height blocking view (disregarting ground elevation)
-    climb_height: float =  0 # the height you can climb ( disregarding ground elevation)
-    elevation: float = 0 # the height of the ground
-    description: str = ""
-    color: str="yellow"
-
-    def to_dict(self):
-        return asdict(self)
-
-    @classmethod
-    def from_dict(cls, d):
-        return cls(**d)
-
-
 # -----------------------------------------------------------
 #  MOVEABLE ELEMENTS
 # -----------------------------------------------------------
-@dataclass
+@dataclass(slots=True)
 class Actor:
     name: str
     symbol: str
@@ -92,7 +76,7 @@ class Actor:
     sprite: str = None
     last_action: str = None
     last_outcome: str = None
-    state: str = "idle" # one of "idle", "manual" (manual input),  "auto" (auto played by a LLM)
+    state: str = "idle" # one of "idle", "manual" (manual input),  "auto" (auto played by a LLM), "utility" (utility policy)
     aggro: str = None
     interaction: Interaction= None
     climbed: int = 0 #height climbed , in meters
@@ -150,12 +134,21 @@ class Actor:
         return situation
 
     @classmethod
-    def from_dict(cls, d:dict, wkdir:str):
+    def from_dict(cls, d:dict, wkdir:str, characters:Dict[str, dict]=None):
+        """Actor from its room description
+
+        characters: character data already read, by file name"""
         d["pos"] = tuple(
             d["pos"]
         )  # when read from safe yaml , tuple were stored as list
         #transforma character string into character
-        char =  Character.load(wkdir, d.pop("character"))
+        char_file = d.pop("character")
+        if characters is not None and char_file in characters:
+            char_data = copy.deepcopy(characters[char_file])
+            char_data["wkdir"] = wkdir
+            char = Character.load_from_dict(char_data)
+        else:
+            char =  Character.load(wkdir, char_file)
         char.name = d["name"] #impose actor name in character description
         # if "dialog" in d:
         #     dname = d["dialog"]
@@ -194,10 +187,10 @@ class Actor:
         auto = True
         if self.state == "manual":
             auto =  False
-        roll, success = rolldice(dice,autoroll=auto)
+        roll, success = rolldice(dice,autoroll=auto, rng=actor_rng(self.name))
         return roll, success, mod
 
-    def talk_to(self)-> Tuple[str, str, str, int]:
+    def talk_to(self, select_option=user_select_option)-> Tuple[str, str, str, int]:
         """Return option through name, cost, and reward"""
         cost = None
         reward = None
@@ -206,7 +199,7 @@ class Actor:
         if self.interaction is None:
             name = f" has nothing to say"
         else:
-            name,cost,reward, xp = self.interaction.try_talking()
+            name,cost,reward, xp = self.interaction.try_talking(select_option)
         return name,cost,reward, xp
                 
     def give_money(self, money_str : str)-> bool:
@@ -237,22 +230,9 @@ class Actor:
         else:
             equipment=equipment_str.strip()   
 
-        new_equipment = []
-        nb = 0
-        for equip in self.character.equipment:
-            if equip == equipment:
-                nb +=1
-                if nb > expected_nb:
-                    new_equipment.append(equip) 
-            else:
-               new_equipment.append(equip) 
-        
-        avail = False
-        if nb < expected_nb:
+        avail = self.character.remove_item(equipment, expected_nb)
+        if not avail:
             story_print(f"[{self.name}] does not have {equipment_str}")
-        else:
-            avail = True
-            self.character.equipment = new_equipment
         return avail
     
     def get_equipment(self, equipment_str : str):
@@ -266,7 +246,7 @@ class Actor:
             equipment=equipment_str.strip()    
         
         for i in range(expected_nb):
-            self.character.equipment.append(equipment)
+            self.character.add_item(equipment, check_cargo=False)
     
     def give_something(self, product_str: str):
         """When an actor gives something"""
@@ -305,7 +285,7 @@ class Actor:
         return actor_status, char_stat1 ,char_stat2 
 
 
-@dataclass
+@dataclass(slots=True)
 class Loot:
     name: str
     symbol: str
@@ -331,7 +311,7 @@ class Loot:
 
 
 
-@dataclass
+@dataclass(slots=True)
 class RoomGate:
     name: str
     # symbol: str
@@ -371,7 +351,7 @@ class RoomMap:
     wkdir: str
     ascii_map: str
     description: str
-    tiles: Dict[Tuple[int, int], Tile]
+    tiles: TileGrid
     theme: Theme
     width: int
     height: int
@@ -384,6 +364,26 @@ class RoomMap:
     actors: Dict[str, Actor] = field(default_factory=dict)
     loots: Dict[str, Loot] = field(default_factory=dict)
     gates: Dict[str, RoomGate] = field(default_factory=dict)
+    viewsheds: ViewshedCache = field(default_factory=ViewshedCache, repr=False, compare=False)
+    visibility: VisibilityIndex = field(default=None, repr=False, compare=False)
+    source_files: List[str] = field(default_factory=list) # room yaml, then theme yaml
+    _path_finder: PathFinder = field(default=None, init=False, repr=False, compare=False)
+    _path_finder_version: int = field(default=-1, init=False, repr=False, compare=False)
+    _reachabilities: OrderedDict = field(default_factory=OrderedDict, init=False, repr=False, compare=False)
+    _ascii_cache: Dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in TERRAIN_FIELDS and "viewsheds" in self.__dict__:  # not while building
+            self.terrain_changed()
+
+    def terrain_changed(self):
+        """Drop what was computed on the terrain (viewsheds, visibility index)
+
+        Called when obstacles_elev, opacity or unit_m is assigned,
+        to call after modifying them in place."""
+        self.viewsheds.clear()
+        self.visibility = None
     
     def unit_to_m(self, u: float) -> int:
         """Convert map units to meters (rounded integer)."""
@@ -445,7 +445,7 @@ class RoomMap:
         - If name already present, the addition is refused
         """
         if name in self.loots:
-            print(f"Loot {name} is already in the room")
+            story_print(f"Loot {name} is already in the room", color="grey", justify="left")
         else:
             self.loots[name] = Actor(name, symbol, pos)
 
@@ -454,14 +454,14 @@ class RoomMap:
         if name in self.loots:
             del self.loots[name]
         else:
-            print(f"Loot {name} is not in the room")
+            story_print(f"Loot {name} is not in the room", color="grey", justify="left")
 
     # -------------------------------------------
     def pick_up_loot(self, actor_name: str):
         actor = self.actors[actor_name]
         for key, loot in list(self.loots.items()):
             if loot.pos == actor.pos:
-                print(f"{actor.name} picked up {loot.name}.")
+                story_print(f"{actor.name} picked up {loot.name}.", color="green", justify="right")
                 del self.loots[key]
 
     # -------------------------------------------
@@ -607,23 +607,87 @@ class RoomMap:
         else:
             plt.show()
 
+    def nap_of_earth(self, pos: Tuple[int, int], view_height: float) -> np.ndarray:
+        """Tiles hidden by the terrain from pos (read-only, cached)"""
+        return self.viewsheds.nap_of_earth(
+            self.obstacles_elev, self.opacity, pos, view_height, self.unit_m
+        )
+
+    def fog_of_war(self, pos: Tuple[int, int], view_height: float) -> np.ndarray:
+        """Transparency of the fog seen from pos (read-only, cached)"""
+        return self.viewsheds.fog_of_war(
+            self.obstacles_elev, self.opacity, pos, view_height, self.unit_m
+        )
+
+    def standard_view_heights(self) -> List[float]:
+        """Eye heights worth indexing: standing, and standing on each climbable tile"""
+        heights = {STANDING_EYE_HEIGHT}
+        for tile_spec in self.theme.tiles.values():
+            if 0 < tile_spec.climb_height < 999:
+                heights.add(STANDING_EYE_HEIGHT + tile_spec.climb_height)
+        return sorted(heights)
+
+    def visibility_index_path(self) -> str:
+        """The index is stored next to the room yaml"""
+        return os.path.splitext(self.source_files[0])[0] + ".visibility.npz"
+
+    def precompute_visibility(self, view_heights: List[float] = None) -> VisibilityIndex:
+        """Load or build the tile-to-tile visibility index of this room
+
+        The index on disk is reused if it was built from the same room and theme files.
+        Raise ValueError if the room is too large for an index, see VisibilityIndex.
+        """
+        if view_heights is None:
+            view_heights = self.standard_view_heights()
+        source_hash = files_hash(self.source_files)
+        path = self.visibility_index_path()
+        index = VisibilityIndex.load(path)
+        if (
+            index is None
+            or index.source_hash != source_hash
+            or index.shape != (self.width, self.height)
+            or not all(index.has_height(h) for h in view_heights)
+        ):
+            story_print(f"Building visibility index of {self.name}...", color="green", justify="right")
+            index = VisibilityIndex.build(
+                self.obstacles_elev, view_heights, self.unit_m, source_hash=source_hash
+            )
+            index.save(path)
+        self.visibility = index
+        return index
+
+    def is_visible(self, pos_from: Tuple[int, int], pos_to: Tuple[int, int], view_height: float) -> bool:
+        """True if pos_to is not hidden by the terrain from pos_from
+
+        O(1) with the visibility index, one cached viewshed otherwise"""
+        if self.visibility is not None and self.visibility.has_height(view_height):
+            return self.visibility.is_visible(pos_from, pos_to, view_height)
+        return self.nap_of_earth(pos_from, view_height)[pos_to] == 0
+
+    def visible_from(self, pos: Tuple[int, int], view_height: float) -> np.ndarray:
+        """Boolean map of the tiles not hidden by the terrain from pos, for many lookups"""
+        if self.visibility is not None and self.visibility.has_height(view_height):
+            return self.visibility.visible_from(pos, view_height)
+        return self.nap_of_earth(pos, view_height) == 0
+
     def actor_perception(self,actor_name:str, pos:Tuple[int,int]=None ):
 
         actor = self.actors[actor_name]
         if pos is None:
             pos = actor.pos
         
-        noe = compute_nap_of_earth(self.obstacles_elev,pos,h0= actor.height+actor.climbed, dx=self.unit_m)
-        fog_of_war = compute_opacity(self.opacity,pos, dx=self.unit_m, view_height=actor.height+actor.climbed)
+        noe = self.nap_of_earth(pos, actor.height+actor.climbed)
+        fog_of_war = self.fog_of_war(pos, actor.height+actor.climbed)
        # fog_of_war = np.ones_like(fog_of_war)
         # reduce fog of war is actor view is higher
         #print("??", actor.height+actor.climbed)
+        # (cached arrays are read-only, no in-place division)
         if actor.height+actor.climbed > 4:
-            fog_of_war /= 0.75
+            fog_of_war = fog_of_war / 0.75
         elif actor.height+actor.climbed > 6:
-            fog_of_war /= 0.66
+            fog_of_war = fog_of_war / 0.66
         elif actor.height+actor.climbed > 8:
-            fog_of_war /= 0.5
+            fog_of_war = fog_of_war / 0.5
         else:
             pass
             
@@ -642,27 +706,37 @@ class RoomMap:
     def render_ascii(
         self, for_save: bool = False, path: List[Tuple[int, int]]=None, actor_name:str=None
     ) -> str:
-        """Return an ASCII version of the MAP"""
-        grid = [
-            [
-                self.tiles.get((x, y), Tile("/", True, False, "")).symbol
-                for x in range(self.width)
-            ]
-            for y in range(self.height)
-        ]
+        """Return an ASCII version of the MAP
+
+        The terrain and the rulers are cached until tiles change,
+        the last map rendered is returned again if no overlay changed."""
+        raw_map, terrain = self._ascii_terrain()
 
         # exit with simple output if for_svae
         if for_save:
-            return "\n".join("".join(row) for row in grid)
+            return raw_map
 
-        # Change ground into visible symbol
-        for y in range(self.height):
-            for x in range(self.width):
-                if grid[y][x] == ".":
-                    grid[y][x] = ":"
-                elif grid[y][x] == " ":
-                    grid[y][x] = "."
-        
+        hidden = None
+        if actor_name is not None:
+            perception = self.actor_perception(actor_name)
+            if path is not None:
+                per2 = self.actor_perception(actor_name,path[0])
+                perception = np.maximum(per2,perception)
+            hidden = perception < 1.
+        else:
+            path = None  # paths are only drawn for an actor
+
+        overlay_key = (
+            self.tiles.version,
+            tuple((tuple(loot.pos), loot.symbol) for loot in self.loots.values()),
+            tuple((tuple(actor.pos), actor.symbol) for actor in self.actors.values()),
+            None if hidden is None else hidden.tobytes(),
+            None if path is None else tuple(tuple(pos) for pos in path),
+        )
+        if self._ascii_cache.get("overlay_key") == overlay_key:
+            return self._ascii_cache["map"]
+
+        grid = [list(row) for row in terrain]
 
         # add loots
         for loot in self.loots.values():
@@ -675,17 +749,9 @@ class RoomMap:
             grid[y][x] = "__" + actor.symbol + "__"
         
         # make obstructed tiles invisible
-        if actor_name is not None:
-            perception = self.actor_perception(actor_name)
-            if path is not None:
-                per2 = self.actor_perception(actor_name,path[0])
-                perception = np.maximum(per2,perception)
-
-            for y in range(self.height):
-                for x in range(self.width):
-                    if perception[x,y] < 1.:
-                        grid[y][x] = " "
-                    
+        if hidden is not None:
+            for x, y in zip(*np.nonzero(hidden)):
+                grid[y][x] = " "
         
             # add path
             if path is not None:
@@ -693,42 +759,57 @@ class RoomMap:
                     grid[y][x] = "__*__"
                 x, y = actor.pos
                 grid[y][x] = actor.symbol
-                
-        
-        # add coordinates
-        tip = ["."]
-        top = ["."]
-        idx = -1
-        tens = 0
-        for x in range(self.width):
-            idx += 1
-            if idx == 10:
-                idx = 0
-                tens +=1
-                top.append(f"__{str(idx)}__")
-                tip.append(f"__{str(tens)}__")
-            else:    
-                top.append(f"__{str(idx)}__")
-                tip.append(" ")
-            
-        grid.insert(0, top)
-        grid.insert(0, tip)
-        
 
-        idx = -2
-        for y in range(self.height + 1):
-            if idx <= -1:
-                grid[y].insert(0, " ")
-                grid[y].append(" .")
+        # add coordinates
+        header, labels = self._ascii_rulers()
+        rows = list(header)
+        for row, label in zip(grid, labels):
+            if label is None:
+                rows.append(" ".join(row))
             else:
-                grid[y].insert(0, f"__{idx: 2d}__")
-                grid[y].append(f"__{idx: 2d}__")
-            idx += 1
-            # if idx == 10:
-            #     idx = 0
-        return "\n".join(" ".join(row) for row in grid)
-        
+                rows.append(" ".join([label] + row + [label]))
+        ascii_map = "\n".join(rows)
+        self._ascii_cache["overlay_key"] = overlay_key
+        self._ascii_cache["map"] = ascii_map
+        return ascii_map
+
+    def _ascii_terrain(self) -> Tuple[str, List[List[str]]]:
+        """The raw map, and the tiles symbols as displayed, row by row"""
+        if self._ascii_cache.get("terrain_version") != self.tiles.version:
+            symbols = np.array(self.tiles.symbols, dtype=object)[self.tiles.symbol_id.T]
+            raw_map = "\n".join("".join(row) for row in symbols.tolist())
+            # Change ground into visible symbol
+            display = np.where(symbols == ".", ":", np.where(symbols == " ", ".", symbols))
+            self._ascii_cache.clear()
+            self._ascii_cache["terrain_version"] = self.tiles.version
+            self._ascii_cache["terrain"] = (raw_map, display.tolist())
+        return self._ascii_cache["terrain"]
+
+    def _ascii_rulers(self) -> Tuple[List[str], List[Optional[str]]]:
+        """The two header lines, and the label of each row (the last row has none)"""
+        if "rulers" not in self._ascii_cache:
+            tip = ["."]
+            top = ["."]
+            idx = -1
+            tens = 0
+            for x in range(self.width):
+                idx += 1
+                if idx == 10:
+                    idx = 0
+                    tens +=1
+                    top.append(f"__{str(idx)}__")
+                    tip.append(f"__{str(tens)}__")
+                else:    
+                    top.append(f"__{str(idx)}__")
+                    tip.append(" ")
+            header = [" ".join([" "] + tip + [" ."]), " ".join([" "] + top + [" ."])]
+            labels = [f"__{idx: 2d}__" for idx in range(self.height - 1)] + [None]
+            self._ascii_cache["rulers"] = (header, labels)
+        return self._ascii_cache["rulers"]
+
     def print_map(self, actor_name:str=None, path: List[Tuple[int, int]] = None):
+        if is_quiet():
+            return  # nothing to render for
         map = self.render_ascii(path=path, actor_name=actor_name)
 
         left = ["\n\nActors:"]
@@ -790,36 +871,25 @@ class RoomMap:
     def ask_tactical_view(self,actor_name:str=None
     ):
 
-        obs_height = np.ones_like(self.elevation)
-        grd_red = np.ones_like(self.elevation)
-        grd_grn = np.ones_like(self.elevation)
-        grd_blu = np.ones_like(self.elevation)
+        obs_height = np.ones_like(self.elevation) + self.tiles.obstacle_height
+        rgb = np.array([to_rgb(color) for color in self.tiles.colors])[self.tiles.color_id]
+        grd_red, grd_grn, grd_blu = rgb[..., 0], rgb[..., 1], rgb[..., 2]
         grd_alp = np.ones_like(self.elevation)
         obs_alp = np.ones_like(self.elevation)*0.9
-        
-        for x in range(self.width):
-            for y in range(self.height):
-                obs_height[x,y] += self.tiles[(x,y)].obstacle_height
-                grd_red[x,y],grd_grn[x,y],grd_blu[x,y] = to_rgb(self.tiles[(x,y)].color)
-                if self.tiles[(x,y)].symbol == "X":
-                    grd_alp[x,y]=0
-                    obs_alp[x,y]=0
-                if self.tiles[(x,y)].symbol in [" ", "."]:
-                    obs_alp[x,y]=0         
+        void = self.tiles.symbol_is("X")
+        grd_alp[void] = 0
+        obs_alp[void] = 0
+        obs_alp[self.tiles.symbol_is(" ", ".")] = 0
 
         # make obstructed tiles invisible
         if actor_name is not None:
             actor = self.actors[actor_name]
-            noe = compute_nap_of_earth(self.obstacles_elev,actor.pos,h0= actor.height+actor.climbed, dx=self.unit_m)
-            fog_of_war = compute_opacity(self.opacity,actor.pos, dx=self.unit_m, view_height= actor.height+actor.climbed)
-            for y in range(self.height):
-                for x in range(self.width):
-                    #if fog_of_war[x,y] < 0.5:
-                    obs_alp[x,y] = min(obs_alp[x,y],fog_of_war[x,y])
-                    grd_alp[x,y]= min(grd_alp[x,y],fog_of_war[x,y]  )
-                    if noe[x,y] > 0:
-                        obs_alp[x,y] = 0
-                        grd_alp[x,y]=0
+            noe = self.nap_of_earth(actor.pos, actor.height+actor.climbed)
+            fog_of_war = self.fog_of_war(actor.pos, actor.height+actor.climbed)
+            obs_alp = np.minimum(obs_alp, fog_of_war)
+            grd_alp = np.minimum(grd_alp, fog_of_war)
+            obs_alp[noe > 0] = 0
+            grd_alp[noe > 0] = 0
                     
                     
         annotations =[]
@@ -857,19 +927,19 @@ class RoomMap:
         # )
 
     def visible_actors_loots_gates(self, pos_0, view_height):
-        noe = compute_nap_of_earth(self.obstacles_elev,pos_0,h0= view_height, dx=self.unit_m)
+        visible = self.visible_from(pos_0, view_height)
         visible_actors=[]
         for actor in self.actors.values():
-            if noe[*actor.pos] == 0:#< actor.height * 0.75:
+            if visible[actor.pos]:#< actor.height * 0.75:
                 visible_actors.append(actor.name)
         visible_loots=[]
         for loot_key, loot in self.loots.items():
-            if noe[*loot.pos] == 0:
+            if visible[loot.pos]:
                 visible_loots.append(loot_key)
         visible_gates=[]
         
         for gate in self.gates.values():
-            if noe[*gate.pos] == 0:
+            if visible[gate.pos]:
                 visible_gates.append(gate.name)
         
         return visible_actors,visible_loots,visible_gates
@@ -964,30 +1034,6 @@ class RoomMap:
         
         return _visible_actors, _visible_loots, _visible_gates
 
-    def _neighbors(self, x: int, y: int) -> List[Tuple[int, int, float]]:
-        """Return all valid 8-directional neighbors with cost multiplier."""
-        deltas = [
-            (-1, 0, 1.0),
-            (1, 0, 1.0),
-            (0, -1, 1.0),
-            (0, 1, 1.0),
-            (-1, -1, math.sqrt(2)),
-            (1, -1, math.sqrt(2)),
-            (-1, 1, math.sqrt(2)),
-            (1, 1, math.sqrt(2)),
-        ]
-        neighbors = []
-        for dx, dy, mult in deltas:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < self.width and 0 <= ny < self.height:
-                neighbors.append((nx, ny, self.unit_to_m(mult)))
-        return neighbors
-
-    def _heuristic(self, a: Tuple[int, int], b: Tuple[int, int]) -> float:
-        """Euclidean distance heuristic for A*."""
-        (x1, y1), (x2, y2) = a, b
-        return math.hypot(x2 - x1, y2 - y1)
-
     # -------------------------------------------
     def move_actor_to_direction(self, actor_name: str, dir: str, distance_m: int):
         """Move an actor toward a direction.
@@ -1026,9 +1072,7 @@ class RoomMap:
         else:
             raise RuntimeError(f"Error, direction {dir} is not understood...")
         x0, y0 = actor.pos
-        path, used_dist = self.move_to(
-            x0, y0, x0 + dx, y0 + dy, max_distance_m=distance_m
-        )
+        path, used_dist = self.move_toward(actor_name, (x0 + dx, y0 + dy), distance_m)
         # print(f"Inital pos: {x0},{y0}")
         # print(f"Aiming pos: {x0+dx},{y0+dy}")
         actor.pos = path[-1]
@@ -1070,25 +1114,99 @@ class RoomMap:
         if target_name in self.actors:
             target = self.actors[target_name]
             x1, y1 = target.pos
-            print(f"going from {x0},{y0} to actor {target_name} at {x1},{y1}")
+            story_print(f"going from {x0},{y0} to actor {target_name} at {x1},{y1}", color="green", justify="right")
         elif target_name in self.loots:
             target = self.loots[target_name]
             x1, y1 = target.pos
-            print(f"going from {x0},{y0} to loot {target_name} at {x1},{y1}")
+            story_print(f"going from {x0},{y0} to loot {target_name} at {x1},{y1}", color="green", justify="right")
         elif target_name in self.gates:
             target = self.gates[target_name]
             x1, y1 = target.pos
-            print(f"going from {x0},{y0} to gates {target_name} at {x1},{y1}")
+            story_print(f"going from {x0},{y0} to gates {target_name} at {x1},{y1}", color="green", justify="right")
         else:
-            print(f"Target {target_name} not found in actors nor loots")
+            story_print(f"Target {target_name} not found in actors nor loots", color="red", justify="left")
             return None
 
-        path, used_dist = self.move_to(x0, y0, x1, y1, max_distance_m=distance_m)
+        path, used_dist = self.move_toward(actor_name, (x1, y1), distance_m)
         actor.pos = path[-1]
         self.print_map(path=path, actor_name=actor_name)
         story_print(f"final pos {actor.pos}", color="green", justify="right")
         return used_dist
 
+    def path_finder(self) -> PathFinder:
+        """Path finding engine on the current tiles, rebuilt only if tiles changed"""
+        if self._path_finder is None or self._path_finder_version != self.tiles.version:
+            self._path_finder = PathFinder(
+                self.tiles.difficulty, self.tiles.elevation, unit_m=self.unit_m
+            )
+            self._path_finder_version = self.tiles.version
+            self._reachabilities.clear()
+        return self._path_finder
+
+    def reachability(self, actor_name: str, max_distance_m: Optional[float] = None) -> Reachability:
+        """Cost and path to every tile an actor can reach, by default within its max distance
+
+        The last floods are kept, up to REACHABILITY_CACHE_NBYTES: a flood answers
+        all the moves of the turn, and the same positions of the actors come back
+        in repeated fights (see simulation). Floods are dropped when tiles change.
+        """
+        actor = self.actors[actor_name]
+        if max_distance_m is None:
+            max_distance_m = actor.character.max_distance()
+        finder = self.path_finder()
+        occupied_positions = tuple(other.pos for other in self.actors.values())
+        key = (finder, actor.pos, occupied_positions)
+        reach = self._reachabilities.get(key)
+        if reach is not None and reach.max_distance_m >= max_distance_m:
+            self._reachabilities.move_to_end(key)
+            return reach
+        reach = finder.flood(actor.pos, occupied_positions, max_distance_m=max_distance_m)
+        self._reachabilities[key] = reach
+        max_size = max(1, REACHABILITY_CACHE_NBYTES // reach.nbytes)
+        while len(self._reachabilities) > max_size:
+            self._reachabilities.popitem(last=False)
+        return reach
+
+    def move_toward(
+        self, actor_name: str, goal: Tuple[int, int], max_distance_m: float
+    ) -> Tuple[List[Tuple[int, int]], int]:
+        """Path of an actor toward goal, read from its reachability.
+
+        If several tiles out of reach of goal are equally close to it,
+        the path goes, as move_to does, to the one A* meets first
+        (kept with the reachability, for the same move in a later turn).
+        Returns (path, used distance in meters).
+        """
+        reach = self.reachability(actor_name, max_distance_m)
+        end = goal
+        if not reach.reaches(goal, max_distance_m):
+            closest = reach.closest_tiles(goal, max_distance_m)
+            end = closest[0] if len(closest) == 1 else self._tie_break(reach, goal, closest, max_distance_m)
+        path, g_score, g_ref_score = reach.path_toward(end, max_distance_m)
+        used_dist = round(g_score)
+        self._report_path_penalty(used_dist, round(g_ref_score))
+        return path, used_dist
+
+    def _tie_break(
+        self, reach: Reachability, goal: Tuple[int, int], closest: List[Tuple[int, int]], max_distance_m: float
+    ) -> Tuple[int, int]:
+        """Tile A* meets first among closest, the tiles of reach equally close to goal"""
+        key = (tuple(goal), max_distance_m)
+        if key not in reach.tie_breaks:
+            occupied_positions = [actor.pos for actor in self.actors.values()]
+            distance = math.hypot(closest[0][0] - goal[0], closest[0][1] - goal[1])
+            path, _, _ = self.path_finder().find_path(
+                reach.start, goal, occupied_positions, max_distance_m=max_distance_m, closest=distance
+            )
+            reach.tie_breaks[key] = path[-1]
+        return reach.tie_breaks[key]
+
+    def _report_path_penalty(self, used_dist: int, ideal_dist: int):
+        if used_dist > ideal_dist:
+            story_print(f"Path penalty: {ideal_dist}m-> {used_dist}m",color="green", justify="right")
+        if used_dist < ideal_dist:
+            story_print(f"Path bonus: {ideal_dist}m-> {used_dist}m",color="green", justify="right")
+
     def move_to(
         self, x0: int, y0: int, x: int, y: int, max_distance_m: Optional[float] = None
     ) -> Tuple[List[Tuple[int, int]], int]:
@@ -1097,81 +1215,16 @@ class RoomMap:
         Accounts for tile difficulty, diagonal movement, and movement limit.
 
         If `max_distance` is provided, the path stops when movement allowance is exceeded.
+        Without it, the search may cover the whole map (see PathFinder.find_path).
         Returns (path, used distance in meters).
         """
-        start, goal = (x0, y0), (x, y)
-
-        frontier = [(0, start)]  # priority queue (f_score, position)
-        came_from: Dict[Tuple[int, int], Optional[Tuple[int, int]]] = {start: None}
-        g_score: Dict[Tuple[int, int], float] = {start: 0.0}
-        g_ref_score: Dict[Tuple[int, int], float] = {start: 0.00001}
-
-        best_reached = start  # last reachable position if max_distance stops us
-
         occupied_positions = [actor.pos for actor in self.actors.values()]
+        path, g_score, g_ref_score = self.path_finder().find_path(
+            (x0, y0), (x, y), occupied_positions, max_distance_m=max_distance_m
+        )
 
-        while frontier:
-            _, current = heapq.heappop(frontier)
-            prev_tile = self.tiles[current]
-                
-            # If max distance exceeded, stop at the farthest reachable tile
-            if max_distance_m is not None and g_score[current] > max_distance_m:
-                continue
-
-            # If we reached the goal before exceeding distance, stop
-            if current == goal:
-                best_reached = goal
-                break
-
-            for nx, ny, mult in self._neighbors(*current):
-                tile = self.tiles[(nx, ny)]
-                if tile.difficulty >= 999:  # impassable
-                    continue
-                if (nx, ny) in occupied_positions:  # position occupied by an actor
-                    continue
-
-                slope_pct = (tile.elevation - prev_tile.elevation) / mult
-                slope_difficulty = slope_pct *10.
-
-                cost_p_meter = max(0.5,  (tile.difficulty + slope_difficulty))
-
-                tentative_g = g_score[current] + cost_p_meter * mult
-                tentative_g_ref = g_ref_score[current] + 1 * mult
-                
-                if max_distance_m is not None and tentative_g > max_distance_m:
-                    continue  # skip unreachable within move allowance
-
-                if (nx, ny) not in g_score or tentative_g < g_score[(nx, ny)]:
-                    g_score[(nx, ny)] = tentative_g
-                    g_ref_score[(nx, ny)] = tentative_g_ref
-
-                    f_score = tentative_g + self._heuristic((nx, ny), goal)
-                    heapq.heappush(frontier, (f_score, (nx, ny)))
-                    came_from[(nx, ny)] = current
-                    if self._heuristic((nx, ny), goal) < self._heuristic(
-                        best_reached, goal
-                    ):
-                        best_reached = (nx, ny)
-
-        # --- Reconstruct path ---
-        if best_reached not in came_from:
-            return [], 0  # No path found
-
-        path = []
-        node = best_reached
-        while node:
-            path.append(node)
-            node = came_from[node]
-        path.reverse()
-
-        used_dist = round(g_score[path[-1]])
-        ideal_dist = round(g_ref_score[path[-1]])
-        
-        if used_dist > ideal_dist:
-            story_print(f"Path penalty: {ideal_dist}m-> {used_dist}m",color="green", justify="right")
-        if used_dist < ideal_dist:
-            story_print(f"Path bonus: {ideal_dist}m-> {used_dist}m",color="green", justify="right")
-            
+        used_dist = round(g_score)
+        self._report_path_penalty(used_dist, round(g_ref_score))
         return path, used_dist
 
     # -------------------------------------------
@@ -1179,31 +1232,43 @@ class RoomMap:
     # -------------------------------------------
 
     @classmethod
-    def load(cls, wkdir: str, room_name: str):
-        """Load a room map and apply a theme to it."""
-
-        room_path = os.path.join(wkdir, "Rooms", room_name)
-        with open(room_path, "r", encoding="utf-8") as fin:
-            data = yaml.safe_load(fin)
-
+    def load(
+        cls, wkdir: str, room_name: str, visibility_index: bool = False, compiled: bool = True
+    ):
+        """Load a room map and apply a theme to it.
+
+        The room is compiled on its first load (see compiled_room),
+        later loads skip the parsing, until a source file changes.
+        If compiled is False, the sources are always parsed.
+        If visibility_index, the tile-to-tile visibility is also precomputed
+        (or reloaded from disk, see precompute_visibility)."""
+
+        compiled_room = CompiledRoom.load(wkdir, room_name) if compiled else None
+        if compiled_room is None:
+            compiled_room = cls.compile(wkdir, room_name)
+            if compiled:
+                try:
+                    compiled_room.save(wkdir, room_name)
+                except OSError as err:
+                    story_print(f"Warning, room {room_name} could not be compiled: {err}", color="red", justify="left")
+
+        data = compiled_room.data
         name = room_name.strip(".yaml")
-        theme_path = data["theme"]
-        theme_path = os.path.join(wkdir, "Rooms", "Themes", theme_path)
-        theme = Theme.load(theme_path)
         actors = {}
         
         npc_ordered_list = []
         for a_name, a_dict in data["actors"].items():
-            a_dict["name"] = a_name
+            a_dict = dict(a_dict, name=a_name, state="idle")
             npc_ordered_list.append(a_name)
-            a_dict["state"] = "idle"
-            actors[a_name] = Actor.from_dict(a_dict, wkdir)
-
+            actors[a_name] = Actor.from_dict(a_dict, wkdir, compiled_room.characters)
 
-        tiles, width, height,elevation_ctrl_pts = from_ascii_map(data["ascii_map"], theme.tiles)
+        elevation = compiled_room.arrays["elevation"]
+        tiles = TileGrid.from_kinds(compiled_room.palette, compiled_room.arrays["kind"])
+        tiles.elevation[:] = elevation
+        width, height = tiles.width, tiles.height
 
         loots = {}
-        for l_name, _dict in data["loots"].items():
+        for l_name, _dict in data.get("loots", {}).items():
             repeat = _dict.get("repeat",1)
             pos = _dict.get("pos",(width//2, height//2))
             pos_ref = pos
@@ -1223,25 +1288,7 @@ class RoomMap:
           
         npc_ordered_list =sorted(npc_ordered_list)
 
-        elevation = build_elevation_map(
-            w=width,
-            h=height,
-            ctrl_pts=elevation_ctrl_pts, 
-            smoothing_passes=data.get("elevation_smoothing_passes",2),
-            dh=data.get("elevation_m_per_level",2)
-        )
-        obstacles_elev = np.zeros_like(elevation)
-        for x in range(width):
-            for y in range(height):
-                obstacles_elev[x,y] = elevation[x,y] + tiles[x,y].obstacle_height
-                tiles[x,y].elevation = elevation[x,y]
-
-        opacity = np.full((width, height),0.)
-        for x in range(width):
-            for y in range(height):
-                opacity[x,y] = tiles[x,y].opacity
-
-        return cls(
+        room = cls(
             name=name,
             wkdir=wkdir,
             description=data["description"],
@@ -1249,13 +1296,55 @@ class RoomMap:
             width=width,
             height=height,
             tiles=tiles,
-            theme=theme,
+            theme=compiled_room.theme,
             elevation=elevation,
-            obstacles_elev= obstacles_elev,
-            opacity=opacity,
+            obstacles_elev=compiled_room.arrays["obstacles_elev"],
+            opacity=compiled_room.arrays["opacity"],
             actors=actors,
             npc_ordered_list=npc_ordered_list,
             loots=loots,
+            source_files=[os.path.join(wkdir, path) for path in compiled_room.sources[:2]],
+        )
+        if visibility_index:
+            room.precompute_visibility()
+        return room
+
+    @classmethod
+    def compile(cls, wkdir: str, room_name: str) -> CompiledRoom:
+        """Parse the sources of a room and build its grids"""
+        room_path = os.path.join("Rooms", room_name)
+        with open(os.path.join(wkdir, room_path), "r", encoding="utf-8") as fin:
+            data = yaml.safe_load(fin)
+
+        theme_path = os.path.join("Rooms", "Themes", data["theme"])
+        theme = Theme.load(os.path.join(wkdir, theme_path))
+        characters = {}
+        for a_dict in data["actors"].values():
+            char_file = a_dict["character"]
+            if char_file not in characters:
+                characters[char_file] = Character.load_data(wkdir, char_file)
+
+        tiles, width, height,elevation_ctrl_pts = from_ascii_map(data["ascii_map"], theme.tiles)
+        elevation = build_elevation_map(
+            w=width,
+            h=height,
+            ctrl_pts=elevation_ctrl_pts, 
+            smoothing_passes=data.get("elevation_smoothing_passes",2),
+            dh=data.get("elevation_m_per_level",2)
+        )
+        return CompiledRoom(
+            data=data,
+            theme=theme,
+            characters=characters,
+            palette=tiles.palette,
+            arrays={
+                "kind": tiles.kind,
+                "elevation": elevation,
+                "obstacles_elev": elevation + tiles.obstacle_height,
+                "opacity": tiles.opacity,
+            },
+            sources=[room_path, theme_path]
+            + [os.path.join("Characters", char_file) for char_file in characters],
         )
 
     def save(self, yaml_path: str):
@@ -1276,14 +1365,15 @@ def from_ascii_map(ascii_map: str, tile_specs: dict):
     lines = textwrap.dedent(ascii_map).strip().splitlines()
     height = len(lines)
     width = max(len(line) for line in lines)
-    tiles = {}
+    chars = np.array([list(line.ljust(width)) for line in lines]).T
+    digits = np.isin(chars, list("0123456789"))
     elevation_ctrl_pts=[]
-    for y, line in enumerate(lines):
-        for x, char in enumerate(line.ljust(width)):
-            if char in "0123456789":
-                elevation_ctrl_pts.append( ((x,y),int(char)) )
-                char = " "
-            tiles[(x, y)] = symbol_to_tile(char, tile_specs)
+    for y, x in zip(*np.nonzero(digits.T)):
+        elevation_ctrl_pts.append( ((int(x),int(y)),int(chars[x, y])) )
+    chars[digits] = " "
+    symbols, kind = np.unique(chars, return_inverse=True)
+    palette = [symbol_to_tile(str(char), tile_specs) for char in symbols]
+    tiles = TileGrid.from_kinds(palette, kind.reshape(chars.shape))
     return tiles, width, height,elevation_ctrl_pts
 
 
@@ -0,0 +1,423 @@
+"""Monte Carlo encounters, to balance the fights of a room
+
+An encounter is a fight to the end between the factions of a room
+(players included), with the rules of the game engine:
+- each round, initiative order by 1d20 + dexterity modifier
+- each actor hits a random foe it sees within the range of one of its weapons
+  or hexes, with the strongest of them (attack / offensive_spell, then Character.get_damage)
+- with no foe in reach, it first moves toward the nearest foe, over its max distance
+  (RoomMap.move_actor_to_target), then strikes if a foe came in reach
+- the encounter stops when only one faction stands, or after max_rounds
+
+Neutral actors do not take part, but stand in the way. Nobody climbs.
+All dice are rolled automatically.
+
+Encounters are run by chunks over a process pool. Each chunk has its own seed,
+derived from the seed of the simulation, so the results do not depend
+on the number of workers. Within a chunk, each actor rolls its dice
+from its own stream (autoroll.DiceStreams).
+"""
+
+import os
+import copy
+import math
+import random
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import yaml
+import numpy as np
+
+from dndassist.room import RoomMap, Actor
+from dndassist.attack import attack, offensive_spell
+from dndassist.autoroll import (
+    rolldice,
+    mean_dice,
+    set_force_autoroll,
+    is_force_autoroll,
+    actor_rng,
+    DiceStreams,
+    dice_streams,
+    set_dice_streams,
+)
+from dndassist.storyprint import set_quiet, is_quiet
+
+NO_WINNER = "none"  # all dead, or max_rounds reached
+
+
+@dataclass
+class EncounterResult:
+    """Outcome of one encounter"""
+
+    winner: str  # faction standing at the end, NO_WINNER if none
+    rounds: int
+    hp: Dict[str, int]  # final hit points by actor, 0 if dead
+
+
+@dataclass
+class EncounterReport:
+    """Outcomes of a batch of encounters
+
+    factions: factions of the encounter, by actor name
+    winners: (nb_encounters,) winner of each encounter, index in factions_list
+    rounds: (nb_encounters,) number of rounds of each encounter
+    hp: (nb_encounters, nb_actors) final hit points, actors in the order of actors_list
+    """
+
+    factions: Dict[str, str]
+    winners: np.ndarray
+    rounds: np.ndarray
+    hp: np.ndarray
+    max_hp: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def actors_list(self) -> List[str]:
+        return list(self.factions)
+
+    @property
+    def factions_list(self) -> List[str]:
+        return sorted(set(self.factions.values())) + [NO_WINNER]
+
+    @property
+    def nb_encounters(self) -> int:
+        return len(self.rounds)
+
+    def win_rates(self) -> Dict[str, float]:
+        """Share of encounters won by each faction, NO_WINNER included"""
+        counts = np.bincount(self.winners, minlength=len(self.factions_list))
+        return {
+            faction: counts[i] / self.nb_encounters
+            for i, faction in enumerate(self.factions_list)
+        }
+
+    def expected_rounds(self) -> float:
+        return float(self.rounds.mean())
+
+    def hp_of(self, actor_name: str) -> np.ndarray:
+        """Final hit points of an actor over the encounters"""
+        return self.hp[:, self.actors_list.index(actor_name)]
+
+    def hp_distribution(self, actor_name: str) -> np.ndarray:
+        """Probability of each final hit points value, from 0 to max_hp"""
+        hp = self.hp_of(actor_name)
+        nb_values = max(self.max_hp.get(actor_name, 0), int(hp.max())) + 1
+        return np.bincount(hp, minlength=nb_values) / self.nb_encounters
+
+    def survival_rates(self) -> Dict[str, float]:
+        return {name: float((self.hp_of(name) > 0).mean()) for name in self.actors_list}
+
+    def summary(self) -> str:
+        """Text report of the simulation"""
+        lines = [f"{self.nb_encounters} encounters, {self.expected_rounds():.2f} rounds on average"]
+        lines.append("Win rates:")
+        for faction, rate in self.win_rates().items():
+            lines.append(f"  {faction:20s}: {100*rate:5.1f}%")
+        lines.append("Actors (survival, mean final HP, quartiles):")
+        survival = self.survival_rates()
+        for name in self.actors_list:
+            hp = self.hp_of(name)
+            q1, q2, q3 = np.percentile(hp, [25, 50, 75])
+            lines.append(
+                f"  {name:20s}: {100*survival[name]:5.1f}%, {hp.mean():5.1f}/{self.max_hp.get(name)} HP,"
+                f" {q1:.0f}/{q2:.0f}/{q3:.0f}"
+            )
+        return "\n".join(lines)
+
+    @classmethod
+    def concatenate(cls, reports: List["EncounterReport"]) -> "EncounterReport":
+        first = reports[0]
+        return cls(
+            factions=first.factions,
+            winners=np.concatenate([r.winners for r in reports]),
+            rounds=np.concatenate([r.rounds for r in reports]),
+            hp=np.concatenate([r.hp for r in reports]),
+            max_hp=first.max_hp,
+        )
+
+
+# -----------------------------------------------------------
+#  ONE ENCOUNTER
+# -----------------------------------------------------------
+def load_encounter_room(
+    wkdir: str, room_name: str, players: bool = True, factions: Dict[str, str] = None
+) -> RoomMap:
+    """Room of an encounter, with the players of players.yaml if players
+
+    factions: new faction of some actors, by name, e.g. to ally players of different factions
+    """
+    room = RoomMap.load(wkdir, room_name)
+    if players:
+        with open(os.path.join(wkdir, "players.yaml"), "r") as fin:
+            players_data = yaml.safe_load(fin)
+        for pdict in players_data["players"].values():
+            actor = Actor.from_dict(pdict, wkdir)
+            room.actors[actor.name] = actor
+        room.spread_actors_loots()  # same as GameEngine.change_room
+    for actor in room.actors.values():
+        if factions is not None and actor.name in factions:
+            actor.character.faction = factions[actor.name]
+    return room
+
+
+def load_encounter(
+    wkdir: str, room_name: str, players: bool = True, factions: Dict[str, str] = None
+) -> List[Actor]:
+    """Fighting actors of a room, see load_encounter_room"""
+    room = load_encounter_room(wkdir, room_name, players, factions)
+    return _fighters(room)
+
+
+def _fighters(room: RoomMap) -> List[Actor]:
+    return [actor for actor in room.actors.values() if actor.character.faction != "neutral"]
+
+
+def _is_down(actor: Actor) -> bool:
+    return "dead" in actor.character.current_state["conditions"]
+
+
+def _offenses(actor: Actor) -> List[Tuple[int, str, str]]:
+    """Weapons and hexes of an actor, as (range, "attack"|"hex", name), the strongest first"""
+    ranked = [
+        (mean_dice(damage_dice), range_, "attack", weapon)
+        for weapon, range_, damage_dice in actor.character.available_ranges()
+    ] + [
+        (mean_dice(damage_dice), range_, "hex", spell)
+        for spell, range_, damage_dice in actor.character.available_hex_ranges()
+    ]
+    ranked.sort(key=lambda offense: -offense[0])  # stable: first found wins the ties
+    return [(range_, kind, name) for mean, range_, kind, name in ranked if mean > 0]
+
+
+def _best_offense(
+    actor: Actor, dist: Optional[float] = None, offenses: List[Tuple[int, str, str]] = None
+) -> Tuple[str, Optional[str]]:
+    """Strongest weapon or hex of an actor (best expected damage), as ("attack"|"hex", name)
+
+    dist: only the weapons and hexes reaching this distance, in m, all of them if None
+    offenses: the _offenses of the actor, if already known
+    """
+    if offenses is None:
+        offenses = _offenses(actor)
+    for range_, kind, name in offenses:
+        if dist is None or range_ >= dist:
+            return kind, name
+    return "attack", None
+
+
+def _foes_in_reach(
+    actor: Actor, foes: List[Actor], room: RoomMap, offenses: List[Tuple[int, str, str]] = None
+) -> List[Tuple[Actor, Tuple[str, str]]]:
+    """Foes seen by the actor within the range of a weapon or hex, with the strongest of them
+
+    Same visibility and distances as RoomMap.visible_actors_n_loots_n_gates, for the foes only.
+    """
+    if offenses is None:
+        offenses = _offenses(actor)
+    visible = room.visible_from(actor.pos, actor.height + actor.climbed)
+    in_reach = []
+    for foe in foes:
+        if visible[foe.pos]:
+            dist = math.hypot(
+                (actor.pos[0] - foe.pos[0]) * room.unit_m,
+                (actor.pos[1] - foe.pos[1]) * room.unit_m,
+                actor.height - foe.height,
+            )
+            offense = _best_offense(actor, round(dist), offenses)
+            if offense[1] is not None:
+                in_reach.append((foe, offense))
+    return in_reach
+
+
+def _distance(room: RoomMap, actor: Actor, other: Actor) -> float:
+    return room.unit_to_m(math.dist(actor.pos, other.pos))
+
+
+def _initiative(actors: List[Actor], rng: random.Random) -> List[Actor]:
+    """Same rule as GameEngine.compute_initiative"""
+    initiatives = []
+    for a in actors:
+        d20, _ = rolldice("1d20", autoroll=True, rng=actor_rng(a.name), silent=True)
+        initiatives.append((a.character.attr_mod("dexterity") + d20, rng.random(), a))
+    initiatives.sort(key=lambda x: (-x[0], x[1]))
+    return [a for (_, _, a) in initiatives]
+
+
+def _take_turn(
+    actor: Actor,
+    foes: List[Actor],
+    room: Optional[RoomMap],
+    rng: random.Random,
+    offenses: List[Tuple[int, str, str]] = None,
+):
+    """Strike a foe in reach, moving toward the nearest one first if none is
+
+    The move reads the reachability of the actor, mostly from the cache of the room:
+    the same positions come back from one encounter to the next.
+    """
+    if offenses is None:
+        offenses = _offenses(actor)
+    if room is None:
+        defender, (kind, name) = rng.choice(foes), _best_offense(actor, None, offenses)
+    else:
+        in_reach = _foes_in_reach(actor, foes, room, offenses)
+        if not in_reach and actor.climbed == 0:
+            nearest = min(foes, key=lambda foe: _distance(room, actor, foe))
+            room.move_actor_to_target(actor.name, nearest.name, actor.character.max_distance())
+            in_reach = _foes_in_reach(actor, foes, room, offenses)
+        if not in_reach:
+            return
+        defender, (kind, name) = rng.choice(in_reach)
+    if name is None:
+        return
+    if kind == "attack":
+        dmg = attack(actor.character, name, defender.character)
+    else:
+        dmg = offensive_spell(actor.character, name, defender.character)
+    defender.character.get_damage(dmg)
+
+
+def run_encounter(
+    actors: List[Actor],
+    max_rounds: int = 100,
+    room: Optional[RoomMap] = None,
+    rng: Optional[random.Random] = None,
+) -> EncounterResult:
+    """Fight until one faction stands, modifies the characters and positions of the actors
+
+    room: the room of the actors, for the moves, ranges and lines of sight.
+        Without room, foes are assumed within reach of the strongest weapon or hex.
+    rng: choice of the targets and initiative tie-breaks, a fresh one by default
+    """
+    if rng is None:
+        rng = random.Random()
+    offenses = {actor.name: _offenses(actor) for actor in actors}
+    rounds = 0
+    standing = set(actor.character.faction for actor in actors)
+    while len(standing) > 1 and rounds < max_rounds:
+        rounds += 1
+        for actor in _initiative([a for a in actors if not _is_down(a)], rng):
+            if _is_down(actor):
+                continue
+            foes = [
+                other for other in actors
+                if other.character.faction != actor.character.faction and not _is_down(other)
+            ]
+            if not foes:
+                break
+            _take_turn(actor, foes, room, rng, offenses[actor.name])
+        standing = set(a.character.faction for a in actors if not _is_down(a))
+
+    winner = NO_WINNER
+    if len(standing) == 1:
+        winner = standing.pop()
+    hp = {
+        actor.name: 0 if _is_down(actor) else max(0, actor.character.current_state["current_hp"])
+        for actor in actors
+    }
+    return EncounterResult(winner, rounds, hp)
+
+
+# -----------------------------------------------------------
+#  BATCHES
+# -----------------------------------------------------------
+def _simulate_chunk(
+    wkdir: str,
+    room_name: str,
+    players: bool,
+    factions: Optional[Dict[str, str]],
+    nb_encounters: int,
+    seed: int,
+    max_rounds: int,
+    geometry: bool = True,
+) -> EncounterReport:
+    """Run encounters in the current process, silently"""
+    room = load_encounter_room(wkdir, room_name, players, factions)
+    actors = _fighters(room)
+    initial_states = [
+        (copy.deepcopy(actor.character.current_state), actor.pos, actor.climbed) for actor in actors
+    ]
+    actor_factions = {actor.name: actor.character.faction for actor in actors}
+    factions_list = sorted(set(actor_factions.values())) + [NO_WINNER]
+
+    was_quiet, was_forced, was_streams = is_quiet(), is_force_autoroll(), dice_streams()
+    set_quiet(True)
+    set_force_autoroll(True)
+    rng = random.Random(seed)  # choice of the targets, initiative tie-breaks
+    set_dice_streams(DiceStreams(seed))
+    winners = np.zeros(nb_encounters, dtype=int)
+    rounds = np.zeros(nb_encounters, dtype=int)
+    hp = np.zeros((nb_encounters, len(actors)), dtype=int)
+    try:
+        for i in range(nb_encounters):
+            for actor, (state, pos, climbed) in zip(actors, initial_states):
+                actor.character.current_state = copy.deepcopy(state)
+                actor.pos, actor.climbed = pos, climbed
+            result = run_encounter(actors, max_rounds, room if geometry else None, rng)
+            winners[i] = factions_list.index(result.winner)
+            rounds[i] = result.rounds
+            hp[i] = [result.hp[actor.name] for actor in actors]
+    finally:
+        set_quiet(was_quiet)
+        set_force_autoroll(was_forced)
+        set_dice_streams(was_streams)
+
+    return EncounterReport(
+        factions=actor_factions,
+        winners=winners,
+        rounds=rounds,
+        hp=hp,
+        max_hp={actor.name: actor.character.max_hp for actor in actors},
+    )
+
+
+def simulate_encounters(
+    wkdir: str,
+    room_name: str,
+    nb_encounters: int,
+    players: bool = True,
+    factions: Optional[Dict[str, str]] = None,
+    seed: int = 0,
+    workers: Optional[int] = None,
+    chunk_size: int = 1000,
+    max_rounds: int = 100,
+    geometry: bool = True,
+) -> EncounterReport:
+    """Run nb_encounters encounters of a room, over a process pool
+
+    Actors start where the room places them, then move and strike within their ranges
+    and lines of sight, see the module docstring. Foes out of reach for good
+    (no path, no line of sight) end the encounter after max_rounds, without winner.
+    Moves cost most of the time: a few hundred encounters per second and per core
+    on a 40x40 room, most floods of the moves coming back from the reachability cache.
+
+    players: add the players of players.yaml to the actors of the room
+    factions: new faction of some actors, by name
+    seed: same seed, same results, whatever the number of workers
+    workers: number of processes, all cores by default, 1 to stay in this process
+    geometry: if False, the room is left aside: no moves, every foe is within reach
+        of the strongest weapon or hex. Ten times faster, for rough estimates only.
+    """
+    if nb_encounters < 1:
+        raise ValueError(f"nb_encounters must be positive, got {nb_encounters}")
+    RoomMap.load(wkdir, room_name)  # compiled once, before the workers load it
+    sizes = [chunk_size] * (nb_encounters // chunk_size)
+    if nb_encounters % chunk_size:
+        sizes.append(nb_encounters % chunk_size)
+    seeds = [
+        int(child.generate_state(1)[0])
+        for child in np.random.SeedSequence(seed).spawn(len(sizes))
+    ]
+    args = [
+        (wkdir, room_name, players, factions, size, chunk_seed, max_rounds, geometry)
+        for size, chunk_seed in zip(sizes, seeds)
+    ]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(args))
+    if workers <= 1:
+        reports = [_simulate_chunk(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            reports = list(pool.map(_simulate_chunk, *zip(*args)))
+    return EncounterReport.concatenate(reports)
@@ -2,27 +2,45 @@
 
 from dataclasses import dataclass
 from typing import Optional, Dict, Any, List
-import json
-from importlib_resources import files
 
-SPELLS_PATH = files("dndassist").joinpath(
-    "spells.json"
-) 
-with open(SPELLS_PATH, "r", encoding="utf-8") as f:
-    SPELL_DICT = json.load(f)
+from dndassist.catalog import Catalog, fold, load_data
+
+
+
+def _spell_dict() -> dict:
+    """spells.json, read on first use"""
+    global _SPELL_DICT
+    if _SPELL_DICT is None:
+        _SPELL_DICT = load_data("spells", ["spells.json"])
+    return _SPELL_DICT
+
+
+def _offensive_spells() -> frozenset:
+    global _OFFENSIVE_SPELLS
+    if _OFFENSIVE_SPELLS is None:
+        _OFFENSIVE_SPELLS = frozenset(
+            fold(name) for name, spec in SPELLS.items() if spec["damage_dice"] is not None
+        )
+    return _OFFENSIVE_SPELLS
+
+
+_SPELL_DICT = None
+_OFFENSIVE_SPELLS = None
+
+# case-insensitive index of the spells, loaded on the first lookup
+SPELLS = Catalog(loader=_spell_dict, defaults={"material": None})
+
+
+def __getattr__(name):
+    """SPELL_DICT is loaded on first access"""
+    if name == "SPELL_DICT":
+        return _spell_dict()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def item_is_offensive_spell(item_spell):
-    ispell = False
-    for spell in SPELL_DICT:
-        if spell.lower() == item_spell.lower():
-            ispell = True
-            break
-    if ispell is False:
-        return False
-    
-    if SPELL_DICT[spell]["damage_dice"] is None:
-        return False
-    return True
+    """True if item_spell is a spell with damage dice (case-insensitive)"""
+    return fold(item_spell) in _offensive_spells()
 
 
 @dataclass
@@ -40,23 +58,7 @@ class Spell:
     material: str
     
 
-    @classmethod
-    def _load_all_spells(cls) -> Dict[str, Dict[str, Any]]:
-        """Load all weapon specs into a dict indexed by name (case-insensitive)."""
-        out = {}
-        for key, value in SPELL_DICT.items():
-            value["name"] = key
-            if "material" not in value:
-                value["material"] = None
-            out[key.lower()] = value
-           
-        return out
-
     @classmethod
     def from_name(cls, name: str) -> "Spell":
-        """Create a Spell instance by name (case-insensitive lookup)."""
-        all_spells = cls._load_all_spells()
-        key = name.lower()
-        if key not in all_spells:
-            raise ValueError(f"Spell '{name}' not found in {SPELLS_PATH}")
-        return cls(**all_spells[key])
+        """Spell of this name (case-insensitive lookup), shared: do not modify"""
+        return SPELLS.instance(cls, name, "Spell")
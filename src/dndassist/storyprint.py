@@ -7,6 +7,17 @@ init(autoreset=True)
 
 DEFAULT_MARGIN=4
 DEFAULT_WRAP = 60
+QUIET = False # no output at all, see set_quiet
+
+
+def set_quiet(quiet: bool = True):
+    """Silence story_title, story_print, print_color and print_3cols (headless runs)"""
+    global QUIET
+    QUIET = quiet
+
+
+def is_quiet() -> bool:
+    return QUIET
 
 
 # def print_color(text: str, width: int = 4, primary: str = "WHITE", secondary: str = "YELLOW"):
@@ -146,6 +157,8 @@ DEFAULT_WRAP = 60
 
 
 def story_title(text:str, level=1):
+    if QUIET:
+        return
 
     term_width = shutil.get_terminal_size((100, 20)).columns
     if "\n" in text:
@@ -175,6 +188,8 @@ def print_color(text: str, color: str="dummy"):
     - Colors available are: white, red, blue, green
    
     """
+    if QUIET:
+        return
     term_width = shutil.get_terminal_size((100, 20)).columns
     primary_color = getattr(Fore, color.upper(), Fore.WHITE)
 
@@ -192,6 +207,8 @@ def story_print(text: str, color="dummy", justify="center"):
     - If parts are dundered (__part__), a secondary color will be used to highlight 
    
     """
+    if QUIET:
+        return
     # colorization comes 
     text, mask = split_text_mask(text)
     term_width = shutil.get_terminal_size((100, 20)).columns
@@ -275,6 +292,8 @@ def colorize_text(text:str, mask:str, color="dummy")-> str:
 
 
 def print_3cols(col1: str, col2: str, col3: str, sep: str ="|"):
+    if QUIET:
+        return
 
     col1, mcol1 = split_text_mask(col1)
     col2, mcol2 = split_text_mask(col2)
@@ -246,7 +246,6 @@ def plot_terrain_with_obstacles(
         Y.max()-Y.min(),
         obst_height.max() - ground_height.min()
     ]).max() / 2.0
-    print(max_range)
     mid_x = (X.max()+X.min()) / 2
     mid_y = (Y.max()+Y.min()) / 2
     mid_z = (obst_height.max()+ground_height.min()) / 2
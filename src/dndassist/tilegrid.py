@@ -0,0 +1,268 @@
+"""Columnar storage of the tiles of a room
+
+Tiles of a room are made of a few kinds (the symbols of the theme, plus gates).
+Each kind is stored once in a palette, and the map only holds, per tile,
+the index of its kind and its ground elevation: a few bytes per tile.
+Tiles are slotted, and the strings of the palette are interned:
+the tiles read from the grid share them, with the specs of the theme.
+
+Attributes are read as whole (width, height) arrays, e.g. grid.opacity,
+or per tile through a Tile-like view, e.g. grid[(x, y)].opacity.
+"""
+
+import sys
+from dataclasses import dataclass, asdict, fields, replace
+from typing import Dict, Tuple, List, Iterator
+import numpy as np
+
+
+# -----------------------------------------------------------
+#  BASIC TILE
+# -----------------------------------------------------------
+@dataclass(slots=True)
+class Tile:
+    symbol: str
+    difficulty: int =  1
+    blocks_view: bool = False # shall be removed
+    opacity: float =  0.01 #  1% of opacity per m
+    obstacle_height: float =  0 # the height blocking view (disregarting ground elevation)
+    climb_height: float =  0 # the height you can climb ( disregarding ground elevation)
+    elevation: float = 0 # the height of the ground
+    description: str = ""
+    color: str="yellow"
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**d)
+
+
+TILE_FIELDS = [f.name for f in fields(Tile)]
+STR_FIELDS = ["symbol", "description", "color"]
+KIND_FIELDS = [name for name in TILE_FIELDS if name != "elevation"]
+NUMERIC_FIELDS = ["difficulty", "opacity", "obstacle_height", "climb_height"]
+
+
+def _interned(tile: Tile) -> Tile:
+    """Same tile, its strings shared with every equal string (theme specs, other rooms)"""
+    for name in STR_FIELDS:
+        value = getattr(tile, name)
+        if type(value) is str:
+            setattr(tile, name, sys.intern(value))
+    return tile
+
+
+class TileView:
+    """The tile at one position of a TileGrid
+
+    Reads and writes go to the grid, like the Tile stored in the former dict.
+    """
+
+    __slots__ = ("_grid", "pos")
+
+    def __init__(self, grid: "TileGrid", pos: Tuple[int, int]):
+        object.__setattr__(self, "_grid", grid)
+        object.__setattr__(self, "pos", pos)
+
+    def __getattr__(self, name):
+        return self._grid.tile_attr(self.pos, name)
+
+    def __setattr__(self, name, value):
+        self._grid.set_tile_attr(self.pos, name, value)
+
+    def to_tile(self) -> Tile:
+        return self._grid.tile(self.pos)
+
+    def to_dict(self):
+        return self.to_tile().to_dict()
+
+    def __eq__(self, other):
+        if isinstance(other, TileView):
+            other = other.to_tile()
+        return self.to_tile() == other
+
+    def __repr__(self):
+        return f"TileView{self.pos}({self.to_tile()})"
+
+
+class TileGrid:
+    """Tiles of a room, as a palette of tile kinds and per-tile arrays
+
+    kind: (width, height) index of each tile in the palette
+    elevation: (width, height) ground elevation of each tile
+
+    Behaves as the former Dict[(x, y), Tile], iterated row by row.
+    version is increased at each modification, for caches built on the tiles.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.palette: List[Tile] = []
+        self._palette_index: Dict[tuple, int] = {}
+        self.kind = np.zeros((width, height), dtype=np.uint16)
+        self.elevation = np.zeros((width, height))
+        self.version = 0
+        self._columns = None
+
+    @classmethod
+    def from_kinds(cls, palette: List[Tile], kind: np.ndarray) -> "TileGrid":
+        """Grid from a palette of tiles and the (width, height) index array of kinds"""
+        grid = cls(*kind.shape)
+        kinds = np.array([grid.kind_of(tile) for tile in palette], dtype=np.uint16)
+        grid.kind = kinds[kind]
+        return grid
+
+    # -------------------------------------------
+    # palette
+    # -------------------------------------------
+    def kind_of(self, tile: Tile) -> int:
+        """Palette index of a tile (elevation aside), added if new"""
+        if isinstance(tile, TileView):
+            tile = tile.to_tile()
+        key = tuple(getattr(tile, name) for name in KIND_FIELDS)
+        idx = self._palette_index.get(key)
+        if idx is None:
+            idx = len(self.palette)
+            self.palette.append(_interned(replace(tile, elevation=0)))
+            self._palette_index[key] = idx
+            self._columns = None
+        return idx
+
+    def _column(self, name: str) -> np.ndarray:
+        """Values of an attribute over the palette"""
+        if self._columns is None:
+            symbols = sorted(set(tile.symbol for tile in self.palette))
+            colors = sorted(set(tile.color for tile in self.palette))
+            columns = {
+                name: np.array([getattr(tile, name) for tile in self.palette], dtype=float)
+                for name in NUMERIC_FIELDS
+            }
+            columns["symbol_id"] = np.array(
+                [symbols.index(tile.symbol) for tile in self.palette], dtype=np.uint8
+            )
+            columns["color_id"] = np.array(
+                [colors.index(tile.color) for tile in self.palette], dtype=np.uint8
+            )
+            self._columns = columns
+            self._symbols = symbols
+            self._colors = colors
+        return self._columns[name]
+
+    # -------------------------------------------
+    # whole map arrays
+    # -------------------------------------------
+    @property
+    def difficulty(self) -> np.ndarray:
+        return self._column("difficulty")[self.kind]
+
+    @property
+    def opacity(self) -> np.ndarray:
+        return self._column("opacity")[self.kind]
+
+    @property
+    def obstacle_height(self) -> np.ndarray:
+        return self._column("obstacle_height")[self.kind]
+
+    @property
+    def climb_height(self) -> np.ndarray:
+        return self._column("climb_height")[self.kind]
+
+    @property
+    def symbol_id(self) -> np.ndarray:
+        """Index of each tile symbol in TileGrid.symbols"""
+        return self._column("symbol_id")[self.kind]
+
+    @property
+    def color_id(self) -> np.ndarray:
+        """Index of each tile color in TileGrid.colors"""
+        return self._column("color_id")[self.kind]
+
+    @property
+    def symbols(self) -> List[str]:
+        self._column("symbol_id")
+        return self._symbols
+
+    @property
+    def colors(self) -> List[str]:
+        self._column("color_id")
+        return self._colors
+
+    def symbol_is(self, *symbols: str) -> np.ndarray:
+        """Mask of the tiles with one of these symbols"""
+        ids = [i for i, symbol in enumerate(self.symbols) if symbol in symbols]
+        return np.isin(self.symbol_id, ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory of the per-tile arrays"""
+        return self.kind.nbytes + self.elevation.nbytes
+
+    # -------------------------------------------
+    # per tile access
+    # -------------------------------------------
+    def _in_map(self, pos: Tuple[int, int]) -> bool:
+        return 0 <= pos[0] < self.width and 0 <= pos[1] < self.height
+
+    def tile(self, pos: Tuple[int, int]) -> Tile:
+        """A Tile copy of the tile at pos"""
+        return replace(self.palette[self.kind[pos]], elevation=self.elevation[pos])
+
+    def tile_attr(self, pos: Tuple[int, int], name: str):
+        if name == "elevation":
+            return self.elevation[pos]
+        if name not in KIND_FIELDS:
+            raise AttributeError(name)
+        return getattr(self.palette[self.kind[pos]], name)
+
+    def set_tile_attr(self, pos: Tuple[int, int], name: str, value):
+        if name not in TILE_FIELDS:
+            raise AttributeError(name)
+        if name == "elevation":
+            self.elevation[pos] = value
+            self.version += 1
+        else:
+            self[pos] = replace(self.tile(pos), **{name: value})
+
+    def __getitem__(self, pos: Tuple[int, int]) -> TileView:
+        pos = tuple(pos)
+        if not self._in_map(pos):
+            raise KeyError(pos)
+        return TileView(self, pos)
+
+    def __setitem__(self, pos: Tuple[int, int], tile: Tile):
+        pos = tuple(pos)
+        if not self._in_map(pos):
+            raise KeyError(pos)
+        self.kind[pos] = self.kind_of(tile)
+        self.elevation[pos] = tile.elevation
+        self.version += 1
+
+    def __contains__(self, pos) -> bool:
+        return len(pos) == 2 and self._in_map(pos)
+
+    def __len__(self) -> int:
+        return self.width * self.height
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return self.keys()
+
+    def get(self, pos: Tuple[int, int], default=None):
+        if pos in self:
+            return self[pos]
+        return default
+
+    def keys(self) -> Iterator[Tuple[int, int]]:
+        for y in range(self.height):
+            for x in range(self.width):
+                yield (x, y)
+
+    def values(self) -> Iterator[TileView]:
+        for pos in self.keys():
+            yield TileView(self, pos)
+
+    def items(self) -> Iterator[Tuple[Tuple[int, int], TileView]]:
+        for pos in self.keys():
+            yield pos, TileView(self, pos)
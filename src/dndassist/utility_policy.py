@@ -0,0 +1,174 @@
+"""Utility NPC policy: fast, deterministic decisions, without the LLM
+
+Played by actors in the "utility" state, and used when the LLM does not answer.
+Each option of an action decision gets a score, in expected HP of damage:
+- attack, hex: expected damage (damage_pmf), more if it may finish the target
+- move to a foe: damage it allows next round, if moving (reachability grid)
+  brings the foe in range, a part of it for getting closer
+- pick up, move to a loot: a small bonus
+- objectives and aggro: a bonus to the options naming their target
+- below FLEE_RATIO of its hit points, with foes in view, the actor runs away
+The best score wins, ties going to the first option.
+Other decisions: the direction of a move (toward the nearest foe, away from it
+when fleeing, else toward the objective), else the first option.
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+from dndassist.room import Actor, RoomMap
+from dndassist.matrix_utils import return_relative_pos
+from dndassist.damage_pmf import weapon_odds, spell_odds
+
+FLEE_RATIO = 0.25  # of the max hit points
+FINISH_BONUS = 4.0  # per target killed, times the odds
+NEXT_ROUND = 0.5  # weight of damage possible next round
+LOOT_BONUS = 0.5
+OBJECTIVE_BONUS = 3.0
+AGGRO_BONUS = 3.0
+FLEE_SCORE = 10.0
+USELESS = -1.0  # show view, show status
+COMMENT = "Utility policy"
+
+
+def is_foe(actor: Actor, other: Actor) -> bool:
+    """Same rule as the attack options: other non-neutral factions"""
+    return other.character.faction not in ["neutral", actor.character.faction]
+
+
+def _alive(actor: Actor) -> bool:
+    return "dead" not in actor.character.current_state["conditions"]
+
+
+def _hp_ratio(actor: Actor) -> float:
+    return actor.character.current_state["current_hp"] / max(actor.character.max_hp, 1)
+
+
+def _distance(room: RoomMap, pos_0: Tuple[int, int], pos_1: Tuple[int, int]) -> float:
+    return math.hypot(pos_0[0] - pos_1[0], pos_0[1] - pos_1[1]) * room.unit_m
+
+
+def _visible_foes(room: RoomMap, actor: Actor) -> List[Actor]:
+    visible, _, _ = room.visible_actors_n_loots_n_gates(actor.name)
+    return [
+        room.actors[name] for name, _ in visible
+        if is_foe(actor, room.actors[name]) and _alive(room.actors[name])
+    ]
+
+
+def _damage_score(expected: float, target: Actor) -> float:
+    """Expected damage, with a bonus for the odds of finishing the target"""
+    hp_left = max(target.character.current_state["current_hp"], 1)
+    return expected + FINISH_BONUS * min(1.0, expected / hp_left)
+
+
+def _best_damage(actor: Actor, target: Actor, dist: float) -> float:
+    """Expected damage of the best weapon or hex of actor on target, within dist meters"""
+    best = 0.0
+    for weapon, range_, _ in actor.character.available_ranges():
+        if range_ >= dist:
+            best = max(best, weapon_odds(actor.character, weapon, target.character).expected_damage)
+    for spell, range_, _ in actor.character.available_hex_ranges():
+        if range_ >= dist:
+            best = max(best, spell_odds(actor.character, spell, target.character).expected_damage)
+    return best
+
+
+def _approach_score(room: RoomMap, actor: Actor, target: Actor) -> float:
+    """Damage that moving toward target allows next round"""
+    reach = room.reachability(actor.name)
+    gap = _distance(room, reach.closest_to(target.pos), target.pos)
+    now = _distance(room, actor.pos, target.pos)
+    in_range = _best_damage(actor, target, gap)
+    if in_range > 0:
+        return NEXT_ROUND * _damage_score(in_range, target)
+    closer = max(now - gap, 0.0) / now if now > 0 else 0.0
+    return NEXT_ROUND * 0.5 * closer * _best_damage(actor, target, math.inf)
+
+
+def _target(option: str) -> Optional[str]:
+    """Name of the actor, loot or gate an action is about"""
+    if option.startswith("move to "):
+        return option[len("move to "):].rsplit(" at ", 1)[0].strip()
+    for verb in ["pick up ", "quit map "]:  # loot and gate names can have spaces
+        if option.startswith(verb):
+            return option[len(verb):].strip()
+    for verb in ["attack ", "hex ", "talk to "]:
+        if option.startswith(verb):
+            return option[len(verb):].split(" ")[0].strip()
+    return None
+
+
+def score_option(room: RoomMap, actor: Actor, option: str, fleeing: bool) -> float:
+    """Utility of one option of an action decision"""
+    target_name = _target(option)
+    score = 0.0
+    if option.startswith(("show view", "show status")):
+        return USELESS
+    if option.startswith("move in direction"):
+        return FLEE_SCORE if fleeing else 0.0
+    if option.startswith(("attack ", "hex ")):
+        target = room.actors.get(target_name)
+        if target is None or not _alive(target):
+            return 0.0
+        spell_or_weapon = option.split(";")[0].split(" with ")[-1].strip()
+        if option.startswith("attack "):
+            odds = weapon_odds(actor.character, spell_or_weapon, target.character)
+        else:
+            odds = spell_odds(actor.character, spell_or_weapon, target.character)
+        score = _damage_score(odds.expected_damage, target)
+        if target_name == actor.aggro:
+            score += AGGRO_BONUS
+    elif option.startswith("move to "):
+        if target_name in room.actors:
+            target = room.actors[target_name]
+            if is_foe(actor, target) and _alive(target) and not fleeing:
+                score = _approach_score(room, actor, target)
+                if target_name == actor.aggro:
+                    score += NEXT_ROUND * AGGRO_BONUS
+        elif target_name in room.loots:
+            score = NEXT_ROUND * LOOT_BONUS
+    elif option.startswith("pick up "):
+        score = LOOT_BONUS
+    if target_name is not None and any(target_name in objective for objective in actor.objectives):
+        score += OBJECTIVE_BONUS
+    return score
+
+
+def _direction(room: RoomMap, actor: Actor, options: List[str], fleeing: bool) -> str:
+    """Option of a direction decision ("to the North of the map"...)"""
+    foes = _visible_foes(room, actor)
+    goal = None
+    if foes:
+        nearest = min(foes, key=lambda foe: _distance(room, actor.pos, foe.pos))
+        if fleeing:  # the direction of the actor seen from the foe
+            _, dir_ = return_relative_pos(nearest.pos, actor.pos, room.unit_m)
+        else:
+            _, dir_ = return_relative_pos(actor.pos, nearest.pos, room.unit_m)
+        goal = f"to the {dir_} of the map"
+    else:
+        for objective in actor.objectives:
+            for name, thing in list(room.actors.items()) + list(room.loots.items()) + list(room.gates.items()):
+                if name != actor.name and name in objective:
+                    _, dir_ = return_relative_pos(actor.pos, thing.pos, room.unit_m)
+                    goal = f"to the {dir_} of the map"
+                    break
+            if goal is not None:
+                break
+    if goal is None:
+        goal = "to the Center of the map"
+    return goal if goal in options else options[0]
+
+
+def utility_select_option(room: RoomMap, actor: Actor, title: str, options: List[str]) -> Tuple[str, str]:
+    """Option of the highest utility for actor, and an explanation"""
+    fleeing = _hp_ratio(actor) < FLEE_RATIO and bool(_visible_foes(room, actor))
+    if title.startswith("In what direction"):
+        return _direction(room, actor, options, fleeing), COMMENT + (", fleeing" if fleeing else "")
+    if not any(option.startswith("round finished") for option in options):
+        return options[0], COMMENT
+    scores: Dict[str, float] = {}
+    for option in options:
+        scores[option] = score_option(room, actor, option, fleeing)
+    best = max(options, key=lambda option: scores[option])  # the first one of equal scores
+    return best, f"{COMMENT}, score {scores[best]:.1f}" + (", fleeing" if fleeing else "")
@@ -0,0 +1,211 @@
+"""Memoized viewsheds of a room
+
+A viewshed is what can be seen from a tile at a given eye height:
+- the nap of earth, the mask of tiles hidden by the terrain
+- the fog of war, the transparency left after crossing the fog
+
+Both only depend on the terrain, which does not change during a turn,
+while the same viewshed is asked several times per actor.
+For static rooms, the whole tile-to-tile visibility can also be precomputed.
+"""
+
+import os
+import hashlib
+from collections import OrderedDict
+from typing import Tuple, Dict, List, Optional
+import numpy as np
+
+from dndassist.matrix_utils import compute_nap_of_earth, compute_opacity
+
+
+class ViewshedCache:
+    """Bounded LRU cache of viewsheds, keyed by (pos, view_height)
+
+    The terrain is not checked on lookups: the owner of the terrain
+    calls clear when it changes (see RoomMap.terrain_changed).
+    Arrays returned are read-only, copy them before modification.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def nap_of_earth(
+        self,
+        obstacles_elev: np.ndarray,
+        opacity: np.ndarray,
+        pos: Tuple[int, int],
+        view_height: float,
+        dx: float,
+    ) -> np.ndarray:
+        """Cached compute_nap_of_earth(obstacles_elev, pos, h0=view_height, dx=dx)"""
+        return self._lookup(0, obstacles_elev, opacity, pos, view_height, dx)
+
+    def fog_of_war(
+        self,
+        obstacles_elev: np.ndarray,
+        opacity: np.ndarray,
+        pos: Tuple[int, int],
+        view_height: float,
+        dx: float,
+    ) -> np.ndarray:
+        """Cached compute_opacity(opacity, pos, dx=dx, view_height=view_height)"""
+        return self._lookup(1, obstacles_elev, opacity, pos, view_height, dx)
+
+    def clear(self):
+        """Drop all viewsheds"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Return the hits, misses, size and hit rate of the cache"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _lookup(self, kind, obstacles_elev, opacity, pos, view_height, dx) -> np.ndarray:
+        pos = (int(pos[0]), int(pos[1]))
+        key = (pos, float(view_height))
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = [None, None]
+            self._entries[key] = entry
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+
+        if entry[kind] is not None:
+            self.hits += 1
+            return entry[kind]
+
+        self.misses += 1
+        if kind == 0:
+            array = compute_nap_of_earth(obstacles_elev, pos, h0=view_height, dx=dx)
+        else:
+            array = compute_opacity(opacity, pos, dx=dx, view_height=view_height)
+        array.flags.writeable = False
+        entry[kind] = array
+        return array
+
+
+class VisibilityIndex:
+    """Bit-packed tile-to-tile visibility of a static terrain
+
+    For each indexed eye height, row i tells which tiles are visible
+    from tile i (flat index x*height+y), one bit per tile.
+    Queries are O(1) lookups, the build costs one viewshed per tile and height.
+
+    The index holds N*N bits per eye height for N tiles: 2.6 MB for 80x80,
+    26 MB for 120x120, 200 MB for 200x200. Builds above MAX_NBYTES are refused,
+    larger rooms rely on the viewshed cache.
+    """
+
+    VERSION = 1
+    MAX_NBYTES = 32 * 2**20
+
+    def __init__(
+        self,
+        shape: Tuple[int, int],
+        bits: Dict[float, np.ndarray],
+        source_hash: str = None,
+    ):
+        self.shape = tuple(shape)
+        self.bits = {round(float(h), 3): b for h, b in bits.items()}
+        self.source_hash = source_hash
+
+    @property
+    def heights(self) -> List[float]:
+        return sorted(self.bits)
+
+    def has_height(self, view_height: float) -> bool:
+        return round(float(view_height), 3) in self.bits
+
+    def is_visible(self, pos_from: Tuple[int, int], pos_to: Tuple[int, int], view_height: float) -> bool:
+        """True if pos_to is not hidden by the terrain from pos_from"""
+        bits = self.bits[round(float(view_height), 3)]
+        height = self.shape[1]
+        i = pos_from[0] * height + pos_from[1]
+        j = pos_to[0] * height + pos_to[1]
+        return bool((bits[i, j >> 3] >> (7 - (j & 7))) & 1)
+
+    def visible_from(self, pos: Tuple[int, int], view_height: float) -> np.ndarray:
+        """Boolean map of the tiles visible from pos"""
+        bits = self.bits[round(float(view_height), 3)]
+        width, height = self.shape
+        row = np.unpackbits(bits[pos[0] * height + pos[1]], count=width * height)
+        return row.astype(bool).reshape(width, height)
+
+    @staticmethod
+    def nbytes_for(shape: Tuple[int, int], nb_heights: int) -> int:
+        """Size of the index of a map"""
+        nb_tiles = shape[0] * shape[1]
+        return nb_heights * nb_tiles * ((nb_tiles + 7) // 8)
+
+    @classmethod
+    def build(
+        cls,
+        obstacles_elev: np.ndarray,
+        view_heights: List[float],
+        dx: float,
+        source_hash: str = None,
+    ) -> "VisibilityIndex":
+        """Compute the index, one nap of earth per tile and eye height
+
+        Raise ValueError if the index would be larger than MAX_NBYTES."""
+        width, height = obstacles_elev.shape
+        nbytes = cls.nbytes_for((width, height), len(view_heights))
+        if nbytes > cls.MAX_NBYTES:
+            raise ValueError(
+                f"Visibility index of {width}x{height} tiles and {len(view_heights)} heights"
+                f" would take {nbytes/2**20:.0f} MB, above {cls.MAX_NBYTES/2**20:.0f} MB"
+            )
+        nb_tiles = width * height
+        bits = {}
+        for view_height in view_heights:
+            packed = np.zeros((nb_tiles, (nb_tiles + 7) // 8), dtype=np.uint8)
+            for x in range(width):
+                for y in range(height):
+                    noe = compute_nap_of_earth(obstacles_elev, (x, y), h0=view_height, dx=dx)
+                    packed[x * height + y] = np.packbits(noe.ravel() == 0)
+            bits[view_height] = packed
+        return cls((width, height), bits, source_hash=source_hash)
+
+    def save(self, path: str):
+        arrays = {f"bits_{i}": self.bits[h] for i, h in enumerate(self.heights)}
+        np.savez(
+            path,
+            version=self.VERSION,
+            shape=np.array(self.shape),
+            heights=np.array(self.heights),
+            source_hash=np.array(self.source_hash or ""),
+            **arrays,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> Optional["VisibilityIndex"]:
+        """Load an index, None if the file is missing or from another version"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["version"]) != cls.VERSION:
+                return None
+            bits = {
+                float(h): data[f"bits_{i}"] for i, h in enumerate(data["heights"])
+            }
+            shape = tuple(int(n) for n in data["shape"])
+            return cls(shape, bits, source_hash=str(data["source_hash"]))
+
+
+def files_hash(paths: List[str]) -> str:
+    """Hash of the content of some files, to detect changes of sources"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as fin:
+            digest.update(fin.read())
+    return digest.hexdigest()
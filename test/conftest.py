@@ -0,0 +1,58 @@
+"""Fixtures shared by the tests"""
+import os
+import random
+import pytest
+
+from dndassist.character import Character
+from dndassist.game_engine import GameEngine
+from dndassist.llm_service import set_decision_service, set_prompt_budget
+from dndassist.decision_cache import set_decision_cache
+from dndassist.storyprint import set_quiet
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+
+
+@pytest.fixture(autouse=True)
+def _restore_switches():
+    """Default LLM service, decision cache and prompt budget after each test
+    (the output and dice switches are restored by the engines, see headless_game)"""
+    yield
+    set_decision_service(None)
+    set_decision_cache(None)
+    set_prompt_budget(None)
+
+
+@pytest.fixture
+def headless_game():
+    """Factory of headless games of CRIMSON_MOON, closed after the test
+
+    random_seed: seed of the global random generator, set before the game starts
+    """
+    games = []
+
+    def make(provider=None, random_seed=0, **kwargs):
+        random.seed(random_seed)
+        game = GameEngine(SCENARIO, headless=True, decision_provider=provider, autostart=False, **kwargs)
+        games.append(game)
+        return game
+
+    yield make
+    for game in reversed(games):  # each one restores the switches found when it started
+        game.close()
+
+
+@pytest.fixture
+def quiet():
+    set_quiet(True)
+    yield
+    set_quiet(False)
+
+
+@pytest.fixture
+def character():
+    """Factory of human fighters named tester"""
+
+    def make(**kwargs):
+        return Character(name="tester", race="human", char_class="fighter", **kwargs)
+
+    return make
@@ -1,23 +1,28 @@
 import random
+from typing import List
 
-width = 40
-height = 40
 
-out = []
-for j in range(height):
-    row = ""
-    for col in range(width):
-        rnd = random.random()
-        if rnd < 0.33:
-            sym = "O"
-        elif rnd < 0.6:
-            sym = "o"
-        # elif rnd < 0.7:
-        #     sym = "."
-        else: 
-            sym = " "
-        row+= sym
-    out.append(row)
+def gen_ascii_map(width: int = 40, height: int = 40, seed=None) -> List[str]:
+    """Rows of a random forest map: one third of trees, one quarter of bushes"""
+    rng = random.Random(seed)
+    out = []
+    for j in range(height):
+        row = ""
+        for col in range(width):
+            rnd = rng.random()
+            if rnd < 0.33:
+                sym = "O"
+            elif rnd < 0.6:
+                sym = "o"
+            # elif rnd < 0.7:
+            #     sym = "."
+            else:
+                sym = " "
+            row+= sym
+        out.append(row)
+    return out
 
-for j in range(height):
-    print(f' - "{out[j]}"')
\ No newline at end of file
+
+if __name__ == "__main__":
+    for row in gen_ascii_map():
+        print(f' - "{row}"')
@@ -0,0 +1,83 @@
+"""Dice: batches distributed as rolldice, reproducible actor streams
+
+Run with pytest, or directly for the cost of one roll, looped or in batch:
+    python test_autoroll.py
+"""
+import time
+import random
+import numpy as np
+
+from dndassist.autoroll import (
+    rolldice,
+    roll_batch,
+    scan_dice,
+    DiceStreams,
+    set_dice_streams,
+    actor_rng,
+)
+from dndassist.damage_pmf import dice_pmf
+
+DICES = ["1d20", "2d6+3", "1d4", "3d8+1"]
+
+
+def test_batch_distribution():
+    rng = np.random.default_rng(0)
+    nb = 50000
+    for advantage in [-1, 0, 2]:
+        rolls = roll_batch(DICES, nb, advantage=advantage, rng=rng)
+        assert rolls.shape == (len(DICES), nb)
+        for dice, row in zip(DICES, rolls):
+            pmf = dice_pmf(dice, advantage)
+            assert row.min() >= pmf.offset and row.max() <= pmf.max()
+            freq = np.bincount(row - pmf.offset, minlength=len(pmf.p)) / nb
+            assert 0.5 * np.abs(freq - pmf.p).sum() < 0.02
+
+
+def test_batch_normed():
+    normed = roll_batch(["1d20", "2d6+3"], 1000, rng=np.random.default_rng(1), normed=True)
+    assert normed.min() == 0.0 and normed.max() == 1.0
+    assert set(np.unique(normed[0] * 19)) <= set(range(20))
+
+
+def test_batch_is_reproducible():
+    one = roll_batch(DICES, 100, rng=np.random.default_rng(5))
+    two = roll_batch(DICES, 100, rng=np.random.default_rng(5))
+    assert np.array_equal(one, two)
+
+
+def test_actor_streams():
+    streams = DiceStreams(42)
+    lana = [streams.stream("lana").integers(1, 21) for _ in range(5)]
+    # same rolls, whatever the other actors rolled before
+    others = DiceStreams(42)
+    others.stream("logger1").integers(1, 21, size=100)
+    assert [others.stream("lana").integers(1, 21) for _ in range(5)] == lana
+    assert [DiceStreams(43).stream("lana").integers(1, 21) for _ in range(5)] != lana
+
+    set_dice_streams(DiceStreams(42))
+    try:
+        rolls = [rolldice("1d20", autoroll=True, rng=actor_rng("lana"), silent=True)[0] for _ in range(5)]
+    finally:
+        set_dice_streams(None)
+    assert rolls == lana
+    assert actor_rng("lana") is None
+
+
+def test_rolldice_silent(capsys):
+    random.seed(0)
+    result, normed = rolldice("2d6+3", autoroll=True, silent=True)
+    assert 5 <= result <= 15 and 0 <= normed <= 1
+    assert capsys.readouterr().out == ""
+    assert scan_dice("1d8+2") == (1, 8, 2)
+
+
+if __name__ == "__main__":
+    nb = 100000
+    t0 = time.perf_counter()
+    for _ in range(nb):
+        rolldice("2d6+3", autoroll=True, silent=True)
+    t1 = time.perf_counter()
+    roll_batch(["2d6+3"], nb, rng=np.random.default_rng())
+    t2 = time.perf_counter()
+    print(f"rolldice loop: {(t1-t0)/nb*1e9:8.1f} ns per roll")
+    print(f"roll_batch:    {(t2-t1)/nb*1e9:8.1f} ns per roll")
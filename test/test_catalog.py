@@ -0,0 +1,118 @@
+"""Spell and equipment catalogs: case-insensitive dict lookups, shared instances
+
+Run with pytest, or directly for the cost of the action menus of an encounter:
+    python test_catalog.py
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+import pytest
+
+from dndassist import catalog as catalog_module
+from dndassist.catalog import Catalog, load_data
+from dndassist.spellcasting import SPELL_DICT, SPELLS, Spell, item_is_offensive_spell
+from dndassist.equipment import Weapon, Shield, Item, weapon_catg
+from dndassist.simulation import load_encounter
+from dndassist.storyprint import set_quiet
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+
+
+def test_catalog_lookups():
+    catalog = Catalog({"Fire Bolt": {"name": "Fire Bolt", "range": 24}}, defaults={"material": None})
+    assert "fire bolt" in catalog and " FIRE BOLT" in catalog
+    assert catalog.get("fire BOLT") == {"range": 24, "material": None}
+    assert catalog.name_of("fire bolt") == "Fire Bolt"
+    assert catalog.get("ice bolt") is None
+    assert list(catalog) == ["Fire Bolt"]
+
+
+def test_offensive_spells_match_the_data():
+    for name, spec in SPELL_DICT.items():
+        expected = spec["damage_dice"] is not None
+        assert item_is_offensive_spell(name) == expected
+        assert item_is_offensive_spell(name.upper()) == expected
+    assert not item_is_offensive_spell("Dagger")
+    assert len(SPELLS) == len(SPELL_DICT)
+
+
+def test_instances_are_built_once():
+    spell = Spell.from_name("eldritch blast")
+    assert spell.name == "Eldritch Blast" and spell.material is None
+    assert Spell.from_name("Eldritch Blast") is spell
+    assert Weapon.from_name("Dagger") is Weapon.from_name("dagger")
+    assert Weapon.from_name("Dagger").name == "dagger"
+    assert Shield.from_name("Shield").base == 2  # the record also holds a name
+    assert Item.from_name("cocotte").name == "Cocotte"  # custom items keep their case
+    assert weapon_catg("DAGGER") == "simple"
+    assert weapon_catg("Cocotte") is None
+
+
+def test_unknown_names_raise():
+    with pytest.raises(ValueError):
+        Spell.from_name("Unknown Spell")
+    with pytest.raises(ValueError):
+        Weapon.from_name("cocotte")
+
+
+def test_catalogs_are_lazy():
+    calls = []
+    catalog = Catalog(loader=lambda: calls.append(1) or {"Dagger": {"weight": 1}})
+    assert not catalog.loaded and not calls
+    assert catalog.get("dagger") == {"weight": 1}
+    assert catalog.get("DAGGER") == {"weight": 1}
+    assert calls == [1]
+
+    code = (
+        "import dndassist.character, dndassist.spellcasting as s, dndassist.equipment as e;"
+        "print(s.SPELLS.loaded, e.CATALOGS['Weapon'].loaded)"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.split()[-2:] == ["False", "False"]
+
+
+def test_data_cache_follows_its_sources(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog_module, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(catalog_module, "CACHE_DIR", str(tmp_path / ".compiled"))
+    source = tmp_path / "data.json"
+    source.write_text(json.dumps({"a": 1}))
+    merge = lambda data: {**data, "merged": True}
+    assert load_data("data", ["data.json"], merge) == {"a": 1, "merged": True}
+    assert len(list((tmp_path / ".compiled").glob("catalog_data_*.pkl"))) == 1
+    assert load_data("data", ["data.json"], merge) == {"a": 1, "merged": True}
+
+    source.write_text(json.dumps({"a": 22}))
+    assert load_data("data", ["data.json"], merge) == {"a": 22, "merged": True}
+
+
+def test_data_without_cache_folder(tmp_path, monkeypatch):
+    (tmp_path / "not_a_folder").write_text("")
+    monkeypatch.setattr(catalog_module, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(catalog_module, "CACHE_DIR", str(tmp_path / "not_a_folder" / "dndassist"))
+    (tmp_path / "data.json").write_text(json.dumps({"a": 1}))
+    assert load_data("data", ["data.json"]) == {"a": 1}
+    assert load_data("data", ["data.json"]) == {"a": 1}
+
+
+def test_cache_is_out_of_the_package():
+    package = os.path.dirname(catalog_module.__file__)
+    assert not os.path.abspath(catalog_module.CACHE_DIR).startswith(package)
+
+
+if __name__ == "__main__":
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import dndassist.character"], capture_output=True)
+    print(f"import dndassist.character: {(time.perf_counter()-t0)*1e3:6.1f} ms, interpreter included")
+    set_quiet(True)
+    characters = [actor.character for actor in load_encounter(SCENARIO, "forest_arena.yaml")]
+    repeat = 1000
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for character in characters:
+            character.available_ranges()
+            character.available_hex_ranges()
+    t1 = time.perf_counter()
+    set_quiet(False)
+    print(f"{len(characters)} characters, weapons and hexes: {(t1-t0)/repeat*1e6:6.1f} us per round")
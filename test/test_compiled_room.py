@@ -0,0 +1,133 @@
+"""Compiled rooms: same room as a parsed one, dropped when a source changes
+
+Run with pytest, or directly for a timing of both loads:
+    python test_compiled_room.py
+"""
+import os
+import time
+import shutil
+import pickle
+import tempfile
+import numpy as np
+
+from dndassist.room import RoomMap
+from dndassist.compiled_room import CompiledRoom
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+ROOMS = ["forest_arena.yaml", "forest_bridge.yaml", "forest_slopes.yaml", "village_start.yaml"]
+
+
+def _scenario_copy(tmp_path):
+    wkdir = os.path.join(str(tmp_path), "CRIMSON_MOON")
+    shutil.copytree(SCENARIO, wkdir, ignore=shutil.ignore_patterns(".compiled", "__pycache__"))
+    return wkdir
+
+
+def _assert_same_room(ref, room):
+    assert ref.name == room.name and (ref.width, ref.height) == (room.width, room.height)
+    for attr in ["elevation", "obstacles_elev", "opacity"]:
+        assert np.array_equal(getattr(ref, attr), getattr(room, attr))
+    assert np.array_equal(ref.tiles.kind, room.tiles.kind)
+    assert ref.tiles.palette == room.tiles.palette
+    assert ref.theme == room.theme
+    assert ref.loots == room.loots
+    assert ref.npc_ordered_list == room.npc_ordered_list
+    for name, actor in ref.actors.items():
+        other = room.actors[name]
+        assert actor.to_dict_with_character_data() == other.to_dict_with_character_data()
+
+
+def test_compiled_room_parity(tmp_path):
+    wkdir = _scenario_copy(tmp_path)
+    for room_name in ROOMS:
+        ref = RoomMap.load(wkdir, room_name, compiled=False)
+        assert CompiledRoom.load(wkdir, room_name) is None
+        _assert_same_room(ref, RoomMap.load(wkdir, room_name))  # compiles
+        assert CompiledRoom.load(wkdir, room_name) is not None
+        room = RoomMap.load(wkdir, room_name)
+        _assert_same_room(ref, room)
+        assert isinstance(room.elevation, np.memmap)
+        assert room.source_files == ref.source_files
+
+
+def test_compiled_room_modifications_stay_in_memory(tmp_path):
+    wkdir = _scenario_copy(tmp_path)
+    RoomMap.load(wkdir, "forest_arena.yaml")
+    room = RoomMap.load(wkdir, "forest_arena.yaml")
+    room.add_gate("somewhere", (0, 0), "a gate")
+    room.elevation[1, 1] = 99
+    names = list(room.actors)
+    room.actors[names[0]].character.equipment.append("a rock")
+    reloaded = RoomMap.load(wkdir, "forest_arena.yaml")
+    assert reloaded.tiles[(0, 0)].symbol != "G"
+    assert reloaded.elevation[1, 1] != 99
+    for name in names:
+        assert "a rock" not in reloaded.actors[name].character.equipment
+
+
+def test_compiled_room_invalidation(tmp_path):
+    wkdir = _scenario_copy(tmp_path)
+    room = RoomMap.load(wkdir, "village_start.yaml")
+    compiled = CompiledRoom.load(wkdir, "village_start.yaml")
+    char_file = os.path.join(wkdir, compiled.sources[-1])
+    with open(char_file, "a", encoding="utf-8") as fout:
+        fout.write("\n")
+    assert CompiledRoom.load(wkdir, "village_start.yaml") is None
+    _assert_same_room(room, RoomMap.load(wkdir, "village_start.yaml"))
+    assert CompiledRoom.load(wkdir, "village_start.yaml") is not None
+
+
+def test_compiled_room_recompilation_keeps_loaded_maps(tmp_path):
+    wkdir = _scenario_copy(tmp_path)
+    RoomMap.load(wkdir, "village_start.yaml")
+    mapped = CompiledRoom.load(wkdir, "village_start.yaml")
+    before = np.array(mapped.arrays["elevation"])
+    recompiled = CompiledRoom.load(wkdir, "village_start.yaml")
+    recompiled.arrays = {name: np.array(array[:1, :1]) + 7 for name, array in recompiled.arrays.items()}
+    recompiled.save(wkdir, "village_start.yaml")
+    assert np.array_equal(mapped.arrays["elevation"], before)
+    assert CompiledRoom.load(wkdir, "village_start.yaml").arrays["elevation"].shape == (1, 1)
+    directory = CompiledRoom.directory(wkdir, "village_start.yaml")
+    assert not [name for name in os.listdir(directory) if name.endswith(".tmp")]
+
+
+class _Planted:
+    """Would create a file when unpickled"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return open, (self.path, "w")
+
+
+def test_compiled_room_refuses_foreign_objects(tmp_path):
+    wkdir = _scenario_copy(tmp_path)
+    RoomMap.load(wkdir, "village_start.yaml")
+    planted = os.path.join(str(tmp_path), "planted")
+    sources = os.path.join(CompiledRoom.directory(wkdir, "village_start.yaml"), "sources.pkl")
+    with open(sources, "wb") as fout:
+        pickle.dump(_Planted(planted), fout)
+    assert CompiledRoom.load(wkdir, "village_start.yaml") is None
+    assert not os.path.exists(planted)
+    RoomMap.load(wkdir, "village_start.yaml")  # compiled again
+    assert CompiledRoom.load(wkdir, "village_start.yaml") is not None
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_path:
+        wkdir = _scenario_copy(tmp_path)
+        for room_name in ROOMS:
+            repeat = 20
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                RoomMap.load(wkdir, room_name, compiled=False)
+            RoomMap.load(wkdir, room_name)
+            t1 = time.perf_counter()
+            for _ in range(repeat):
+                RoomMap.load(wkdir, room_name)
+            t2 = time.perf_counter()
+            print(
+                f"{room_name:20s}: parsed {(t1-t0)/repeat*1000:6.2f} ms,"
+                f" compiled {(t2-t1)/repeat*1000:6.2f} ms"
+            )
@@ -0,0 +1,113 @@
+"""Damage distributions: exact on dice, matching sampled attacks and spells
+
+Run with pytest, or directly for the cost of a damage table:
+    python test_damage_pmf.py
+"""
+import os
+import time
+import random
+from collections import Counter
+import numpy as np
+import pytest
+
+from dndassist.damage_pmf import Pmf, dice_pmf, roll_pmf, weapon_odds, spell_odds, damage_table
+from dndassist.attack import attack, offensive_spell
+from dndassist.simulation import load_encounter
+from dndassist.storyprint import set_quiet
+from dndassist.autoroll import set_force_autoroll
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+
+
+@pytest.fixture
+def actors():
+    set_quiet(True)
+    set_force_autoroll(True)
+    yield {actor.name: actor.character for actor in load_encounter(SCENARIO, "forest_arena.yaml")}
+    set_quiet(False)
+    set_force_autoroll(False)
+
+
+def _total_variation(counter, pmf, nb):
+    values = set(counter) | set(pmf.as_dict())
+    return 0.5 * sum(abs(counter.get(v, 0) / nb - pmf.prob(v)) for v in values)
+
+
+def test_pmf_operations():
+    d6 = Pmf.uniform(1, 6)
+    two_d6 = d6 + d6
+    assert two_d6.offset == 2 and two_d6.max() == 12
+    assert np.isclose(two_d6.prob(7), 6 / 36)
+    assert np.isclose(two_d6.mean(), 7)
+    assert np.isclose(d6.repeat(3).mean(), 10.5)
+    assert np.isclose(d6.repeat(3).var(), 3 * 35 / 12)
+    assert d6.halved().as_dict() == pytest.approx({0: 1 / 6, 1: 2 / 6, 2: 2 / 6, 3: 1 / 6})
+    assert (d6 + 3).offset == 4
+    mix = Pmf.mixture([(0.5, Pmf.point(0)), (0.5, d6.times(2))])
+    assert np.isclose(mix.mean(), 3.5) and np.isclose(mix.prob(0), 0.5)
+
+
+def test_dice_as_rolldice():
+    two_d6 = {v: (6 - abs(v - 10)) / 36 for v in range(5, 16)}
+    assert dice_pmf("2d6+3").as_dict() == pytest.approx(two_d6)
+    assert np.isclose(roll_pmf(20, 1).prob(20), 1 - (19 / 20) ** 2)
+    assert np.isclose(roll_pmf(20, -1).prob(1), 1 - (19 / 20) ** 2)
+    for advantage in [-2, -1, 0, 1, 2]:
+        assert np.isclose(roll_pmf(20, advantage).p.sum(), 1)
+    assert np.isclose(roll_pmf(20, 1).mean() + roll_pmf(20, -1).mean(), 21)
+
+
+@pytest.mark.parametrize("advantage", [-1, 0, 1])
+def test_weapon_odds_match_attack(actors, advantage):
+    random.seed(advantage)
+    attacker, defender = actors["logger1"], actors["lana"]
+    odds = weapon_odds(attacker, "Handaxe", defender, advantage)
+    nb = 20000
+    counter = Counter(attack(attacker, "Handaxe", defender, advantage) for _ in range(nb))
+    assert _total_variation(counter, odds.damage, nb) < 0.02
+    assert np.isclose(odds.damage.p.sum(), 1)
+    assert np.isclose(1 - odds.hit, odds.damage.prob(0))
+
+
+@pytest.mark.parametrize("spell_name", ["Eldritch Blast", "Acid Splash", "Burning Hands"])
+@pytest.mark.parametrize("advantage", [-1, 0, 1])
+def test_spell_odds_match_offensive_spell(actors, spell_name, advantage):
+    random.seed(advantage)
+    attacker, defender = actors["neila"], actors["logger1"]
+    hp = attacker.current_state["current_hp"]
+    odds = spell_odds(attacker, spell_name, defender, advantage)
+    nb = 20000
+    counter = Counter()
+    self_damage = 0
+    for _ in range(nb):
+        counter[offensive_spell(attacker, spell_name, defender, advantage)] += 1
+        self_damage += hp - attacker.current_state["current_hp"]
+        attacker.current_state["current_hp"] = hp
+    assert _total_variation(counter, odds.damage, nb) < 0.02
+    assert abs(self_damage / nb - odds.self_damage.mean()) < 0.05
+
+
+def test_odds_are_memoized(actors):
+    one = weapon_odds(actors["logger1"], "Handaxe", actors["lana"])
+    assert weapon_odds(actors["logger2"], "handaxe", actors["lana"]) is one
+    assert weapon_odds(actors["logger2"], "Handaxe", actors["lana"], advantage=1) is not one
+    table = damage_table(actors["neila"], actors["logger1"])
+    assert set(table) == {"Dagger", "Eldritch Blast"}
+
+
+if __name__ == "__main__":
+    set_quiet(True)
+    set_force_autoroll(True)
+    actors = {actor.name: actor.character for actor in load_encounter(SCENARIO, "forest_arena.yaml")}
+    attacker, defender = actors["neila"], actors["logger1"]
+    repeat = 1000
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        damage_table(attacker, defender)
+    t1 = time.perf_counter()
+    for _ in range(repeat):
+        offensive_spell(attacker, "Eldritch Blast", defender)
+    t2 = time.perf_counter()
+    set_quiet(False)
+    print(f"damage table (memoized): {(t1-t0)/repeat*1e6:6.1f} us")
+    print(f"one sampled spell:       {(t2-t1)/repeat*1e6:6.1f} us")
@@ -0,0 +1,141 @@
+"""Persistent cache of the LLM decisions: same question, same answer, no model call
+
+Run with pytest, or directly for the hit rate over repeated rounds:
+    python test_decision_cache.py
+"""
+import os
+import time
+import pytest
+
+from dndassist.decision_cache import DecisionCache, decision_cache, set_decision_cache
+from dndassist.llm_service import DecisionService, set_decision_service
+from dndassist.autoplay import auto_play_ollama, prefetch_ollama
+
+OPTIONS = ["round finished", "move to elder at 12m ", "attack wolf"]
+
+
+class CountingClient:
+    """Fake model: always the first option, counting the calls"""
+
+    calls = 0
+
+    def generate(self, prompt):
+        CountingClient.calls += 1
+        return "> 1 < round finished | nothing to do"
+
+
+@pytest.fixture(autouse=True)
+def _reset_calls():
+    CountingClient.calls = 0
+
+
+def test_same_question_same_answer(tmp_path):
+    cache = DecisionCache(str(tmp_path / "decisions.sqlite"))
+    assert cache.get("A forest.", "title", OPTIONS) is None
+    cache.put("A forest.", "title", OPTIONS, ("attack wolf", "a foe"))
+    assert cache.get("  a   FOREST.\n", "title", OPTIONS) == ("attack wolf", "a foe")
+    assert cache.get("A forest.", "other title", OPTIONS) is None
+    assert cache.get("A forest.", "title", OPTIONS[:2]) is None
+    assert cache.stats == {"hits": 1, "misses": 3, "bypassed": 0}
+    assert cache.hit_rate() == 0.25
+
+
+def test_decisions_persist(tmp_path):
+    path = str(tmp_path / "Saves" / "decisions.sqlite")
+    cache = DecisionCache(path)
+    cache.put("context", "title", OPTIONS, ("move to elder at 12m", "closer"))
+    cache.close()
+    assert DecisionCache(path).get("context", "title", OPTIONS) == ("move to elder at 12m", "closer")
+
+
+def test_file_created_by_the_first_decision(tmp_path):
+    path = tmp_path / "Saves" / "decisions.sqlite"
+    cache = DecisionCache(str(path))
+    assert cache.get("context", "title", OPTIONS) is None
+    assert not cache.has("context", "title", OPTIONS)
+    assert len(cache) == 0
+    cache.close()
+    assert not path.exists()
+    cache.put("context", "title", OPTIONS, ("attack wolf", "a foe"))
+    assert path.exists()
+
+
+def test_expired_decisions_are_dropped(tmp_path):
+    cache = DecisionCache(str(tmp_path / "decisions.sqlite"), ttl=0.05)
+    cache.put("context", "title", OPTIONS, ("attack wolf", "a foe"))
+    time.sleep(0.1)
+    assert cache.get("context", "title", OPTIONS) is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    cache = DecisionCache(str(tmp_path / "decisions.sqlite"), max_entries=3)
+    for i in range(5):
+        cache.put(f"context {i}", "title", OPTIONS, ("attack wolf", ""))
+        time.sleep(0.01)
+    cache.get("context 0", "title", OPTIONS)
+    cache.evict()
+    assert len(cache) == 3
+    assert cache.has("context 0", "title", OPTIONS)
+    assert not cache.has("context 1", "title", OPTIONS)
+    assert cache.has("context 4", "title", OPTIONS)
+
+
+def test_autoplay_uses_the_cache(tmp_path):
+    set_decision_service(DecisionService(CountingClient))
+    set_decision_cache(DecisionCache(str(tmp_path / "decisions.sqlite")))
+    first = auto_play_ollama("context", "title", OPTIONS, verbose=False)
+    second = auto_play_ollama("context", "title", OPTIONS, verbose=False)
+    assert first == second == ("round finished", "nothing to do")
+    assert CountingClient.calls == 1
+    assert decision_cache().hit_rate() == 0.5
+
+
+def test_cached_decisions_are_not_prefetched(tmp_path):
+    service = DecisionService(CountingClient)
+    set_decision_service(service)
+    set_decision_cache(DecisionCache(str(tmp_path / "decisions.sqlite")))
+    decision_cache().put("context", "title", OPTIONS, ("attack wolf", "a foe"))
+    prefetch_ollama([("title", "context", OPTIONS), ("title", "other context", OPTIONS)])
+    assert service.stats["requests"] == 1
+    assert decision_cache().stats["hits"] == 0
+
+
+def test_bypass_asks_again_and_records(tmp_path):
+    path = str(tmp_path / "decisions.sqlite")
+    DecisionCache(path).put("context", "title", OPTIONS, ("attack wolf", "a foe"))
+    set_decision_service(DecisionService(CountingClient))
+    set_decision_cache(DecisionCache(path, bypass=True))
+    assert auto_play_ollama("context", "title", OPTIONS, verbose=False) == ("round finished", "nothing to do")
+    assert CountingClient.calls == 1
+    assert DecisionCache(path).get("context", "title", OPTIONS) == ("round finished", "nothing to do")
+
+
+if __name__ == "__main__":
+    import tempfile
+    from dndassist.storyprint import set_quiet
+
+    set_quiet(True)
+    latency = 0.05
+
+    class SlowClient(CountingClient):
+        def generate(self, prompt):
+            time.sleep(latency)
+            return super().generate(prompt)
+
+    set_decision_service(DecisionService(SlowClient))
+    with tempfile.TemporaryDirectory() as tmp:
+        set_decision_cache(DecisionCache(os.path.join(tmp, "decisions.sqlite")))
+        # 8 NPCs, 10 rounds, a quiet room: 3 situations per NPC
+        start = time.perf_counter()
+        for rnd in range(10):
+            for npc in range(8):
+                auto_play_ollama(f"npc {npc}, situation {rnd % 3}", "title", OPTIONS, verbose=False)
+        elapsed = time.perf_counter() - start
+        cache = decision_cache()
+        print(
+            f"80 decisions, model latency {latency}s: {CountingClient.calls} model calls,"
+            f" hit rate {cache.hit_rate():.0%}, {elapsed:.2f}s (uncached {80*latency:.2f}s)"
+        )
+        set_decision_cache(None)
+    set_decision_service(None)
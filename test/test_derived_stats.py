@@ -0,0 +1,95 @@
+"""Derived stats of a character: computed once, recomputed after a change
+
+Run with pytest, or directly for the cost of the menus of an NPC with a large inventory:
+    python test_derived_stats.py
+"""
+import time
+import pytest
+
+from dndassist.character import Character
+from dndassist.attack import defense_score
+from dndassist.storyprint import set_quiet
+
+
+pytestmark = pytest.mark.usefixtures("quiet")
+
+
+def test_attr_mod_follows_the_attributes(character):
+    char = character()
+    assert char.attr_mod("dexterity") == 0
+    char.attributes["dexterity"] = 14
+    char.invalidate()  # changed in place
+    assert char.attr_mod("dexterity") == 2
+    char.attributes = dict(char.attributes, dexterity=8)
+    assert char.attr_mod("dexterity") == -1
+
+
+def test_ranges_follow_equipment_and_spells(character):
+    char = character(equipment=["dagger"], spells=["Fire Bolt"])
+    assert [w for w, _, _ in char.available_ranges()] == ["dagger"]
+    char.equipment.append("longbow")
+    assert [w for w, _, _ in char.available_ranges()] == ["longbow", "dagger"]
+    char.available_ranges().clear()  # callers get a copy
+    assert len(char.available_ranges()) == 2
+    assert [s for s, _, _ in char.available_hex_ranges()] == ["Fire Bolt"]
+    char.spells = []
+    assert char.available_hex_ranges() == []
+
+
+def test_ranges_follow_items_swapped_in_place(character):
+    char = character(equipment=["dagger"], spells=["Fire Bolt"])
+    assert [w for w, _, _ in char.available_ranges()] == ["dagger"]
+    char.equipment[0] = "longbow"
+    assert [w for w, _, _ in char.available_ranges()] == ["longbow"]
+    char.spells[0] = "Shield"
+    assert char.available_hex_ranges() == []
+
+
+def test_attack_bonus_follows_the_level(character):
+    char = character(equipment=["dagger", "longsword"])
+    assert char.attack_bonus("dagger") == 2
+    assert char.attack_bonus("longsword") == 0  # martial, not proficient
+    char.proficiency_bonus = 3
+    assert char.attack_bonus("dagger") == 3
+    char.weapon_mastery = {"simple": "proficient", "martial": "proficient"}
+    assert char.attack_bonus("longsword") == 3
+
+
+def test_defense_follows_the_armor(character):
+    char = character(attributes=dict(character().attributes, dexterity=16))
+    assert defense_score(char) == 0
+    char.equipped["armor"] = "leather armor"
+    char.invalidate()
+    assert char.defense_parts() == ("leather armor", 11, 3, None, 0)
+    assert defense_score(char) == 14
+    char.equipped = dict(char.equipped, armor="chain mail armor")  # no dexterity bonus
+    assert defense_score(char) == 16
+
+
+if __name__ == "__main__":
+    set_quiet(True)
+    char = Character(
+        name="tester",
+        race="human",
+        char_class="fighter",
+        equipment=["dagger", "longbow", "club", "rope"] * 100,
+        spells=["Fire Bolt", "Shield"],
+    )
+    repeat = 1000
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        char.available_ranges()
+        char.available_hex_ranges()
+        char.attack_bonus("dagger")
+        defense_score(char)
+    t1 = time.perf_counter()
+    for _ in range(repeat):
+        char.invalidate()
+        char.available_ranges()
+        char.available_hex_ranges()
+        char.attack_bonus("dagger")
+        defense_score(char)
+    t2 = time.perf_counter()
+    set_quiet(False)
+    print(f"menus, 400 items, cached:   {(t1-t0)/repeat*1e6:8.1f} us")
+    print(f"menus, 400 items, computed: {(t2-t1)/repeat*1e6:8.1f} us")
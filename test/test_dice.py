@@ -0,0 +1,88 @@
+"""Dice expressions: parsing, exact statistics, sampling
+
+Run with pytest, or directly for the cost of a roll:
+    python test_dice.py
+"""
+import time
+import random
+import numpy as np
+import pytest
+
+from dndassist.dice import compile_dice, Pmf
+from dndassist.autoroll import rolldice, max_dice, mean_dice, scan_dice
+
+
+@pytest.mark.parametrize(
+    "text, lo, hi, mean",
+    [
+        ("1d20", 1, 20, 10.5),
+        ("d8", 1, 8, 4.5),
+        ("1D8-1", 0, 7, 3.5),
+        ("2d6+1d4+2", 5, 18, 11.5),
+        ("2d6 + 3", 5, 15, 10),
+        ("1d6-1d4", -3, 5, 1),
+        ("4d6kh3", 3, 18, 15869 / 1296),
+        ("2d20kl1", 1, 20, 1 + sum((k / 20) ** 2 for k in range(1, 20))),
+        ("1d1", 1, 1, 1),
+        ("1d0", 0, 0, 0),
+        ("12d6.", 12, 72, 42),
+        ("5", 5, 5, 5),
+    ],
+)
+def test_statistics(text, lo, hi, mean):
+    expr = compile_dice(text)
+    pmf = expr.pmf()
+    assert (expr.min(), expr.max()) == (lo, hi)
+    assert (pmf.offset, pmf.max()) == (lo, hi)
+    assert np.isclose(pmf.p.sum(), 1)
+    assert np.isclose(expr.mean(), mean)
+    assert max_dice(text) == hi and np.isclose(mean_dice(text), mean)
+
+
+@pytest.mark.parametrize("text", ["", "1d", "d", "2x6", "1d6+", "1d6++2", "4d6kx3"])
+def test_malformed(text):
+    with pytest.raises(ValueError):
+        compile_dice(text)
+
+
+def test_compiled_once():
+    assert compile_dice("3d8+1") is compile_dice("3d8+1")
+    assert scan_dice("3d8+1") == (1 * 3, 8, 1)
+    assert scan_dice("3d8+1") is scan_dice("3d8+1")
+    with pytest.raises(ValueError):
+        scan_dice("4d6kh3")
+
+
+@pytest.mark.parametrize("text", ["2d6+1", "4d6kh3", "1d8-1d4", "3d4kl2+2"])
+@pytest.mark.parametrize("advantage", [-1, 0, 1])
+def test_sampling_matches_pmf(text, advantage):
+    expr = compile_dice(text)
+    pmf = expr.pmf(advantage)
+    nb = 40000
+    samples = expr.sample(np.random.default_rng(0), nb, advantage)
+    freq = np.bincount(samples - pmf.offset, minlength=len(pmf.p)) / nb
+    assert 0.5 * np.abs(freq - pmf.p).sum() < 0.02
+
+    random.seed(0)
+    rolls = np.array([rolldice(text, autoroll=True, advantage=advantage, silent=True)[0] for _ in range(nb)])
+    assert rolls.min() >= pmf.offset and rolls.max() <= pmf.max()
+    assert abs(rolls.mean() - pmf.mean()) < 0.1
+
+
+def test_best_of():
+    d20 = Pmf.uniform(1, 20)
+    assert np.isclose(d20.best_of(1).prob(20), 1 - (19 / 20) ** 2)
+    assert np.isclose(d20.best_of(-1).prob(1), 1 - (19 / 20) ** 2)
+    assert np.isclose(d20.best_of(1).mean() + d20.best_of(-1).mean(), 21)
+
+
+if __name__ == "__main__":
+    nb = 100000
+    for text in ["1d20", "2d6+1d4-1", "4d6kh3"]:
+        t0 = time.perf_counter()
+        for _ in range(nb):
+            rolldice(text, autoroll=True, silent=True)
+        t1 = time.perf_counter()
+        compile_dice(text).sample(np.random.default_rng(), nb)
+        t2 = time.perf_counter()
+        print(f"{text:12s}: rolldice {(t1-t0)/nb*1e9:7.0f} ns, batch {(t2-t1)/nb*1e9:5.0f} ns per roll")
@@ -0,0 +1,107 @@
+"""Headless games: no output, decisions from a provider, reproducible runs
+
+Run with pytest, or directly for the number of rounds per second:
+    python test_headless.py
+"""
+import os
+import time
+import random
+import pytest
+
+from dndassist.game_engine import GameEngine
+from dndassist.autoplay import (
+    DecisionProvider,
+    RandomDecisions,
+    ScriptedDecisions,
+    RecordedDecisions,
+    ReplayDecisions,
+)
+from dndassist.storyprint import is_quiet
+from dndassist.autoroll import is_force_autoroll, dice_streams
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+
+
+def _state(game):
+    return game.room.name, {
+        name: (actor.pos, actor.character.current_state["current_hp"])
+        for name, actor in game.room.actors.items()
+    }
+
+
+def test_headless_rounds_are_silent(capsys, headless_game):
+    game = headless_game(RandomDecisions(0))
+    capsys.readouterr()
+    for _ in range(50):
+        game.run_one_round()
+    assert capsys.readouterr().out == ""
+    assert game.round_counter >= 50
+
+
+def test_provider_must_select_options():
+    class Silent(DecisionProvider):
+        pass
+
+    with pytest.raises(TypeError):
+        Silent()
+
+
+def test_scripted_decisions(headless_game):
+    provider = ScriptedDecisions(["round finished"] * 3)
+    game = headless_game(provider)
+    positions = {name: actor.pos for name, actor in game.room.actors.items()}
+    with pytest.raises(RuntimeError):
+        for _ in range(10):
+            game.run_one_round()
+    assert provider._next == 3
+    assert {name: actor.pos for name, actor in game.room.actors.items()} == positions
+
+    provider = ScriptedDecisions(["no such action"])
+    with pytest.raises(RuntimeError):
+        headless_game(provider).run_one_round()
+
+
+def test_record_and_replay(headless_game):
+    recorder = RecordedDecisions(RandomDecisions(3))
+    game = headless_game(recorder, random_seed=3)
+    for _ in range(30):
+        game.run_one_round()
+    assert recorder.records
+
+    replay = ReplayDecisions(recorder.records)
+    replayed = headless_game(replay, random_seed=3)
+    for _ in range(30):
+        replayed.run_one_round()
+    assert replay._next == len(recorder.records)
+    assert _state(replayed) == _state(game)
+
+
+def test_seed_makes_games_reproducible(headless_game):
+    states = []
+    for _ in range(2):
+        game = headless_game(seed=11)
+        for _ in range(30):
+            game.run_one_round()
+        states.append(_state(game))
+    assert states[0] == states[1]
+
+
+def test_switches_restored_on_close():
+    with GameEngine(SCENARIO, headless=True, autostart=False, seed=5) as game:
+        assert is_quiet() and is_force_autoroll() and dice_streams() is not None
+        game.run_one_round()
+    assert not is_quiet() and not is_force_autoroll() and dice_streams() is None
+
+
+if __name__ == "__main__":
+    nb_games, nb_rounds = 10, 300
+    elapsed = 0
+    for seed in range(nb_games):
+        random.seed(seed)
+        game = GameEngine(SCENARIO, headless=True, decision_provider=RandomDecisions(seed), autostart=False)
+        t0 = time.perf_counter()
+        for _ in range(nb_rounds):
+            game.run_one_round()
+        elapsed += time.perf_counter() - t0
+        game.close()
+    print(f"{nb_games} games of {nb_rounds} rounds: {nb_games*nb_rounds/elapsed:.0f} rounds/s")
@@ -0,0 +1,77 @@
+"""Equipment index and cargo: weights and costs by name, running cargo total
+
+Run with pytest, or directly for the cost of add_item on a large inventory:
+    python test_inventory.py
+"""
+import time
+from dataclasses import asdict
+import pytest
+
+from dndassist.equipment import EQUIPMENT, equipment_weight, equipment_cost, cost_in_cp
+from dndassist.character import Character
+from dndassist.room import Actor
+from dndassist.storyprint import set_quiet
+
+
+pytestmark = pytest.mark.usefixtures("quiet")
+
+
+def test_equipment_index():
+    assert EQUIPMENT.get("Club") == {"category": "Weapon", "weight": 2, "cost_cp": 10}
+    assert EQUIPMENT.get("shield")["category"] == "Shield"
+    assert equipment_weight("COCOTTE") == 0.5
+    assert equipment_cost("shield") == 1000
+    assert equipment_weight("unknown thing") == 0
+    assert cost_in_cp("5 sp") == 50 and cost_in_cp(None) == 0
+
+
+def test_cargo_is_maintained(character):
+    char = character(equipment=["club", "dagger"], max_cargo=8)
+    assert char.cargo() == 3
+    assert char.add_item("club")
+    assert char.cargo() == 5
+    assert not char.add_item("plate armor")  # 65 Kg
+    assert char.equipment == ["club", "dagger", "club"]
+    assert char.add_item("handaxe")
+    assert "heavy equipement" in char.current_state["conditions"]
+    assert char.remove_item("club", 2)
+    assert char.equipment == ["dagger", "handaxe"] and char.cargo() == 3
+    assert "heavy equipement" not in char.current_state["conditions"]
+    assert not char.remove_item("club")
+
+
+def test_cargo_follows_outside_changes(character):
+    char = character(equipment=["club"])
+    assert char.cargo() == 2
+    char.equipment.append("dagger")
+    assert char.cargo() == 3
+    char.equipment = ["handaxe"]
+    assert char.cargo() == 2
+    assert "_cargo" not in asdict(char)  # not saved
+
+
+def test_trades_keep_the_cargo(character):
+    actor = Actor(name="trader", symbol="t", pos=(0, 0), character=character(equipment=["dagger", "club", "dagger"]))
+    assert actor.give_equipment("dagger *2")
+    assert actor.character.equipment == ["club"]
+    assert not actor.give_equipment("dagger")
+    actor.get_equipment("dagger *3")
+    assert actor.character.cargo() == 5
+
+
+if __name__ == "__main__":
+    set_quiet(True)
+    char = Character(
+        name="tester", race="human", char_class="fighter", equipment=["dagger"] * 2000, max_cargo=100000
+    )
+    repeat = 1000
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        char.add_item("club")
+    t1 = time.perf_counter()
+    for _ in range(repeat):
+        char._count_cargo()
+    t2 = time.perf_counter()
+    set_quiet(False)
+    print(f"add_item, 2000+ items: {(t1-t0)/repeat*1e6:8.1f} us")
+    print(f"full recount:         {(t2-t1)/repeat*1e6:8.1f} us")
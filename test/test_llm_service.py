@@ -0,0 +1,323 @@
+"""LLM decision service: compact prompts, concurrent requests, prefetch, speculation,
+kept-alive HTTP connections
+
+No model is needed: a local HTTP stand-in plays the Ollama server,
+and slow fake clients play the model latency.
+
+Run with pytest, or directly for the cost of a round of NPC decisions:
+    python test_llm_service.py
+"""
+import os
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+from dndassist.llm_service import (
+    DecisionService,
+    OllamaClient,
+    SYSTEM_PROMPT,
+    build_prompt,
+    join_context,
+    parse_answer,
+    set_decision_service,
+    set_prompt_budget,
+)
+from dndassist.autoplay import LLMDecisions, auto_play_ollama, prefetch_ollama
+from dndassist.game_engine import GameEngine, ACTION_TITLE
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+LATENCY = 0.2
+TYPING = 0.3  # seconds of a player per decision
+
+
+class SlowClient:
+    """Fake model: always the first option, after LATENCY seconds"""
+
+    prompts = []
+
+    def __init__(self, latency=LATENCY):
+        self.latency = latency
+
+    def generate(self, prompt):
+        SlowClient.prompts.append(prompt)
+        time.sleep(self.latency)
+        return "> 1 < round finished | nothing to do"
+
+
+@pytest.fixture(autouse=True)
+def _forget_prompts():
+    SlowClient.prompts = []
+
+
+def test_prompt_and_answer():
+    options = ["round finished", "move to elder at 12m ", "attack wolf"]
+    prompt = build_prompt("A forest.", "What action will you do?", options)
+    assert " 2 - move to elder at 12m " in prompt.text and "A forest." in prompt.text
+    assert prompt.system == SYSTEM_PROMPT
+    assert parse_answer("> 3 < attack wolf | a foe", options) == ("attack wolf", "a foe")
+    assert parse_answer("I think > 2 < move | closer", options) == ("move to elder at 12m", "closer")
+    assert parse_answer("> 9 < attack | out of range", options) is None
+    assert parse_answer("attack the wolf", options) is None
+
+
+def test_static_description_is_the_system_prefix():
+    options = ["round finished", "attack wolf"]
+    first = build_prompt(join_context("Ulf, a ranger.", ["Full HP.", "A wolf at 3m."]), "title", options)
+    second = build_prompt(join_context("Ulf, a ranger.", ["Half HP.", "A wolf at 1m."]), "title", options)
+    assert first.system == second.system and first.system.endswith("Ulf, a ranger.")
+    assert "Ulf" not in first.text and "Full HP.\n\nA wolf at 3m." in first.text
+    service = DecisionService(SlowClient)
+    service.answer(first)
+    service.answer(second)
+    service.close()
+    assert [repeated for _, _, repeated in service.prompt_sizes] == [False, True]
+    assert service.stats["system_tokens"] == first.system_tokens + second.system_tokens  # sent twice
+    assert service.stats["tokens"] == first.tokens + second.tokens
+
+
+def test_prompt_holds_in_its_budget():
+    options = ["round finished", "attack wolf"]
+    seen = "\n".join(f"Object stone_{i} is {i}m North" for i in range(100))
+    context = join_context("Ulf, a ranger.", ["His objective is: hunt", "Currently: 8/10 HP", seen])
+    prompt = build_prompt(context, "What action will you do?", options, budget=100)
+    assert prompt.tokens <= 100 < build_prompt(context, "What action will you do?", options, budget=10**6).tokens
+    assert "hunt" in prompt.text and "8/10 HP" in prompt.text
+    assert "stone_0 is" in prompt.text and "stone_99" not in prompt.text and "more)" in prompt.text
+    assert " 2 - attack wolf" in build_prompt(context, "title", options, budget=0).text
+    set_prompt_budget(50)
+    assert "stone_0" not in build_prompt(context, "title", options).text
+
+
+def test_a_large_inventory_keeps_the_foes_in_view(headless_game):
+    game = _auto_game(headless_game)
+    elder = game.room.actors["village_elder"]
+    elder.character.equipment = [f"apple {i}" for i in range(40)]
+    options = game.build_all_actions_available_to_actor(elder)
+    prompt = build_prompt(game.actor_context(elder), ACTION_TITLE, options, budget=250)
+    assert prompt.tokens <= 250
+    assert "Actor neila is" in prompt.text and "Gate northpath is" in prompt.text
+
+
+def test_requests_run_concurrently():
+    service = DecisionService(SlowClient, max_concurrency=8)
+    prompts = [f"prompt {i}" for i in range(8)]
+    start = time.perf_counter()
+    for prompt in prompts:
+        service.submit(prompt)
+    answers = [service.answer(prompt) for prompt in prompts]
+    elapsed = time.perf_counter() - start
+    service.close()
+    assert all(answer.startswith("> 1 <") for answer in answers)
+    assert elapsed < 3 * LATENCY
+
+
+def test_concurrency_is_bounded():
+    service = DecisionService(SlowClient, max_concurrency=2)
+    start = time.perf_counter()
+    for i in range(4):
+        service.submit(f"prompt {i}")
+    for i in range(4):
+        service.answer(f"prompt {i}")
+    elapsed = time.perf_counter() - start
+    service.close()
+    assert elapsed > 1.9 * LATENCY
+
+
+def test_prefetched_answers_are_used_once():
+    service = DecisionService(SlowClient)
+    set_decision_service(service)
+    options = ["round finished", "attack wolf"]
+    prefetch_ollama([("title", "context", options)])
+    assert auto_play_ollama("context", "title", options, verbose=False) == ("round finished", "nothing to do")
+    assert service.stats["requests"] == 1 and service.stats["reused"] == 1
+    auto_play_ollama("context", "title", options, verbose=False)
+    assert service.stats["requests"] == 2
+
+
+def test_timeout_falls_back_to_random():
+    set_decision_service(DecisionService(lambda: SlowClient(latency=1.0), timeout=0.1))
+    options = ["round finished", "attack wolf"]
+    option, comment = auto_play_ollama("context", "title", options, verbose=False)
+    assert option in options and comment == "I don't know what I am doing"
+
+
+class _Ollama(BaseHTTPRequestHandler):
+    """Stand-in of the Ollama HTTP API"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+    connections = 0
+    requests = []
+
+    def setup(self):
+        _Ollama.connections += 1
+        super().setup()
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        assert self.path == "/api/generate" and request["stream"] is False
+        _Ollama.requests.append(request)
+        body = json.dumps({"model": request["model"], "response": " > 2 < attack | stand-in \n"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_client_keeps_its_connection():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Ollama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _Ollama.connections = 0
+    client = OllamaClient(f"http://127.0.0.1:{server.server_address[1]}", timeout=5)
+    try:
+        assert client.generate("first") == "> 2 < attack | stand-in"
+        assert client.generate(build_prompt("A forest.", "title", ["a", "b"])) == "> 2 < attack | stand-in"
+        assert _Ollama.connections == 1
+        assert "system" not in _Ollama.requests[-2]
+        assert _Ollama.requests[-1]["system"] == SYSTEM_PROMPT
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+def _headless_game(provider=None):
+    random.seed(0)
+    return GameEngine(SCENARIO, headless=True, decision_provider=provider, autostart=False)
+
+
+def _auto_game(new_game=_headless_game):
+    game = new_game(LLMDecisions())
+    for actor in game.room.actors.values():
+        actor.state = "auto"
+    return game
+
+
+def test_engine_prefetches_npc_decisions(headless_game):
+    service = DecisionService(SlowClient, max_concurrency=8)
+    set_decision_service(service)
+    game = _auto_game(headless_game)
+    game.run_one_round()
+    nb_npcs = len(game.room.actors)
+    assert nb_npcs > 1
+    assert service.stats["reused"] == nb_npcs  # nothing moved: every prefetch is used
+    assert service.stats["requests"] == nb_npcs
+
+
+class TypingPlayer(LLMDecisions):
+    """LLM for the NPCs, a player taking TYPING seconds per decision for the others"""
+
+    def __init__(self, script):
+        super().__init__()
+        self.script = list(script)
+        self.last_input = None
+
+    def select_option(self, title, context, options, npc=False):
+        if npc:
+            return super().select_option(title, context, options, npc=npc)
+        time.sleep(TYPING)
+        line = self.script.pop(0)
+        self.last_input = time.perf_counter()
+        return next(option for option in options if option.startswith(line)), "typed"
+
+
+def _mixed_game(new_game=_headless_game, speculate=True):
+    """lana played first by a player who moves then ends her turn, the others auto"""
+    player = TypingPlayer(["move to cocotte ", "round finished"])
+    game = new_game(player)
+    for actor in game.room.actors.values():
+        actor.state = "manual" if actor.name == "lana" else "auto"
+    game.compute_initiative = lambda actors: sorted(actors, key=lambda actor: actor.name != "lana")
+    if not speculate:
+        game.speculate_npc_decisions = lambda npcs: None
+    return game, player
+
+
+def test_npcs_get_ready_while_the_player_types(headless_game):
+    service = DecisionService(SlowClient, max_concurrency=8)
+    set_decision_service(service)
+    game, player = _mixed_game(headless_game)
+    game.run_one_round()
+    npcs_time = time.perf_counter() - player.last_input
+    nb_npcs = len(game.room.actors) - 1
+    assert game.speculation_stats == {"used": nb_npcs, "discarded": 0}
+    assert service.stats["reused"] == nb_npcs
+    assert npcs_time < LATENCY  # the answers were there before the player ended her turn
+
+
+def test_speculation_is_dropped_if_the_world_changed(headless_game):
+    set_decision_service(DecisionService(SlowClient))
+    game, _ = _mixed_game(headless_game)
+    elder = game.room.actors["village_elder"]
+    game.speculate_npc_decisions([elder])
+    game.join_speculation()
+    elder.pos = (elder.pos[0] + 1, elder.pos[1])
+    assert game.speculated_decision(elder) is None
+    assert game.speculation_stats == {"used": 0, "discarded": 1}
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda actor: actor.objectives.append("guard the apples"),
+        lambda actor: actor.character.equipment.__setitem__(0, "dagger"),  # same count
+        lambda actor: setattr(actor.character, "faction", "neutral"),
+        lambda actor: setattr(actor, "aggro", "lana"),
+        lambda actor: setattr(actor, "last_outcome", "lost an apple"),
+    ],
+)
+def test_speculation_sees_what_the_context_prints(change, headless_game):
+    set_decision_service(DecisionService(SlowClient))
+    game, _ = _mixed_game(headless_game)
+    elder = game.room.actors["village_elder"]
+    game.speculate_npc_decisions([elder])
+    game.join_speculation()
+    change(elder)
+    assert game.speculated_decision(elder) is None
+
+
+if __name__ == "__main__":
+    for max_concurrency in [1, 8]:
+        service = DecisionService(SlowClient, max_concurrency=max_concurrency)
+        set_decision_service(service)
+        game = _auto_game()
+        start = time.perf_counter()
+        game.run_one_round()
+        elapsed = time.perf_counter() - start
+        game.close()
+        set_decision_service(None)
+        print(
+            f"{len(game.room.actors)} NPCs, model latency {LATENCY}s, concurrency {max_concurrency}:"
+            f" {elapsed:.2f}s per round"
+        )
+    for budget in [10**6, 300, 150]:
+        set_prompt_budget(budget)
+        service = DecisionService(SlowClient)
+        set_decision_service(service)
+        game = _auto_game()
+        game.run_one_round()
+        game.close()
+        sizes = list(service.prompt_sizes)
+        set_decision_service(None)
+        print(
+            f"budget {budget}: {sum(size[0] for size in sizes)/len(sizes):.0f} tokens per prompt,"
+            f" {service.stats['system_tokens']/len(sizes):.0f} system tokens per prompt"
+        )
+    set_prompt_budget(None)
+    for speculate in [False, True]:
+        set_decision_service(DecisionService(SlowClient, max_concurrency=8))
+        game, player = _mixed_game(speculate=speculate)
+        game.run_one_round()
+        npcs_time = time.perf_counter() - player.last_input
+        game.close()
+        set_decision_service(None)
+        print(
+            f"{len(game.room.actors) - 1} NPCs after a player, speculation {speculate}:"
+            f" {npcs_time:.2f}s from the player's last input to the end of the round"
+        )
@@ -0,0 +1,130 @@
+"""Parity checks of the vectorized viewshed, fog and elevation against the tile-by-tile loops
+
+Run with pytest, or directly for a timing of both implementations:
+    python test_matrix_utils.py
+"""
+import os
+import time
+import random
+import numpy as np
+
+from dndassist.room import RoomMap
+from dndassist.matrix_utils import (
+    build_elevation_map,
+    build_elevation_map_loop,
+    compute_nap_of_earth,
+    compute_nap_of_earth_loop,
+    compute_opacity,
+    compute_opacity_loop,
+)
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+VIEW_HEIGHTS = [1.7, 4.7]
+
+
+def _crimson_moon_rooms():
+    rooms_dir = os.path.join(SCENARIO, "Rooms")
+    for fname in sorted(os.listdir(rooms_dir)):
+        if fname.endswith(".yaml") and not fname.startswith("dialog"):
+            yield RoomMap.load(SCENARIO, fname)
+
+
+def _viewpoints(room, step=5):
+    for x in range(0, room.width, step):
+        for y in range(0, room.height, step):
+            yield (x, y)
+
+
+def _random_terrain(width, height, seed=0):
+    rng = random.Random(seed)
+    ctrl_pts = [
+        ((rng.randrange(width), rng.randrange(height)), rng.randrange(10))
+        for _ in range(width * height // 50)
+    ]
+    elevation = build_elevation_map(h=height, w=width, ctrl_pts=ctrl_pts, smoothing_passes=2)
+    obstacles = np.array([[rng.choice([0, 0, 0, 10]) for _ in range(height)] for _ in range(width)])
+    return elevation + obstacles
+
+
+def test_nap_of_earth_parity_crimson_moon():
+    for room in _crimson_moon_rooms():
+        for pos in _viewpoints(room):
+            for h0 in VIEW_HEIGHTS:
+                ref = compute_nap_of_earth_loop(room.obstacles_elev, pos, h0=h0, dx=room.unit_m)
+                vec = compute_nap_of_earth(room.obstacles_elev, pos, h0=h0, dx=room.unit_m)
+                assert np.array_equal(ref, vec), f"{room.name} {pos} {h0}"
+
+
+def test_nap_of_earth_parity_random_terrain():
+    elev = _random_terrain(37, 23)
+    for pos in [(0, 0), (36, 22), (18, 11), (3, 20)]:
+        ref = compute_nap_of_earth_loop(elev, pos, h0=1.7)
+        vec = compute_nap_of_earth(elev, pos, h0=1.7)
+        assert np.array_equal(ref, vec)
+
+
+def test_opacity_parity_crimson_moon():
+    for room in _crimson_moon_rooms():
+        for pos in _viewpoints(room):
+            for h0 in VIEW_HEIGHTS:
+                ref = compute_opacity_loop(room.opacity, pos, dx=room.unit_m, view_height=h0)
+                vec = compute_opacity(room.opacity, pos, dx=room.unit_m, view_height=h0)
+                assert np.array_equal(ref, vec), f"{room.name} {pos} {h0}"
+
+
+def _random_ctrl_pts(width, height, density, seed=0):
+    rng = random.Random(seed)
+    return [
+        ((rng.randrange(width), rng.randrange(height)), rng.randrange(16))
+        for _ in range(max(1, int(width * height * density)))
+    ]
+
+
+def test_elevation_parity_random():
+    rng = random.Random(1)
+    for seed in range(50):
+        width, height = rng.randint(1, 30), rng.randint(1, 30)
+        ctrl_pts = _random_ctrl_pts(width, height, rng.choice([0.01, 0.1, 0.5]), seed=seed)
+        passes = rng.randint(0, 3)
+        ref = build_elevation_map_loop(h=height, w=width, ctrl_pts=ctrl_pts, smoothing_passes=passes)
+        vec = build_elevation_map(h=height, w=width, ctrl_pts=ctrl_pts, smoothing_passes=passes)
+        assert np.array_equal(ref, vec), f"seed {seed}"
+
+
+def test_elevation_no_ctrl_pts():
+    assert np.array_equal(build_elevation_map(h=3, w=4, ctrl_pts=[]), np.zeros((4, 3)))
+
+
+def _timeit(func, *args, repeat=5, **kwargs):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args, **kwargs)
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    for size in [40, 80, 120]:
+        elev = _random_terrain(size, size)
+        pos = (size // 3, size // 2)
+        t_loop = _timeit(compute_nap_of_earth_loop, elev, pos, h0=1.7, repeat=2)
+        t_vec = _timeit(compute_nap_of_earth, elev, pos, h0=1.7)
+        print(
+            f"nap of earth {size}x{size}: loop {t_loop*1000:8.2f} ms,"
+            f" vectorized {t_vec*1000:6.2f} ms, speedup x{t_loop/t_vec:.0f}"
+        )
+        fog = np.full((size, size), 0.01)
+        t_loop = _timeit(compute_opacity_loop, fog, pos, view_height=1.7, repeat=2)
+        t_vec = _timeit(compute_opacity, fog, pos, view_height=1.7)
+        print(
+            f"opacity      {size}x{size}: loop {t_loop*1000:8.2f} ms,"
+            f" vectorized {t_vec*1000:6.2f} ms, speedup x{t_loop/t_vec:.0f}"
+        )
+
+    for size in [50, 100, 200]:
+        ctrl_pts = _random_ctrl_pts(size, size, 0.01)
+        t_loop = _timeit(build_elevation_map_loop, h=size, w=size, ctrl_pts=ctrl_pts, smoothing_passes=2, repeat=1)
+        t_vec = _timeit(build_elevation_map, h=size, w=size, ctrl_pts=ctrl_pts, smoothing_passes=2)
+        print(
+            f"elevation    {size}x{size}: loop {t_loop*1000:8.2f} ms,"
+            f" vectorized {t_vec*1000:6.2f} ms, speedup x{t_loop/t_vec:.0f}"
+        )
@@ -0,0 +1,90 @@
+"""Memory of large rooms: slotted tiles and actors, strings shared with the theme
+
+Run with pytest, or directly for the memory of a 200x200 generated map:
+    python test_memory.py
+"""
+import os
+import sys
+import tracemalloc
+from dataclasses import fields, make_dataclass
+import pytest
+
+from dndassist.room import Actor, Loot, RoomGate, from_ascii_map
+from dndassist.themes import Theme
+from dndassist.tilegrid import Tile
+from gen_room import gen_ascii_map
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+
+
+def _theme():
+    return Theme.load(os.path.join(SCENARIO, "Rooms", "Themes", "forest_theme.yaml"))
+
+
+@pytest.mark.parametrize("cls", [Tile, Actor, Loot, RoomGate])
+def test_no_instance_dict(cls):
+    assert "__slots__" in vars(cls)
+    assert "__dict__" not in dir(cls)
+
+
+def test_tiles_share_the_theme_strings():
+    theme = _theme()
+    tiles, width, height, _ = from_ascii_map(gen_ascii_map(30, 20, seed=1), theme.tiles)
+    assert (width, height) == (30, 20)
+    trees = [tiles.tile(pos) for pos in tiles if tiles[pos].symbol == "O"]
+    assert len(trees) > 1
+    assert all(tree.description is trees[0].description for tree in trees)
+    assert trees[0].description == theme.tiles["O"].description
+    assert trees[0].color is sys.intern(theme.tiles["O"].color)
+
+
+def _allocated(build):
+    """Bytes allocated by build(), kept alive until measured"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def _dict_tiles(tiles, tile_cls=Tile):
+    """The former storage of RoomMap.tiles, a dict of tiles"""
+    names = [f.name for f in fields(Tile)]
+    return {
+        pos: tile_cls(**{name: getattr(tile, name) for name in names})
+        for pos, tile in ((pos, tiles.tile(pos)) for pos in tiles)
+    }
+
+
+def test_slotted_tiles_are_smaller():
+    tiles, _, _, _ = from_ascii_map(gen_ascii_map(50, 50, seed=2), _theme().tiles)
+    DictTile = make_dataclass("DictTile", [(f.name, f.type, f) for f in fields(Tile)])
+    _dict_tiles(tiles, DictTile)  # warm up
+    with_dict = _allocated(lambda: _dict_tiles(tiles, DictTile))
+    slotted = _allocated(lambda: _dict_tiles(tiles))
+    assert slotted < 0.9 * with_dict
+
+
+if __name__ == "__main__":
+    size = 200
+    theme = _theme()
+    ascii_map = gen_ascii_map(size, size, seed=0)
+    DictTile = make_dataclass("DictTile", [(f.name, f.type, f) for f in fields(Tile)])
+    grid = []
+    grid_bytes = _allocated(lambda: grid.append(from_ascii_map(ascii_map, theme.tiles)[0]))
+    tiles = grid[0]
+    dict_bytes = _allocated(lambda: _dict_tiles(tiles, DictTile))
+    slotted_bytes = _allocated(lambda: _dict_tiles(tiles))
+    nb = size * size
+    print(f"{size}x{size} generated map, {len(tiles.palette)} tile kinds")
+    print(f"dict of Tile with __dict__: {dict_bytes/1e6:6.2f} MB, {dict_bytes/nb:5.0f} bytes per tile")
+    print(f"dict of slotted Tile:       {slotted_bytes/1e6:6.2f} MB, {slotted_bytes/nb:5.0f} bytes per tile")
+    print(f"TileGrid:                   {grid_bytes/1e6:6.2f} MB, {grid_bytes/nb:5.0f} bytes per tile")
+
+    nb_actors = 10000
+    DictActor = make_dataclass("DictActor", [(f.name, f.type, f) for f in fields(Actor)])
+    actor_bytes = _allocated(lambda: [DictActor(f"a{i}", "a", (i, i)) for i in range(nb_actors)])
+    slotted_actor_bytes = _allocated(lambda: [Actor(f"a{i}", "a", (i, i)) for i in range(nb_actors)])
+    print(f"Actor with __dict__: {actor_bytes/nb_actors:5.0f} bytes, slotted: {slotted_actor_bytes/nb_actors:5.0f} bytes")
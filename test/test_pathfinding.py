@@ -0,0 +1,218 @@
+"""Parity of the array-backed A* with the former dict-based move_to,
+and consistency of the movement flood fill
+
+Run with pytest, or directly for a timing on large maps:
+    python test_pathfinding.py
+"""
+import os
+import math
+import heapq
+import time
+import random
+import numpy as np
+
+from dndassist.room import RoomMap
+from dndassist.pathfinding import PathFinder, DELTAS
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+
+
+def move_to_dict(difficulty, elevation, start, goal, occupied_positions, max_distance_m=None, unit_m=1.5):
+    """The dict-based A* of RoomMap.move_to, before PathFinder"""
+    width, height = difficulty.shape
+    frontier = [(0, start)]
+    came_from = {start: None}
+    g_score = {start: 0.0}
+    g_ref_score = {start: 0.00001}
+    best_reached = start
+    heuristic = lambda a, b: math.hypot(b[0] - a[0], b[1] - a[1])
+    while frontier:
+        _, current = heapq.heappop(frontier)
+        if max_distance_m is not None and g_score[current] > max_distance_m:
+            continue
+        if current == goal:
+            best_reached = goal
+            break
+        for dx, dy, mult in DELTAS:
+            nx, ny = current[0] + dx, current[1] + dy
+            if not (0 <= nx < width and 0 <= ny < height):
+                continue
+            mult = int(round(mult * unit_m))
+            if difficulty[nx, ny] >= 999:
+                continue
+            if (nx, ny) in occupied_positions:
+                continue
+            slope_pct = (elevation[nx, ny] - elevation[current]) / mult
+            cost_p_meter = max(0.5, (difficulty[nx, ny] + slope_pct * 10.))
+            tentative_g = g_score[current] + cost_p_meter * mult
+            tentative_g_ref = g_ref_score[current] + 1 * mult
+            if max_distance_m is not None and tentative_g > max_distance_m:
+                continue
+            if (nx, ny) not in g_score or tentative_g < g_score[(nx, ny)]:
+                g_score[(nx, ny)] = tentative_g
+                g_ref_score[(nx, ny)] = tentative_g_ref
+                heapq.heappush(frontier, (tentative_g + heuristic((nx, ny), goal), (nx, ny)))
+                came_from[(nx, ny)] = current
+                if heuristic((nx, ny), goal) < heuristic(best_reached, goal):
+                    best_reached = (nx, ny)
+    path = []
+    node = best_reached
+    while node:
+        path.append(node)
+        node = came_from[node]
+    path.reverse()
+    return path, g_score[path[-1]], g_ref_score[path[-1]]
+
+
+def _random_grids(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    difficulty = rng.choice([1, 1, 1, 2, 4, 999], size=(width, height)).astype(float)
+    elevation = np.round(rng.random((width, height)) * 2, 1)
+    return difficulty, elevation
+
+
+def test_path_parity_crimson_moon():
+    rng = random.Random(0)
+    rooms_dir = os.path.join(SCENARIO, "Rooms")
+    for fname in sorted(os.listdir(rooms_dir)):
+        if not fname.endswith(".yaml") or fname.startswith("dialog"):
+            continue
+        room = RoomMap.load(SCENARIO, fname)
+        finder = room.path_finder()
+        for _ in range(40):
+            start = (rng.randrange(room.width), rng.randrange(room.height))
+            goal = (rng.randrange(-2, room.width + 2), rng.randrange(-2, room.height + 2))
+            occupied = [start, (rng.randrange(room.width), rng.randrange(room.height))]
+            max_dist = rng.choice([None, 9, 30])
+            ref = move_to_dict(finder.difficulty, finder.elevation, start, goal, occupied, max_dist)
+            assert finder.find_path(start, goal, occupied, max_dist) == ref
+
+
+def test_path_parity_random_grid():
+    difficulty, elevation = _random_grids(30, 20)
+    finder = PathFinder(difficulty, elevation)
+    for start, goal in [((0, 0), (29, 19)), ((15, 10), (2, 18)), ((29, 0), (0, 19))]:
+        ref = move_to_dict(difficulty, elevation, start, goal, [start])
+        assert finder.find_path(start, goal, [start]) == ref
+
+
+def _path_cost(finder, path):
+    """Cost of a path, step by step, with the costs of PathFinder"""
+    steps = {(dx, dy): step for (dx, dy, _), step in zip(DELTAS, finder._steps)}
+    total = 0.0
+    for (x0, y0), (x1, y1) in zip(path[:-1], path[1:]):
+        total += steps[(x1 - x0, y1 - y0)][2][finder.index((x0, y0))]
+    return total
+
+
+def test_flood_random_grid():
+    difficulty, elevation = _random_grids(30, 20)
+    finder = PathFinder(difficulty, elevation)
+    start = (15, 10)
+    occupied = [start, (16, 10)]
+    full = finder.flood(start, occupied)
+    bounded = finder.flood(start, occupied, max_distance_m=20)
+    # a bounded flood is the full one cut at the budget
+    assert np.array_equal(np.isfinite(bounded.cost), full.cost <= 20)
+    assert np.array_equal(bounded.cost[full.cost <= 20], full.cost[full.cost <= 20])
+    assert not full.is_reachable((16, 10))
+    for x in range(finder.width):
+        for y in range(finder.height):
+            if not full.is_reachable((x, y)):
+                continue
+            path = full.path_to((x, y))
+            assert path[0] == start and path[-1] == (x, y)
+            assert math.isclose(_path_cost(finder, path), full.cost_to((x, y)))
+            # shortest: never worse than A*
+            _, g_astar, _ = finder.find_path(start, (x, y), occupied)
+            assert full.cost_to((x, y)) <= g_astar + 1e-9
+
+
+def test_reachability_room():
+    room = RoomMap.load(SCENARIO, "village_start.yaml")
+    actor_name = list(room.actors)[0]
+    actor = room.actors[actor_name]
+    reach = room.reachability(actor_name, 30)
+    assert room.reachability(actor_name, 15) is reach
+    goal = (room.width - 1, room.height - 1)
+    path, used_dist = room.move_toward(actor_name, goal, 15)
+    assert path[0] == tuple(actor.pos)
+    assert used_dist <= 15
+    assert round(reach.cost_to(path[-1])) == used_dist
+    actor.pos = path[-1]
+    assert room.reachability(actor_name, 30) is not reach
+
+
+def test_move_toward_parity_with_move_to():
+    """Same end and distance as A*, ties between equally close tiles included"""
+    room = RoomMap.load(SCENARIO, "forest_arena.yaml")
+    actor = room.actors["logger1"]
+    reach = room.reachability("logger1", 1000)
+    assert len(reach.closest_tiles((36, 33))) > 1  # (35, 27) and (37, 27)
+    occupied = [other.pos for other in room.actors.values()]
+    full, _, _ = room.path_finder().find_path(actor.pos, (36, 33), occupied)
+    early, _, _ = room.path_finder().find_path(actor.pos, (36, 33), occupied, closest=math.hypot(1, 6))
+    assert early[-1] == full[-1] == (35, 27)
+    rng = random.Random(0)
+    goals = [(36, 33), (37, 0), (0, 17)]
+    goals += [(rng.randrange(room.width), rng.randrange(room.height)) for _ in range(60)]
+    for goal in goals:
+        for max_dist in [9, 30, 1000]:
+            path, used_dist = room.move_toward("logger1", goal, max_dist)
+            ref_path, ref_dist = room.move_to(*actor.pos, *goal, max_distance_m=max_dist)
+            assert (path[-1], used_dist) == (ref_path[-1], ref_dist)
+
+
+def test_reachability_comes_back_with_the_positions():
+    room = RoomMap.load(SCENARIO, "village_start.yaml")
+    actor_name = list(room.actors)[0]
+    actor = room.actors[actor_name]
+    start = actor.pos
+    reach = room.reachability(actor_name, 30)
+    actor.pos = room.move_toward(actor_name, (0, 0), 30)[0][-1]
+    room.reachability(actor_name, 30)
+    actor.pos = start
+    assert room.reachability(actor_name, 30) is reach
+    room.add_gate("somewhere", (0, 0), "a gate")  # tiles changed
+    assert room.reachability(actor_name, 30) is not reach
+
+
+if __name__ == "__main__":
+    for size in [40, 100, 200]:
+        difficulty, elevation = _random_grids(size, size)
+        finder = PathFinder(difficulty, elevation)
+        start, goal = (size // 2, size // 2), (size - 1, size - 1)
+        for max_dist in [30, None]:
+            repeat = 20
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                move_to_dict(difficulty, elevation, start, goal, [start], max_dist)
+            t1 = time.perf_counter()
+            for _ in range(repeat):
+                finder.find_path(start, goal, [start], max_dist)
+            t2 = time.perf_counter()
+            print(
+                f"A* {size}x{size}, max distance {max_dist}: dict {(t1-t0)/repeat*1000:8.2f} ms,"
+                f" arrays {(t2-t1)/repeat*1000:8.2f} ms"
+            )
+
+    for size in [40, 100, 200]:
+        difficulty, elevation = _random_grids(size, size)
+        finder = PathFinder(difficulty, elevation)
+        start = (size // 2, size // 2)
+        targets = [(random.randrange(size), random.randrange(size)) for _ in range(10)]
+        repeat = 20
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for goal in targets:
+                finder.find_path(start, goal, [start], 30)
+        t1 = time.perf_counter()
+        for _ in range(repeat):
+            reach = finder.flood(start, [start], 30)
+            for goal in targets:
+                reach.path_toward(goal)
+        t2 = time.perf_counter()
+        print(
+            f"{len(targets)} moves {size}x{size}, max distance 30: A* each {(t1-t0)/repeat*1000:8.2f} ms,"
+            f" one flood {(t2-t1)/repeat*1000:8.2f} ms"
+        )
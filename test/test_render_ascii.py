@@ -0,0 +1,122 @@
+"""The cached ASCII renderer gives the same map as the former tile-by-tile one
+
+Run with pytest, or directly for a timing of both renderers:
+    python test_render_ascii.py
+"""
+import os
+import time
+import random
+import numpy as np
+
+from dndassist.room import RoomMap
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+ROOMS = ["forest_arena.yaml", "forest_bridge.yaml", "forest_slopes.yaml", "village_start.yaml"]
+
+
+def render_ascii_ref(room, for_save=False, path=None, actor_name=None):
+    """RoomMap.render_ascii before the caches"""
+    grid = [[room.tiles[(x, y)].symbol for x in range(room.width)] for y in range(room.height)]
+    if for_save:
+        return "\n".join("".join(row) for row in grid)
+    for y in range(room.height):
+        for x in range(room.width):
+            if grid[y][x] == ".":
+                grid[y][x] = ":"
+            elif grid[y][x] == " ":
+                grid[y][x] = "."
+    for loot in room.loots.values():
+        x, y = loot.pos
+        grid[y][x] = "__" + loot.symbol + "__"
+    for actor in room.actors.values():
+        x, y = actor.pos
+        grid[y][x] = "__" + actor.symbol + "__"
+    if actor_name is not None:
+        perception = room.actor_perception(actor_name)
+        if path is not None:
+            perception = np.maximum(room.actor_perception(actor_name, path[0]), perception)
+        for y in range(room.height):
+            for x in range(room.width):
+                if perception[x, y] < 1.:
+                    grid[y][x] = " "
+        if path is not None:
+            for x, y in path:
+                grid[y][x] = "__*__"
+            x, y = actor.pos
+            grid[y][x] = actor.symbol
+    tip = ["."]
+    top = ["."]
+    idx = -1
+    tens = 0
+    for x in range(room.width):
+        idx += 1
+        if idx == 10:
+            idx = 0
+            tens += 1
+            top.append(f"__{str(idx)}__")
+            tip.append(f"__{str(tens)}__")
+        else:
+            top.append(f"__{str(idx)}__")
+            tip.append(" ")
+    grid.insert(0, top)
+    grid.insert(0, tip)
+    idx = -2
+    for y in range(room.height + 1):
+        if idx <= -1:
+            grid[y].insert(0, " ")
+            grid[y].append(" .")
+        else:
+            grid[y].insert(0, f"__{idx: 2d}__")
+            grid[y].append(f"__{idx: 2d}__")
+        idx += 1
+    return "\n".join(" ".join(row) for row in grid)
+
+
+def _random_renders(room, rng, nb_renders=30):
+    names = list(room.actors)
+    for _ in range(nb_renders):
+        actor_name = rng.choice(names + [None])
+        path = None
+        if actor_name is not None and rng.random() < 0.5:
+            x, y = room.actors[actor_name].pos
+            path = [(x, y), (min(x + 1, room.width - 1), y), (min(x + 2, room.width - 1), y)]
+        yield dict(actor_name=actor_name, path=path)
+        if names and rng.random() < 0.3:
+            actor = room.actors[rng.choice(names)]
+            actor.pos = (rng.randrange(room.width), rng.randrange(room.height))
+        if rng.random() < 0.1:
+            room.add_gate("test_gate", (rng.randrange(room.width), rng.randrange(room.height)), "")
+
+
+def test_render_ascii_parity():
+    rng = random.Random(0)
+    for room_name in ROOMS:
+        room = RoomMap.load(SCENARIO, room_name)
+        for kwargs in _random_renders(room, rng):
+            expected = render_ascii_ref(room, **kwargs)
+            assert room.render_ascii(**kwargs) == expected
+            assert room.render_ascii(**kwargs) == expected  # from the cache
+            assert room.render_ascii(for_save=True) == render_ascii_ref(room, for_save=True)
+
+
+if __name__ == "__main__":
+    room = RoomMap.load(SCENARIO, "forest_arena.yaml")
+    actor_name = list(room.actors)[0]
+    x, y = room.actors[actor_name].pos
+    path = [(x, y), (x + 1, y)]
+    repeat = 100
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        render_ascii_ref(room, actor_name=actor_name, path=path)
+    t1 = time.perf_counter()
+    for _ in range(repeat):
+        room._ascii_cache.pop("overlay_key", None)
+        room.render_ascii(actor_name=actor_name, path=path)
+    t2 = time.perf_counter()
+    for _ in range(repeat):
+        room.render_ascii(actor_name=actor_name, path=path)
+    t3 = time.perf_counter()
+    print(
+        f"render {room.width}x{room.height}: tile by tile {(t1-t0)/repeat*1000:6.2f} ms,"
+        f" new overlays {(t2-t1)/repeat*1000:6.2f} ms, unchanged {(t3-t2)/repeat*1000:6.2f} ms"
+    )
@@ -0,0 +1,129 @@
+"""Monte Carlo encounters: reproducible, silent, consistent reports
+
+Run with pytest, or directly for the number of encounters per second:
+    python test_simulation.py
+"""
+import os
+import math
+import time
+import random
+import numpy as np
+
+from dndassist.simulation import (
+    simulate_encounters,
+    load_encounter,
+    load_encounter_room,
+    run_encounter,
+    NO_WINNER,
+    _take_turn,
+)
+from dndassist.attack import attack
+from dndassist.storyprint import is_quiet, set_quiet
+from dndassist.autoroll import is_force_autoroll, set_force_autoroll
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+
+
+def test_same_seed_same_results_whatever_the_workers():
+    kwargs = dict(nb_encounters=60, seed=7, chunk_size=25)
+    ref = simulate_encounters(SCENARIO, "village_start.yaml", workers=1, **kwargs)
+    pooled = simulate_encounters(SCENARIO, "village_start.yaml", workers=2, **kwargs)
+    assert ref.nb_encounters == 60
+    assert np.array_equal(ref.winners, pooled.winners)
+    assert np.array_equal(ref.rounds, pooled.rounds)
+    assert np.array_equal(ref.hp, pooled.hp)
+    other = simulate_encounters(SCENARIO, "village_start.yaml", workers=1, nb_encounters=60, seed=8)
+    assert not np.array_equal(ref.hp, other.hp)
+
+
+def test_report_is_consistent(capsys):
+    report = simulate_encounters(
+        SCENARIO, "forest_arena.yaml", 200, workers=1, factions={"neila": "player"}
+    )
+    assert capsys.readouterr().out == ""
+    assert not is_quiet() and not is_force_autoroll()
+
+    assert set(report.factions.values()) == {"loggers", "player"}
+    rates = report.win_rates()
+    assert abs(sum(rates.values()) - 1) < 1e-9
+    assert report.expected_rounds() >= 1
+    assert (report.hp >= 0).all()
+    for name in report.actors_list:
+        distribution = report.hp_distribution(name)
+        assert abs(distribution.sum() - 1) < 1e-9
+        assert np.isclose(distribution[0], 1 - report.survival_rates()[name])
+    for i, winner in enumerate(report.winners):
+        faction = report.factions_list[winner]
+        if faction != NO_WINNER:
+            alive = report.hp[i] > 0
+            assert {report.factions[name] for name, a in zip(report.actors_list, alive) if a} == {faction}
+    assert "Win rates" in report.summary()
+
+
+def test_fast_path_without_geometry():
+    report = simulate_encounters(SCENARIO, "forest_arena.yaml", 50, workers=1, geometry=False)
+    assert abs(sum(report.win_rates().values()) - 1) < 1e-9
+    assert report.win_rates()[NO_WINNER] == 0  # every foe within reach
+
+
+def test_one_encounter():
+    set_quiet(True)
+    set_force_autoroll(True)
+    try:
+        actors = load_encounter(SCENARIO, "village_start.yaml")
+        result = run_encounter(actors, max_rounds=1000)
+    finally:
+        set_quiet(False)
+        set_force_autoroll(False)
+    assert result.winner != NO_WINNER
+    assert all(
+        (result.hp[a.name] > 0) == (a.character.faction == result.winner) for a in actors
+    )
+
+
+def test_melee_actor_closes_the_gap_before_striking():
+    room = load_encounter_room(SCENARIO, "forest_arena.yaml")
+    logger, lana = room.actors["logger1"], room.actors["lana"]
+    lana.pos = room._free_pos_nearest((1, 1))
+    hp = lana.character.current_state["current_hp"]
+    start = math.dist(logger.pos, lana.pos)
+    set_quiet(True)
+    set_force_autoroll(True)
+    try:
+        _take_turn(logger, [lana], room, random.Random(0))
+    finally:
+        set_quiet(False)
+        set_force_autoroll(False)
+    assert math.dist(logger.pos, lana.pos) < start
+    assert lana.character.current_state["current_hp"] == hp  # still out of reach of a handaxe
+
+
+def test_simulation_leaves_the_global_random_alone():
+    random.seed(3)
+    expected = random.random()
+    random.seed(3)
+    simulate_encounters(SCENARIO, "forest_arena.yaml", 10, workers=1)
+    assert random.random() == expected
+
+
+def test_attack_leaves_hit_points_to_get_damage():
+    actors = {a.name: a for a in load_encounter(SCENARIO, "forest_arena.yaml")}
+    defender = actors["lana"].character
+    hp = defender.current_state["current_hp"]
+    set_quiet(True)
+    try:
+        for _ in range(20):
+            attack(actors["logger1"].character, "Handaxe", defender)
+    finally:
+        set_quiet(False)
+    assert defender.current_state["current_hp"] == hp
+
+
+if __name__ == "__main__":
+    nb_encounters = 20000
+    for workers in [1, None]:
+        t0 = time.perf_counter()
+        report = simulate_encounters(SCENARIO, "forest_arena.yaml", nb_encounters, workers=workers)
+        elapsed = time.perf_counter() - t0
+        print(f"workers={workers}: {nb_encounters/elapsed:.0f} encounters/s")
+    print(report.summary())
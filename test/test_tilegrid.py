@@ -0,0 +1,73 @@
+"""Columnar tile storage: dict-like access and consistency of the arrays
+
+Run with pytest, or directly for the memory per tile:
+    python test_tilegrid.py
+"""
+import os
+import sys
+import numpy as np
+
+from dndassist.room import RoomMap
+from dndassist.tilegrid import Tile, TileGrid
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+
+
+def _grid():
+    ground = Tile(" ", difficulty=1, opacity=0.01, color="green")
+    tree = Tile("T", difficulty=3, opacity=0.2, obstacle_height=4, climb_height=3, color="brown")
+    kind = np.zeros((4, 3), dtype=int)
+    kind[1, 2] = 1
+    return TileGrid.from_kinds([ground, tree], kind)
+
+
+def test_dict_like_access():
+    grid = _grid()
+    assert len(grid) == 12
+    assert (1, 2) in grid and (4, 0) not in grid and (-1, 0) not in grid
+    assert list(grid)[:5] == [(0, 0), (1, 0), (2, 0), (3, 0), (0, 1)]
+    assert grid[(1, 2)].symbol == "T"
+    assert grid[1, 2].climb_height == 3
+    assert grid.get((9, 9)) is None
+    assert grid[(1, 2)] == Tile("T", 3, False, 0.2, 4, 3, 0, "", "brown")
+
+
+def test_writes_through_views():
+    grid = _grid()
+    version = grid.version
+    grid[(0, 0)].elevation = 2.5
+    assert grid.elevation[0, 0] == 2.5
+    grid[(2, 2)] = grid[(1, 2)].to_tile()
+    assert grid[(2, 2)].symbol == "T" and grid[(2, 2)].elevation == 0
+    grid[(3, 0)].difficulty = 999
+    assert grid.difficulty[3, 0] == 999 and grid.difficulty[2, 0] == 1
+    assert len(grid.palette) == 3
+    assert grid.version > version
+
+
+def test_arrays_match_tiles():
+    room = RoomMap.load(SCENARIO, "forest_arena.yaml")
+    tiles = room.tiles
+    for (x, y), tile in tiles.items():
+        assert tiles.difficulty[x, y] == tile.difficulty
+        assert tiles.opacity[x, y] == room.opacity[x, y] == tile.opacity
+        assert room.obstacles_elev[x, y] == tile.elevation + tile.obstacle_height
+        assert tiles.symbols[tiles.symbol_id[x, y]] == tile.symbol
+        assert tiles.colors[tiles.color_id[x, y]] == tile.color
+
+
+def test_path_finder_follows_tiles():
+    room = RoomMap.load(SCENARIO, "forest_arena.yaml")
+    finder = room.path_finder()
+    assert room.path_finder() is finder
+    room.tiles[(0, 0)].difficulty = 999
+    assert room.path_finder() is not finder
+
+
+if __name__ == "__main__":
+    room = RoomMap.load(SCENARIO, "forest_arena.yaml")
+    tile = room.tiles[(0, 0)].to_tile()
+    dict_bytes = sys.getsizeof(tile)  # slotted, strings shared
+    print(f"{room.width}x{room.height} tiles, {len(room.tiles.palette)} kinds")
+    print(f"dict of Tile: > {dict_bytes} bytes per tile")
+    print(f"TileGrid:       {room.tiles.nbytes / len(room.tiles):.0f} bytes per tile")
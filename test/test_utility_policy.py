@@ -0,0 +1,133 @@
+"""Utility NPC policy: deterministic decisions from expected damage, reach, HP and objectives
+
+Run with pytest, or directly for the time per decision:
+    python test_utility_policy.py
+"""
+import os
+import time
+import random
+import pytest
+
+from dndassist.game_engine import GameEngine, ACTION_TITLE
+from dndassist.autoplay import LLMDecisions, ScriptedDecisions
+from dndassist.llm_service import DecisionService, set_decision_service
+from dndassist.utility_policy import utility_select_option, score_option
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+
+
+def _decide(game, name, title=ACTION_TITLE, options=None):
+    actor = game.room.actors[name]
+    if options is None:
+        options = game.build_all_actions_available_to_actor(actor)
+    return utility_select_option(game.room, actor, title, options)
+
+
+def test_attacks_the_foe_in_range(headless_game):
+    game = headless_game()
+    option, comment = _decide(game, "neila")
+    assert option.startswith(("attack village_elder", "hex village_elder"))
+    assert comment.startswith("Utility policy")
+    assert _decide(game, "neila") == (option, comment)  # deterministic
+
+
+def test_expected_damage_ranks_the_attacks(headless_game):
+    game = headless_game()
+    neila = game.room.actors["neila"]
+    options = game.build_all_actions_available_to_actor(neila)
+    attacks = [option for option in options if option.startswith(("attack", "hex"))]
+    scores = {option: score_option(game.room, neila, option, fleeing=False) for option in attacks}
+    assert scores["hex village_elder with Eldritch Blast ; damage max 10 HP"] > scores[
+        "attack village_elder with Dagger ; damage max 4 HP"
+    ]
+    assert score_option(game.room, neila, "show status", fleeing=False) < 0
+
+
+def test_flees_when_badly_hurt(headless_game):
+    game = headless_game()
+    neila = game.room.actors["neila"]
+    neila.character.current_state["current_hp"] = 1
+    option, comment = _decide(game, "neila")
+    assert option == "move in direction" and comment.endswith("fleeing")
+    options = [f"to the {dir_} of the map" for dir_ in ["South", "East", "North", "West"]]
+    direction, _ = _decide(game, "neila", "In what direction ar you moving?", options)
+    assert direction == "to the East of the map"  # the village elder is West
+
+
+def test_objectives_come_first(headless_game):
+    game = headless_game()
+    game.room.actors["village_elder"].objectives = ["reach northpath before the night"]
+    option, _ = _decide(game, "village_elder")
+    assert option.startswith("move to northpath")
+
+
+def test_loot_names_with_spaces(headless_game):
+    game = headless_game()
+    neila = game.room.actors["neila"]
+    neila.objectives = ["bring back the golden idol"]
+    assert score_option(game.room, neila, "pick up golden key", fleeing=False) == score_option(
+        game.room, neila, "pick up rusty key", fleeing=False
+    )
+    assert score_option(game.room, neila, "pick up golden idol", fleeing=False) > score_option(
+        game.room, neila, "pick up golden key", fleeing=False
+    )
+
+
+def test_utility_actors_never_ask_the_provider(headless_game):
+    game = headless_game(ScriptedDecisions([]))  # raises if asked
+    for actor in game.room.actors.values():
+        actor.state = "utility"
+    for _ in range(3):
+        game.run_one_round()
+    assert game.round_counter == 3
+
+
+class _FirstOptionClient:
+    def generate(self, prompt):
+        return "> 1 < round finished | nothing to do"
+
+
+def test_utility_turns_do_not_speculate(headless_game):
+    set_decision_service(DecisionService(_FirstOptionClient))
+    game = headless_game(LLMDecisions())
+    for actor in game.room.actors.values():
+        actor.state = "utility" if actor.name == "lana" else "auto"
+    game.compute_initiative = lambda actors: sorted(actors, key=lambda actor: actor.name != "lana")
+    started = []
+    speculate = game.speculate_npc_decisions
+    game.speculate_npc_decisions = lambda npcs: started.append(npcs) or speculate(npcs)
+    game.run_one_round()
+    assert started == []
+    assert game.speculation_stats == {"used": 0, "discarded": 0}
+
+
+class _SilentClient:
+    def generate(self, prompt):
+        time.sleep(1.0)
+        return ""
+
+
+def test_fallback_when_the_llm_times_out(headless_game):
+    set_decision_service(DecisionService(_SilentClient, timeout=0.05))
+    game = headless_game(LLMDecisions())
+    neila = game.room.actors["neila"]
+    neila.state = "auto"
+    options = game.build_all_actions_available_to_actor(neila)
+    option, comment = game.select_option(ACTION_TITLE, game.actor_context(neila), options, npc=True, actor=neila)
+    assert (option, comment) == _decide(game, "neila")
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    game = GameEngine(SCENARIO, headless=True, autostart=False)
+    game.close()  # the decisions print again
+    nb = 2000
+    for name in game.room.actors:
+        actor = game.room.actors[name]
+        options = game.build_all_actions_available_to_actor(actor)
+        utility_select_option(game.room, actor, ACTION_TITLE, options)  # warm up the memoized odds
+        start = time.perf_counter()
+        for _ in range(nb):
+            option, _ = utility_select_option(game.room, actor, ACTION_TITLE, options)
+        elapsed = (time.perf_counter() - start) / nb
+        print(f"{name:15s} {len(options):2d} options: {elapsed*1e6:6.0f} us per decision -> {option}")
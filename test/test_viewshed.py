@@ -0,0 +1,80 @@
+"""Viewsheds of a room: cached until the terrain changes
+
+Run with pytest, or directly for the cost of a hit and of a miss:
+    python test_viewshed.py
+"""
+import os
+import time
+import numpy as np
+import pytest
+
+from dndassist.room import RoomMap
+from dndassist.viewshed import VisibilityIndex
+from dndassist.matrix_utils import compute_nap_of_earth
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CRIMSON_MOON")
+
+
+def test_viewsheds_are_cached():
+    room = RoomMap.load(SCENARIO, "forest_arena.yaml")
+    noe = room.nap_of_earth((5, 5), 1.7)
+    assert room.nap_of_earth((5, 5), 1.7) is noe
+    assert room.viewsheds.stats()["hits"] == 1
+    ref = compute_nap_of_earth(room.obstacles_elev, (5, 5), h0=1.7, dx=room.unit_m)
+    assert np.array_equal(noe, ref)
+
+
+def test_terrain_changes_drop_the_viewsheds():
+    room = RoomMap.load(SCENARIO, "forest_arena.yaml")
+    noe = room.nap_of_earth((5, 5), 1.7)
+    room.obstacles_elev = room.obstacles_elev + 0.0
+    assert room.viewsheds.stats()["size"] == 0
+    assert room.nap_of_earth((5, 5), 1.7) is not noe
+
+    wall = np.array(room.obstacles_elev)
+    wall[6, :] = 100
+    room.obstacles_elev[:] = wall  # in place: the room must be told
+    room.terrain_changed()
+    noe = room.nap_of_earth((5, 5), 1.7)
+    assert np.array_equal(noe, compute_nap_of_earth(wall, (5, 5), h0=1.7, dx=room.unit_m))
+
+
+def test_one_viewshed_for_all_the_targets():
+    room = RoomMap.load(SCENARIO, "forest_arena.yaml")
+    actor = room.actors["logger1"]
+    room.visible_actors_n_loots_n_gates("logger1")
+    assert room.viewsheds.stats()["misses"] == 1
+    assert room.viewsheds.stats()["hits"] == 0
+    noe = room.nap_of_earth(actor.pos, actor.height)
+    visible, _, _ = room.visible_actors_loots_gates(actor.pos, actor.height)
+    assert visible == [name for name, other in room.actors.items() if noe[other.pos] == 0]
+
+
+def test_visibility_index_matches_the_viewsheds():
+    rng = np.random.default_rng(0)
+    elev = rng.uniform(0, 4, size=(12, 10))
+    index = VisibilityIndex.build(elev, [1.7], dx=1.5)
+    for pos in [(0, 0), (5, 4), (11, 9)]:
+        noe = compute_nap_of_earth(elev, pos, h0=1.7, dx=1.5)
+        assert np.array_equal(index.visible_from(pos, 1.7), noe == 0)
+        assert index.is_visible(pos, (3, 7), 1.7) == (noe[3, 7] == 0)
+
+
+def test_visibility_index_size_is_bounded():
+    assert VisibilityIndex.nbytes_for((120, 120), 1) == 120**2 * 120**2 // 8
+    with pytest.raises(ValueError):
+        VisibilityIndex.build(np.zeros((200, 200)), [1.7], dx=1.5)
+
+
+if __name__ == "__main__":
+    room = RoomMap.load(SCENARIO, "forest_bridge.yaml")
+    pos, repeat = (room.width // 2, room.height // 2), 1000
+    room.nap_of_earth(pos, 1.7)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        room.nap_of_earth(pos, 1.7)
+    t1 = time.perf_counter()
+    for _ in range(20):
+        compute_nap_of_earth(room.obstacles_elev, pos, h0=1.7, dx=room.unit_m)
+    t2 = time.perf_counter()
+    print(f"{room.width}x{room.height}: hit {(t1-t0)/repeat*1e6:.1f} us, miss {(t2-t1)/20*1e6:.1f} us")